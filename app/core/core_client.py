@@ -2,8 +2,10 @@
 
 from __future__ import annotations
 
+import gzip
+import json
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import httpx
 
@@ -46,3 +48,35 @@ async def push_event(
     except Exception:
         # В проде сюда можно повесить логгер, но бот не должен падать из-за ядра
         return
+
+
+async def push_events(events: List[Dict[str, Any]]) -> None:
+    """
+    Пакетная отправка: список {"source", "scene", "payload"} одним запросом
+    в /api/timeline/batch (NDJSON, gzip для крупных пачек).
+    """
+    if not CORE_BASE_URL or not events:
+        return
+
+    body = "\n".join(
+        json.dumps(
+            {"source": e.get("source", "bot"), "scene": e["scene"], "payload": e.get("payload") or {}},
+            ensure_ascii=False,
+        )
+        for e in events
+    ).encode("utf-8")
+    headers = {"Content-Type": "application/x-ndjson"}
+    if len(body) > 8 * 1024:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    if CORE_GUARD_KEY:
+        headers["X-Guard-Key"] = CORE_GUARD_KEY
+
+    try:
+        async with httpx.AsyncClient(timeout=CORE_TIMEOUT) as client:
+            resp = await client.post(
+                f"{CORE_BASE_URL}/api/timeline/batch", params={"partial": 1}, content=body, headers=headers
+            )
+            resp.raise_for_status()
+    except Exception:
+        return
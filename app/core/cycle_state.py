@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, asdict
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Mapping, Optional
 
 
 @dataclass
@@ -37,21 +37,41 @@ class CycleState:
     def from_core(cls, core: Dict[str, Any]) -> "CycleState":
         """
         Собираем CycleState из core.to_dict(), не трогая сам store.
+        Полный пересчёт по списку событий — эталон для проекции StateStore.
         """
-        cycle = int(core.get("cycle", 0) or 0)
-        intro_count = int(core.get("intro", 0) or 0)
-        reflect_count = int(core.get("reflect", 0) or 0)
-        transition_count = int(core.get("transition", 0) or 0)
-
-        last_update = core.get("last_update") or "-"
         events: List[Dict[str, Any]] = core.get("events") or []
-
+        first = last = None
         if events:
-            last_event = events[-1]
+            # порядок ленты бывает любым (у StateStore — новые сверху): ориентируемся на cycle
+            if all("cycle" in e for e in events):
+                first = min(events, key=lambda e: e["cycle"])
+                last = max(events, key=lambda e: e["cycle"])
+            else:
+                first, last = events[0], events[-1]
+        return cls.from_parts(
+            cycle=int(core.get("cycle", 0) or 0),
+            last_update=core.get("last_update") or "-",
+            first_event=first,
+            last_event=last,
+            counters=core,
+        )
+
+    @classmethod
+    def from_parts(
+        cls,
+        *,
+        cycle: int,
+        last_update: str,
+        first_event: Optional[Mapping[str, Any]],
+        last_event: Optional[Mapping[str, Any]],
+        counters: Mapping[str, Any],
+    ) -> "CycleState":
+        """Сборка из уже известных концов ленты и счётчиков — O(1)."""
+        if last_event is not None:
             phase = (last_event.get("scene") or "idle").strip() or "idle"
             last_ts = last_event.get("ts", "-")
             source = last_event.get("source", "") or ""
-            started_at = events[0].get("ts", "-")
+            started_at = first_event.get("ts", "-") if first_event is not None else "-"
         else:
             phase = "idle"
             last_ts = "-"
@@ -68,9 +88,9 @@ class CycleState:
             last_event_ts=last_ts,
             last_event_scene=phase,
             last_event_source=source,
-            total_intro=intro_count,
-            total_reflect=reflect_count,
-            total_transition=transition_count,
+            total_intro=int(counters.get("intro", 0) or 0),
+            total_reflect=int(counters.get("reflect", 0) or 0),
+            total_transition=int(counters.get("transition", 0) or 0),
         )
 
     def to_dict(self) -> Dict[str, Any]:
@@ -1,12 +1,21 @@
 # app/core/db.py
 from __future__ import annotations
 
+import atexit
+import itertools
+import logging
 import os
 import sqlite3
+import threading
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
 
 DB_PATH = os.getenv("SQLITE_PATH", "/data/elaya.db")
+CORE_FLUSH_SEC = float(os.getenv("CORE_FLUSH_SEC", "1.0"))
+
+_COUNTERS = ("users", "intro", "reflect", "transition")
 
 # гарантируем каталог
 Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
@@ -54,13 +63,22 @@ def init_schema() -> None:
 
 
 def read_state() -> Dict[str, Any]:
-    conn = get_conn()
-    cur = conn.cursor()
-    core = cur.execute("SELECT * FROM core_state WHERE id = 1").fetchone()
-    refl = cur.execute("SELECT * FROM reflection WHERE id = 1").fetchone()
-    conn.close()
+    # под локом флаша: дельта не может оказаться ни в базе, ни в памяти одновременно
+    with _flush_lock:
+        conn = get_conn()
+        cur = conn.cursor()
+        core = cur.execute("SELECT * FROM core_state WHERE id = 1").fetchone()
+        refl = cur.execute("SELECT * FROM reflection WHERE id = 1").fetchone()
+        conn.close()
+        deltas, last_updated = _collect(drain=False)
+    core_d = dict(core) if core else {}
+    if core_d:
+        for name, d in zip(_COUNTERS, deltas):
+            core_d[name] = max(core_d[name] + d, 0)
+        if last_updated is not None:
+            core_d["last_updated"] = last_updated
     return {
-        "core": dict(core) if core else {},
+        "core": core_d,
         "reflection": dict(refl) if refl else {},
     }
 
@@ -76,20 +94,141 @@ def save_reflection(text: str, updated_at: str) -> None:
     conn.close()
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Счётчики core_state: инкременты копятся в памяти и сбрасываются одним UPDATE
+# ──────────────────────────────────────────────────────────────────────────────
+class _Shard:
+    """Накопитель одного потока; лок берётся только им самим и флашем."""
+
+    __slots__ = ("lock", "deltas", "last_updated")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.deltas = [0, 0, 0, 0]
+        self.last_updated: Optional[Tuple[int, str]] = None  # (seq, value)
+
+
+_shards: List[_Shard] = []
+_shards_lock = threading.Lock()
+_local = threading.local()
+_seq = itertools.count(1)
+_flush_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _shard() -> _Shard:
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = _Shard()
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def _collect(drain: bool) -> Tuple[List[int], Optional[str]]:
+    """Сумма дельт по шардам и самый свежий last_updated (drain=True — обнулить)."""
+    total = [0, 0, 0, 0]
+    latest: Optional[Tuple[int, str]] = None
+    with _shards_lock:
+        shards = list(_shards)
+    for shard in shards:
+        with shard.lock:
+            for i, d in enumerate(shard.deltas):
+                total[i] += d
+            if shard.last_updated and (latest is None or shard.last_updated[0] > latest[0]):
+                latest = shard.last_updated
+            if drain:
+                shard.deltas = [0, 0, 0, 0]
+                shard.last_updated = None
+    return total, latest[1] if latest else None
+
+
+def _ensure_flusher() -> None:
+    global _flusher
+    if _flusher is not None:
+        return
+    with _shards_lock:
+        if _flusher is not None:
+            return
+
+        def _loop() -> None:
+            while not _stop.wait(CORE_FLUSH_SEC):
+                try:
+                    flush_core()
+                except Exception:  # noqa: BLE001
+                    log.exception("core_state flush failed, will retry")
+
+        _flusher = threading.Thread(target=_loop, name="core-state-flush", daemon=True)
+        _flusher.start()
+
+
 def bump_core(delta_users=0, delta_intro=0, delta_reflect=0, delta_transition=0, last_updated: str | None = None) -> None:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        UPDATE core_state
-           SET users = MAX(users + ?, 0),
-               intro = MAX(intro + ?, 0),
-               reflect = MAX(reflect + ?, 0),
-               transition = MAX(transition + ?, 0),
-               last_updated = COALESCE(?, last_updated)
-         WHERE id = 1
-        """,
-        (delta_users, delta_intro, delta_reflect, delta_transition, last_updated),
-    )
-    conn.commit()
-    conn.close()
+    """Накопить инкременты; в core_state они попадут при ближайшем flush_core()."""
+    shard = _shard()
+    with shard.lock:
+        d = shard.deltas
+        d[0] += delta_users
+        d[1] += delta_intro
+        d[2] += delta_reflect
+        d[3] += delta_transition
+        if last_updated is not None:
+            shard.last_updated = (next(_seq), last_updated)
+    _ensure_flusher()
+
+
+def flush_core() -> bool:
+    """Сбросить накопленные дельты одним UPDATE. True, если было что писать."""
+    with _flush_lock:
+        deltas, last_updated = _collect(drain=True)
+        if not any(deltas) and last_updated is None:
+            return False
+        try:
+            conn = get_conn()
+            try:
+                conn.execute(
+                    """
+                    UPDATE core_state
+                       SET users = MAX(users + ?, 0),
+                           intro = MAX(intro + ?, 0),
+                           reflect = MAX(reflect + ?, 0),
+                           transition = MAX(transition + ?, 0),
+                           last_updated = COALESCE(?, last_updated)
+                     WHERE id = 1
+                    """,
+                    (*deltas, last_updated),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except BaseException:
+            # возвращаем дельты в текущий шард, чтобы не потерять их
+            shard = _shard()
+            with shard.lock:
+                for i, d in enumerate(deltas):
+                    shard.deltas[i] += d
+                if last_updated is not None and shard.last_updated is None:
+                    shard.last_updated = (0, last_updated)
+            raise
+        return True
+
+
+def stop_core_flusher() -> None:
+    """Остановить фоновый флаш и дописать хвост (shutdown)."""
+    global _flusher
+    if _flusher is not None:
+        _stop.set()
+        _flusher.join(timeout=5)
+        _flusher = None
+        _stop.clear()
+    flush_core()
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    if not _shards:
+        return
+    try:
+        flush_core()
+    except Exception:  # noqa: BLE001
+        log.exception("core_state flush at exit failed")
@@ -0,0 +1,49 @@
+# app/core/jsonfast.py
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+# orjson — в разы быстрее stdlib json; без него работаем на json
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(v: Any) -> Any:
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    if hasattr(v, "model_dump"):
+        return v.model_dump()
+    raise TypeError(f"not JSON serializable: {type(v).__name__}")
+
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTS)
+
+    loads = orjson.loads
+    JSONDecodeError = orjson.JSONDecodeError
+else:
+    _enc = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+    def dumps(obj: Any) -> bytes:
+        return _enc.encode(obj).encode("utf-8")
+
+    loads = json.loads
+    JSONDecodeError = json.JSONDecodeError
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse на dumps() выше — default_response_class веб-ядра."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+__all__ = ["dumps", "loads", "JSONDecodeError", "FastJSONResponse", "orjson"]
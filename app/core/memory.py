@@ -1,7 +1,10 @@
+import logging
 import sqlite3
 from datetime import datetime, timezone
 from pathlib import Path
 
+log = logging.getLogger(__name__)
+
 DB_PATH = Path("data/memory.db")
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
@@ -52,6 +55,13 @@ def save_reflection(text: str):
     with _connect() as conn:
         conn.execute("INSERT INTO reflections (text, created_at) VALUES (?, ?)", (text, now))
         conn.commit()
+    # дублируем в журнал полнотекстового поиска HQ (store); его сбой не ломает запись.
+    # Exception, а не sqlite3.Error: импорт store падает RuntimeError при не-sqlite DB_URL
+    try:
+        from app.core import store
+        store.log_reflection(None, text)
+    except Exception:
+        log.warning("reflection journal write failed", exc_info=True)
 
 def last_reflection() -> dict:
     with _connect() as conn:
@@ -0,0 +1,178 @@
+# app/core/metrics.py
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# границы корзин гистограмм (le, включительно)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+# запрос, не попавший ни в один маршрут (404) — одна серия на всех
+_UNMATCHED = "<unmatched>"
+
+
+class Histogram:
+    """Корзины храним не накопительно: observe — bisect + три инкремента."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # последняя — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        out, acc = [], 0
+        for bound, n in zip(self.bounds, self.counts):
+            acc += n
+            out.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {acc}')
+        out.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Series:
+    """Гистограммы одной тройки (method, route, status); метки отформатированы один раз."""
+
+    __slots__ = ("labels", "duration", "request_size", "response_size")
+
+    def __init__(self, method: str, route: str, status: int) -> None:
+        self.labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.request_size = Histogram(SIZE_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+
+
+class HttpMetrics:
+    """
+    Метрики HTTP веб-ядра одного процесса.
+
+    Пишутся только из event loop, поэтому без замков: серия ищется по
+    кортежу (method, route, status) и создаётся один раз, дальше — только
+    инкременты уже выделенных счётчиков. route — шаблон маршрута
+    (/api/timeline, /static/{path}), а не сырой путь: число серий ограничено.
+    """
+
+    def __init__(self) -> None:
+        self._series: Dict[Tuple[str, str, int], _Series] = {}
+        self.in_flight: Dict[str, int] = {m: 0 for m in (*sorted(_METHODS), "OTHER")}
+
+    def observe(self, method: str, route: str, status: int,
+                seconds: float, request_bytes: int, response_bytes: int) -> None:
+        key = (method, route, status)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series(method, route, status)
+        series.duration.observe(seconds)
+        series.request_size.observe(request_bytes)
+        series.response_size.observe(response_bytes)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (exposition 0.0.4)."""
+        series = list(self._series.values())
+        out = [
+            "# HELP http_requests_in_flight HTTP requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        out += [f'http_requests_in_flight{{method="{m}"}} {n}' for m, n in self.in_flight.items()]
+        for name, attr, help_ in (
+            ("http_request_duration_seconds", "duration", "Time from request start to the last response byte."),
+            ("http_request_size_bytes", "request_size", "Request body size."),
+            ("http_response_size_bytes", "response_size", "Response body size as sent (after compression)."),
+        ):
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} histogram")
+            for s in series:
+                out += getattr(s, attr).lines(name, s.labels)
+        return "\n".join(out) + "\n"
+
+    def reset(self) -> None:
+        self._series.clear()
+
+
+HTTP_METRICS = HttpMetrics()
+
+
+def _route_label(scope: Scope) -> str:
+    # роутер дописывает найденный маршрут в тот же scope
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", _UNMATCHED)
+    if "route_label" in scope:
+        return scope["route_label"]  # ответ из кэша веб-ядра (ResponseCacheMiddleware)
+    if "endpoint" in scope and scope.get("root_path"):
+        return scope["root_path"] + "/{path}"  # Mount (например, /static)
+    return _UNMATCHED
+
+
+class MetricsMiddleware:
+    """
+    Чистый ASGI: латентность, размеры тел и запросы «в работе» по маршрутам.
+    Ставится самым внешним, чтобы время и размер ответа были как на проводе.
+    """
+
+    def __init__(self, app: ASGIApp, *, metrics: HttpMetrics = HTTP_METRICS) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        metrics = self.metrics
+        method = scope["method"] if scope["method"] in _METHODS else "OTHER"
+        status = 500  # если обработчик упал до http.response.start
+        received = sent = 0
+
+        async def receive_counted() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def send_counted(message: Message) -> None:
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight[method] += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            metrics.in_flight[method] -= 1
+            metrics.observe(method, _route_label(scope), status,
+                            time.perf_counter() - started, received, sent)
+
+
+__all__ = [
+    "Histogram",
+    "HttpMetrics",
+    "HTTP_METRICS",
+    "MetricsMiddleware",
+    "LATENCY_BUCKETS",
+    "SIZE_BUCKETS",
+    "CONTENT_TYPE",
+]
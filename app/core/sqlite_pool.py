@@ -0,0 +1,181 @@
+# app/core/sqlite_pool.py
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# прагмы, которые ставим один раз на каждое соединение
+_COMMON_PRAGMAS = (
+    "PRAGMA busy_timeout=5000;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-8000;",       # ~8 МБ страничного кэша
+    "PRAGMA mmap_size=134217728;",    # 128 МБ mmap для чтения
+)
+_WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+)
+_READER_PRAGMAS = (
+    "PRAGMA query_only=ON;",
+)
+
+
+class _WaitCounter:
+    """Счётчик ожиданий пула: количество, сумма и максимум (мс)."""
+
+    __slots__ = ("count", "total_ms", "max_ms")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def as_dict(self) -> Dict[str, float]:
+        avg = self.total_ms / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "wait_ms_total": round(self.total_ms, 3),
+            "wait_ms_avg": round(avg, 3),
+            "wait_ms_max": round(self.max_ms, 3),
+        }
+
+
+class ConnectionManager:
+    """
+    Менеджер соединений к одному SQLite-файлу.
+
+    - пул read-соединений (WAL позволяет читать параллельно с записью);
+    - одно выделенное write-соединение, запись сериализуется его локом;
+    - прагмы применяются один раз при открытии соединения;
+    - счётчики времени ожидания соединения из пула.
+    """
+
+    def __init__(self, path: str, readers: int = 4, timeout: float = 30.0) -> None:
+        self.path = path
+        self.max_readers = max(1, int(readers))
+        self.timeout = timeout
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+        self._writer: sqlite3.Connection | None = None
+        self._writer_lock = threading.Lock()
+
+        self._read_waits = _WaitCounter()
+        self._write_waits = _WaitCounter()
+        self._read_timeouts = 0
+
+    # --- соединения ---
+
+    def _open(self, pragmas: tuple) -> sqlite3.Connection:
+        con = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            isolation_level=None,  # транзакциями управляем сами
+        )
+        for p in pragmas:
+            con.execute(p)
+        for p in _COMMON_PRAGMAS:
+            con.execute(p)
+        return con
+
+    def _writer_conn(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = self._open(_WRITER_PRAGMAS)
+        return self._writer
+
+    def _checkout_reader(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._readers_lock:
+            if len(self._all_readers) < self.max_readers:
+                # writer первым переводит файл в WAL, иначе query_only-ридер не сможет
+                if self._writer is None:
+                    with self._writer_lock:
+                        self._writer_conn()
+                con = self._open(_READER_PRAGMAS)
+                self._all_readers.append(con)
+                return con
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._readers_lock:
+                self._read_timeouts += 1
+            raise sqlite3.OperationalError(
+                "reader pool exhausted after %ss (%d readers busy, %s)"
+                % (self.timeout, self.max_readers, self.path)
+            ) from None
+
+    # --- публичный API ---
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Read-соединение из пула (autocommit, только чтение)."""
+        t0 = time.perf_counter()
+        con = self._checkout_reader()
+        self._read_waits.add((time.perf_counter() - t0) * 1000.0)
+        try:
+            yield con
+        finally:
+            self._idle.put(con)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Write-соединение внутри транзакции BEGIN IMMEDIATE.
+        Коммит при нормальном выходе, откат — при исключении.
+        """
+        t0 = time.perf_counter()
+        self._writer_lock.acquire()
+        self._write_waits.add((time.perf_counter() - t0) * 1000.0)
+        try:
+            con = self._writer_conn()
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            else:
+                con.execute("COMMIT")
+        finally:
+            self._writer_lock.release()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "path": self.path,
+            "readers_open": len(self._all_readers),
+            "readers_idle": self._idle.qsize(),
+            "readers_max": self.max_readers,
+            "reader_timeouts": self._read_timeouts,
+            "read": self._read_waits.as_dict(),
+            "write": self._write_waits.as_dict(),
+        }
+
+    def close(self) -> None:
+        with self._readers_lock:
+            for con in self._all_readers:
+                try:
+                    con.close()
+                except sqlite3.Error:
+                    pass
+            self._all_readers.clear()
+            self._idle = queue.LifoQueue()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
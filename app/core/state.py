@@ -1,34 +1,121 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field, asdict
+import os
+from collections import deque
 from datetime import datetime, timezone
 from threading import Lock
-from typing import List, Dict, Any
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.core.cycle_state import CycleState
+
+# сколько последних событий держит лента ядра
+CORE_EVENTS_CAPACITY = int(os.getenv("CORE_EVENTS_CAPACITY", "200"))
+
+# базовые фазы портала — всегда есть в снапшоте, даже с нулём
+BASE_SCENES = ("intro", "reflect", "transition")
+
+
+class EventRecord:
+    """Событие ленты: компактная запись без __dict__; после создания не меняется."""
+
+    __slots__ = ("ts", "cycle", "source", "scene", "payload")
+
+    def __init__(self, ts: str, cycle: int, source: str, scene: str, payload: Dict[str, Any]) -> None:
+        self.ts = ts
+        self.cycle = cycle
+        self.source = source
+        self.scene = scene
+        self.payload = payload
+
+    # чтение как у dict — для кода, который ждёт прежний формат событий
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ts": self.ts,
+            "cycle": self.cycle,
+            "source": self.source,
+            "scene": self.scene,
+            "payload": self.payload,
+        }
 
 
-@dataclass
 class CoreState:
-    """Мини-память и состояние ядра портала."""
-    cycle: int = 0
-    last_update: str = "-"
+    """
+    Мини-память и состояние ядра портала — неизменяемый снапшот.
+
+    Строится StateStore один раз на версию; читатели получают его по ссылке.
+    events — последние N событий, новые сверху.
+    """
+
+    __slots__ = ("version", "cycle", "last_update", "counters", "events", "_dict")
+
+    def __init__(self, version: int, cycle: int, last_update: str,
+                 counters: Dict[str, int], events: Tuple[EventRecord, ...]) -> None:
+        self.version = version
+        self.cycle = cycle
+        self.last_update = last_update
+        self.counters = counters
+        self.events = events
+        self._dict: Optional[Dict[str, Any]] = None
+
     # счётчики фаз портала
-    intro: int = 0
-    reflect: int = 0
-    transition: int = 0
-    # лента событий (последние N)
-    events: List[Dict[str, Any]] = field(default_factory=list)
+    @property
+    def intro(self) -> int:
+        return self.counters.get("intro", 0)
+
+    @property
+    def reflect(self) -> int:
+        return self.counters.get("reflect", 0)
+
+    @property
+    def transition(self) -> int:
+        return self.counters.get("transition", 0)
 
     def snapshot(self) -> Dict[str, Any]:
-        return asdict(self)
+        # dict тоже собирается один раз на снапшот; вызывающим — не мутировать
+        if self._dict is None:
+            d: Dict[str, Any] = {"cycle": self.cycle, "last_update": self.last_update}
+            for scene in BASE_SCENES:
+                d[scene] = self.counters.get(scene, 0)
+            d["counters"] = dict(self.counters)
+            d["events"] = [e.to_dict() for e in self.events]
+            self._dict = d
+        return self._dict
 
 
 class StateStore:
+    """
+    Состояние ядра: счётчики по сценам + кольцо последних событий.
+
+    - запись — O(1): deque(maxlen=capacity) сам вытесняет старое;
+    - чтение copy-on-write: get_state() отдаёт готовый неизменяемый снапшот
+      по ссылке; новый собирается лениво, один раз на версию — под замком
+      только копирование указателей кольца.
+    """
+
     _instance: "StateStore | None" = None
     _lock = Lock()
 
-    def __init__(self) -> None:
-        self.state = CoreState()
+    def __init__(self, capacity: int = CORE_EVENTS_CAPACITY) -> None:
+        self.capacity = max(1, int(capacity))
         self._state_lock = Lock()
+        self._cycle = 0
+        self._last_update = "-"
+        self._counters: Dict[str, int] = {s: 0 for s in BASE_SCENES}
+        self._ring: Deque[EventRecord] = deque(maxlen=self.capacity)
+        self._version = 0
+        self._snap = CoreState(0, 0, "-", dict(self._counters), ())
+        self._cycle_state = CycleState.from_parts(
+            cycle=0, last_update="-", first_event=None, last_event=None, counters=self._counters
+        )
 
     # --- singleton ---
 
@@ -42,56 +129,78 @@ class StateStore:
 
     # --- внутреннее ---
 
-    def _bump_scene_counter(self, scene: str) -> None:
-        """Увеличиваем счётчики фаз портала, если сцена одна из базовых."""
-        if scene == "intro":
-            self.state.intro += 1
-        elif scene == "reflect":
-            self.state.reflect += 1
-        elif scene == "transition":
-            self.state.transition += 1
-
-    def _push_event(self, source: str, scene: str, payload: Dict[str, Any]) -> None:
-        """Добавляем событие в ленту (последние N, новые сверху)."""
-        evt = {
-            "ts": datetime.now(timezone.utc).isoformat(),
-            "cycle": self.state.cycle,
-            "source": source,
-            "scene": scene,
-            "payload": payload or {},
-        }
-        # новые события в начало
-        self.state.events.insert(0, evt)
-        # держим последние 200
-        self.state.events = self.state.events[:200]
+    def _record(self, source: str, scene: str, payload: Dict[str, Any]) -> EventRecord:
+        """Новый цикл + событие в ленту. Вызывать под _state_lock."""
+        now = datetime.now(timezone.utc).isoformat()
+        self._cycle += 1
+        self._last_update = now
+        # считаем только базовые фазы: scene приходит от клиента, и словарь
+        # счётчиков не должен расти с каждым новым именем
+        if scene in self._counters:
+            self._counters[scene] += 1
+        evt = EventRecord(now, self._cycle, source, scene, payload or {})
+        self._ring.append(evt)
+        self._version += 1
+        return evt
 
     # --- публичные операции ядра ---
 
-    def sync(self, source: str = "ui") -> CoreState:
+    def sync(self, source: str = "ui") -> EventRecord:
         """
         Базовая синхронизация ядра.
         Сейчас считаем её сценой 'transition' от заданного source.
         """
         with self._state_lock:
-            self.state.cycle += 1
-            self.state.last_update = datetime.now(timezone.utc).isoformat()
-            scene = "transition"
-            self._bump_scene_counter(scene)
-            self._push_event(source=source, scene=scene, payload={})
-            return self.state
-
-    def add_event(self, source: str, scene: str, payload: Dict[str, Any] | None = None) -> CoreState:
+            return self._record(source, "transition", {})
+
+    def add_event(self, source: str, scene: str, payload: Dict[str, Any] | None = None) -> EventRecord:
         """
         Добавление произвольного события портала.
         Используется тренером/ботом через /api/event.
         """
         with self._state_lock:
-            self.state.cycle += 1
-            self.state.last_update = datetime.now(timezone.utc).isoformat()
-            self._bump_scene_counter(scene)
-            self._push_event(source=source, scene=scene, payload=payload or {})
-            return self.state
+            return self._record(source, scene, payload or {})
+
+    @property
+    def version(self) -> int:
+        return self._version
 
     def get_state(self) -> CoreState:
+        snap = self._snap
+        if snap.version == self._version:
+            return snap  # ничего не менялось — тот же объект
+        with self._state_lock:
+            snap = CoreState(
+                self._version,
+                self._cycle,
+                self._last_update,
+                dict(self._counters),
+                tuple(reversed(self._ring)),
+            )
+        if snap.version > self._snap.version:
+            self._snap = snap
+        return snap
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self.get_state().snapshot()
+
+    def cycle_state(self) -> CycleState:
+        """
+        Проекция CycleState, версионированная номером цикла: пока cycle не
+        сменился — возвращается тот же объект. Новая собирается за O(1)
+        из концов кольца и счётчиков, которые поддерживаются при записи.
+        """
+        cs = self._cycle_state
+        if cs.cycle == self._cycle:
+            return cs
         with self._state_lock:
-            return self.state
+            cs = CycleState.from_parts(
+                cycle=self._cycle,
+                last_update=self._last_update,
+                first_event=self._ring[0] if self._ring else None,
+                last_event=self._ring[-1] if self._ring else None,
+                counters=self._counters,
+            )
+        if cs.cycle > self._cycle_state.cycle:
+            self._cycle_state = cs
+        return cs
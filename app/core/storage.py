@@ -61,3 +61,15 @@ class TimelineStore:
         with self._conn() as c:
             c.execute("DELETE FROM events")
             c.commit()
+
+
+def open_timeline_store(backend: Optional[str] = None):
+    """TimelineStore по TIMELINE_BACKEND: sqlite (по умолчанию) или segmented."""
+    import os
+
+    backend = (backend or os.getenv("TIMELINE_BACKEND", "sqlite")).lower()
+    if backend == "segmented":
+        from app.core.timeline_log import SegmentedTimelineStore
+
+        return SegmentedTimelineStore()
+    return TimelineStore()
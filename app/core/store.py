@@ -1,15 +1,35 @@
 from __future__ import annotations
 
+import logging
 import os
 import sqlite3
 import threading
+import time
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
+
+from app.core.sqlite_pool import ConnectionManager
+from app.storage.dedup_index import DedupIndex
 
 # --- config -----------------------------------------------------------------
 DB_URL = os.getenv("DB_URL", "sqlite:////data/elaya.db")
+STORE_READERS = int(os.getenv("STORE_READERS", "4"))
+STORE_DEDUP_TTL_SEC = int(os.getenv("STORE_DEDUP_TTL_SEC", "86400"))
+STORE_MIGRATE_BATCH = int(os.getenv("STORE_MIGRATE_BATCH", "500"))
+# поиск ранжирует (bm25) только столько самых свежих совпадений
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "300"))
+
+log = logging.getLogger(__name__)
 
-_lock = threading.RLock()
+# user_version схемы scene_state:
+#   1 — updated_at TEXT (ISO), без индексов
+#   2 — + updated_us INTEGER (epoch, мкс), индекс по нему и частичный
+#       покрывающий индекс по непустым рефлексиям (текст хранится обрезанным)
+SCHEMA_VERSION = 2
+_schema_v2 = False
+
+_pool: ConnectionManager | None = None
+_pool_lock = threading.Lock()
 
 
 def _db_path_from_url(url: str) -> str:
@@ -21,31 +41,462 @@ def _db_path_from_url(url: str) -> str:
 
 _DB_PATH = _db_path_from_url(DB_URL)
 
+
+def _manager() -> ConnectionManager:
+    """Ленивый менеджер соединений (пул ридеров + один writer)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionManager(_DB_PATH, readers=STORE_READERS)
+    return _pool
+
+
+def pool_stats() -> dict:
+    """Счётчики пула соединений (ожидание ридеров/writer'а)."""
+    return _manager().stats()
+
+
 # --- bootstrap --------------------------------------------------------------
 def init_db() -> None:
     os.makedirs(os.path.dirname(_DB_PATH), exist_ok=True)
-    with sqlite3.connect(_DB_PATH) as con:
-        con.execute("PRAGMA journal_mode=WAL;")
-        con.execute("PRAGMA synchronous=NORMAL;")
+    with _manager().writer() as con:
         con.execute(
             """
             CREATE TABLE IF NOT EXISTS scene_state (
                 user_id INTEGER PRIMARY KEY,
                 last_scene TEXT NOT NULL,
                 last_reflect TEXT,
-                updated_at TEXT NOT NULL
+                updated_at TEXT NOT NULL,
+                updated_us INTEGER
             )
             """
         )
+        _ensure_schema_v2(con)
+        # своя таблица дедупа: webhook_seen в том же файле ведёт app.storage.db
+        # (INTEGER epoch) — общая таблица со своей чисткой стирала бы чужие строки
         con.execute(
             """
-            CREATE TABLE IF NOT EXISTS webhook_seen (
+            CREATE TABLE IF NOT EXISTS core_webhook_seen (
                 update_id INTEGER PRIMARY KEY,
-                seen_at TEXT NOT NULL
+                seen_at INTEGER NOT NULL
+            )
+            """
+        )
+        con.execute(
+            "CREATE INDEX IF NOT EXISTS idx_core_webhook_seen_seen_at ON core_webhook_seen(seen_at)"
+        )
+        # материализованные агрегаты по scene_state (одна строка)
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scene_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                users INTEGER NOT NULL DEFAULT 0,
+                intro INTEGER NOT NULL DEFAULT 0,
+                reflect INTEGER NOT NULL DEFAULT 0,
+                transition INTEGER NOT NULL DEFAULT 0,
+                last_update TEXT,
+                last_reflect_user_id INTEGER,
+                last_reflect TEXT,
+                last_reflect_at TEXT
             )
             """
         )
-        con.commit()
+        if con.execute("SELECT 1 FROM scene_stats WHERE id=1").fetchone() is None:
+            _rebuild_aggregates(con)
+        _ensure_reflection_index(con)
+
+    if not _schema_v2:
+        start_migration()
+
+
+# --- schema v2 ----------------------------------------------------------------
+def _now() -> tuple[str, int]:
+    """Текущее время: ISO-строка (для API) и epoch в микросекундах (для индексов)."""
+    now = datetime.now(timezone.utc)
+    return now.replace(tzinfo=None).isoformat() + "Z", int(now.timestamp() * 1_000_000)
+
+
+def _norm_reflect(text: str | None) -> str | None:
+    # храним обрезанным, чтобы частичный индекс обходился без TRIM()
+    return text.strip() if text is not None else None
+
+
+def _ensure_schema_v2(con: sqlite3.Connection) -> None:
+    """DDL v2 (идемпотентно). Данные догоняет migrate_v2()."""
+    global _schema_v2
+    cols = {r[1] for r in con.execute("PRAGMA table_info(scene_state)")}
+    if "updated_us" not in cols:
+        con.execute("ALTER TABLE scene_state ADD COLUMN updated_us INTEGER")
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_scene_state_updated_us "
+        "ON scene_state(updated_us)"
+    )
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_scene_state_reflect_us "
+        "ON scene_state(updated_us, user_id, last_reflect) "
+        "WHERE last_reflect IS NOT NULL AND last_reflect <> ''"
+    )
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        pending = con.execute(
+            "SELECT 1 FROM scene_state WHERE updated_us IS NULL LIMIT 1"
+        ).fetchone()
+        if pending is None:
+            con.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            version = SCHEMA_VERSION
+    _schema_v2 = version >= SCHEMA_VERSION
+
+
+def migrate_v2(batch_size: int = STORE_MIGRATE_BATCH, pause_sec: float = 0.01) -> int:
+    """
+    Онлайн-миграция v1 → v2: конвертирует ISO updated_at в updated_us
+    (julianday точен до мс) и обрезает рефлексии порциями по batch_size
+    строк. Каждая порция — своя короткая транзакция, между ними writer
+    свободен для бота.
+    Возвращает число сконвертированных строк.
+    """
+    global _schema_v2
+    total = 0
+    while True:
+        with _manager().writer() as con:
+            cur = con.execute(
+                """
+                UPDATE scene_state
+                SET updated_us = COALESCE(
+                        CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000000) AS INTEGER),
+                        0
+                    ),
+                    last_reflect = TRIM(last_reflect)
+                WHERE rowid IN (
+                    SELECT rowid FROM scene_state WHERE updated_us IS NULL LIMIT ?
+                )
+                """,
+                (batch_size,),
+            )
+            done = cur.rowcount
+            total += done
+            if done < batch_size:
+                con.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+                _rebuild_aggregates(con)
+                _schema_v2 = True
+                return total
+        time.sleep(pause_sec)
+
+
+def start_migration() -> threading.Thread:
+    """Запустить migrate_v2() в фоновом потоке (не блокирует старт бота)."""
+
+    def _run() -> None:
+        try:
+            n = migrate_v2()
+            log.info("scene_state: schema v2 migration done, %s rows converted", n)
+        except Exception:  # noqa: BLE001
+            log.exception("scene_state: schema v2 migration failed")
+
+    t = threading.Thread(target=_run, name="scene-state-v2", daemon=True)
+    t.start()
+    return t
+
+
+# --- aggregates ---------------------------------------------------------------
+_SCENE_COLUMNS = ("intro", "reflect", "transition")
+
+
+def _has_text(text: str | None) -> bool:
+    return bool(text and text.strip())
+
+
+def _refresh_last_reflection(con: sqlite3.Connection) -> None:
+    """Указатель на самую свежую непустую рефлексию — из базовой таблицы."""
+    if _schema_v2:
+        # частичный индекс idx_scene_state_reflect_us, без скана
+        ref = con.execute(
+            """
+            SELECT user_id, last_reflect, updated_at
+            FROM scene_state
+            WHERE last_reflect IS NOT NULL AND last_reflect <> ''
+            ORDER BY updated_us DESC
+            LIMIT 1
+            """
+        ).fetchone()
+    else:
+        ref = con.execute(
+            """
+            SELECT user_id, last_reflect, updated_at
+            FROM scene_state
+            WHERE last_reflect IS NOT NULL AND TRIM(last_reflect) <> ''
+            ORDER BY updated_at DESC
+            LIMIT 1
+            """
+        ).fetchone()
+    con.execute(
+        "UPDATE scene_stats SET last_reflect_user_id=?, last_reflect=?, last_reflect_at=? "
+        "WHERE id=1",
+        ref if ref else (None, None, None),
+    )
+
+
+def _rebuild_aggregates(con: sqlite3.Connection) -> None:
+    users = con.execute("SELECT COUNT(*) FROM scene_state").fetchone()[0]
+    if _schema_v2:
+        last = con.execute(
+            "SELECT updated_at FROM scene_state ORDER BY updated_us DESC LIMIT 1"
+        ).fetchone()
+        last_update = last[0] if last else None
+    else:
+        last_update = con.execute("SELECT MAX(updated_at) FROM scene_state").fetchone()[0]
+    counts = dict.fromkeys(_SCENE_COLUMNS, 0)
+    for scene, cnt in con.execute(
+        "SELECT last_scene, COUNT(*) FROM scene_state GROUP BY last_scene"
+    ):
+        if scene in counts:
+            counts[scene] = int(cnt)
+    con.execute(
+        """
+        INSERT INTO scene_stats(id, users, intro, reflect, transition, last_update)
+        VALUES(1, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+          users=excluded.users,
+          intro=excluded.intro,
+          reflect=excluded.reflect,
+          transition=excluded.transition,
+          last_update=excluded.last_update
+        """,
+        (int(users or 0), counts["intro"], counts["reflect"], counts["transition"], last_update),
+    )
+    _refresh_last_reflection(con)
+
+
+def rebuild_aggregates() -> dict:
+    """Пересчитать scene_stats из scene_state (ремонт после ручных правок)."""
+    with _manager().writer() as con:
+        _rebuild_aggregates(con)
+    return get_stats()
+
+
+def _apply_scene_change(
+    con: sqlite3.Connection,
+    user_id: int,
+    old: tuple | None,
+    new_scene: str,
+    new_reflect: str | None,
+    ts: str,
+) -> None:
+    """Инкрементально обновить scene_stats в той же транзакции, что и scene_state."""
+    deltas = dict.fromkeys(_SCENE_COLUMNS, 0)
+    users = 0
+    if old is None:
+        users = 1
+    else:
+        old_scene = old[0]
+        if old_scene in deltas:
+            deltas[old_scene] -= 1
+    if new_scene in deltas:
+        deltas[new_scene] += 1
+    con.execute(
+        """
+        UPDATE scene_stats
+        SET users=users+?, intro=intro+?, reflect=reflect+?, transition=transition+?,
+            last_update=?
+        WHERE id=1
+        """,
+        (users, deltas["intro"], deltas["reflect"], deltas["transition"], ts),
+    )
+
+    if _has_text(new_reflect):
+        con.execute(
+            "UPDATE scene_stats SET last_reflect_user_id=?, last_reflect=?, last_reflect_at=? "
+            "WHERE id=1",
+            (user_id, new_reflect, ts),
+        )
+    else:
+        pointer = con.execute(
+            "SELECT last_reflect_user_id FROM scene_stats WHERE id=1"
+        ).fetchone()
+        if pointer and pointer[0] == user_id:
+            # у текущего «последнего» рефлексию стёрли — ищем следующего
+            _refresh_last_reflection(con)
+
+
+# --- reflections full-text search ---------------------------------------------
+def _ensure_reflection_index(con: sqlite3.Connection) -> None:
+    """
+    Журнал рефлексий + FTS5-индекс (external content), синхронизируется
+    триггерами. Первый запуск засевает журнал текущими рефлексиями из scene_state.
+    """
+    fresh = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='reflection_log'"
+    ).fetchone() is None
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reflection_log (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            text TEXT NOT NULL,
+            created_us INTEGER NOT NULL
+        )
+        """
+    )
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reflection_log_created_us "
+        "ON reflection_log(created_us)"
+    )
+    # unicode61 складывает регистр и ё/й; prefix-индексы 3..8 — поиск по основе слова
+    # идёт по индексу, а не слиянием всех подходящих термов (см. _fts_query)
+    con.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS reflection_fts USING fts5(
+            text,
+            content='reflection_log',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='3 4 5 6 7 8'
+        )
+        """
+    )
+    con.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS reflection_log_ai AFTER INSERT ON reflection_log BEGIN
+          INSERT INTO reflection_fts(rowid, text) VALUES (new.id, new.text);
+        END
+        """
+    )
+    con.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS reflection_log_ad AFTER DELETE ON reflection_log BEGIN
+          INSERT INTO reflection_fts(reflection_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END
+        """
+    )
+    if fresh:
+        con.execute(
+            """
+            INSERT INTO reflection_log(user_id, text, created_us)
+            SELECT user_id, last_reflect, COALESCE(
+                updated_us,
+                CAST(ROUND((julianday(updated_at) - 2440587.5) * 86400000000) AS INTEGER),
+                0
+            )
+            FROM scene_state
+            WHERE last_reflect IS NOT NULL AND TRIM(last_reflect) <> ''
+            ORDER BY updated_at
+            """
+        )
+
+
+def _log_reflection(con: sqlite3.Connection, user_id: int | None, text: str, ts_us: int) -> None:
+    con.execute(
+        "INSERT INTO reflection_log(user_id, text, created_us) VALUES(?,?,?)",
+        (user_id, text, ts_us),
+    )
+
+
+def log_reflection(user_id: int | None, text: str) -> None:
+    """Добавить рефлексию в журнал поиска (для источников вне scene_state)."""
+    text = _norm_reflect(text)
+    if not _has_text(text):
+        return
+    with _manager().writer() as con:
+        _log_reflection(con, user_id, text, _now()[1])
+
+
+_PREFIX_MAX = 8
+
+
+def _fts_query(query: str) -> str:
+    """
+    Каждое слово — отдельный терм в кавычках (синтаксис FTS5 из ввода не
+    интерпретируется). Слова от 3 букв ищутся по префиксу не длиннее
+    _PREFIX_MAX: «голос» найдёт «голосом», «импровизация» — «импровизировать».
+    """
+    terms = []
+    for word in query.split():
+        word = word.replace('"', "")
+        if not word:
+            continue
+        if len(word) >= 3:
+            terms.append(f'"{word[:_PREFIX_MAX]}"*')
+        else:
+            terms.append(f'"{word}"')
+    return " ".join(terms)
+
+
+def _to_us(since: datetime | float | int | None) -> int | None:
+    if since is None:
+        return None
+    if isinstance(since, datetime):
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return int(since.timestamp() * 1_000_000)
+    return int(float(since) * 1_000_000)
+
+
+def search_reflections(
+    query: str,
+    since: datetime | float | int | None = None,
+    limit: int = 20,
+) -> list[dict]:
+    """
+    Полнотекстовый поиск по рефлексиям всех пользователей.
+    Ранжирование bm25 среди SEARCH_RANK_WINDOW самых свежих совпадений —
+    время запроса не растёт вместе с числом совпадений у частых слов.
+    since — datetime (naive = UTC) или epoch в секундах.
+    """
+    match = _fts_query(query)
+    if not match:
+        return []
+    since_us = _to_us(since)
+    limit = max(1, min(int(limit), 200))
+
+    with _manager().reader() as con:
+        min_id = 0
+        if since_us is not None:
+            # id растут вместе со временем записи: since -> нижняя граница rowid
+            row = con.execute(
+                "SELECT id FROM reflection_log WHERE created_us >= ? "
+                "ORDER BY created_us LIMIT 1",
+                (since_us,),
+            ).fetchone()
+            if row is None:
+                return []
+            min_id = row[0]
+        rows = con.execute(
+            """
+            WITH hits AS (
+                SELECT rowid AS id, bm25(reflection_fts) AS score
+                FROM reflection_fts
+                WHERE reflection_fts MATCH ? AND rowid >= ?
+                ORDER BY rowid DESC
+                LIMIT ?
+            )
+            SELECT l.id, l.user_id, l.text, l.created_us
+            FROM hits JOIN reflection_log l ON l.id = hits.id
+            WHERE l.created_us >= ?
+            ORDER BY hits.score, l.id DESC
+            LIMIT ?
+            """,
+            (match, min_id, max(SEARCH_RANK_WINDOW, limit), since_us or 0, limit),
+        ).fetchall()
+    return [
+        {"id": rid, "user_id": uid, "text": text, "created_at": _iso_us(us)}
+        for rid, uid, text, us in rows
+    ]
+
+
+def _iso_us(us: int) -> str:
+    return datetime.fromtimestamp(us / 1_000_000, tz=timezone.utc).replace(
+        tzinfo=None
+    ).isoformat() + "Z"
+
+
+def rebuild_reflection_index(optimize: bool = True) -> int:
+    """Пересобрать FTS-индекс из reflection_log. Возвращает число записей."""
+    with _manager().writer() as con:
+        con.execute("INSERT INTO reflection_fts(reflection_fts) VALUES('rebuild')")
+        if optimize:
+            con.execute("INSERT INTO reflection_fts(reflection_fts) VALUES('optimize')")
+        return int(con.execute("SELECT COUNT(*) FROM reflection_log").fetchone()[0])
 
 
 # --- rows -------------------------------------------------------------------
@@ -59,7 +510,7 @@ class SceneRow:
 
 # --- CRUD -------------------------------------------------------------------
 def get_scene(user_id: int) -> SceneRow | None:
-    with _lock, sqlite3.connect(_DB_PATH) as con:
+    with _manager().reader() as con:
         cur = con.execute(
             "SELECT user_id,last_scene,last_reflect,updated_at "
             "FROM scene_state WHERE user_id=?",
@@ -70,158 +521,150 @@ def get_scene(user_id: int) -> SceneRow | None:
 
 
 def upsert_scene(user_id: int, last_scene: str, last_reflect: str | None = None) -> None:
-    ts = datetime.utcnow().isoformat() + "Z"
-    with _lock, sqlite3.connect(_DB_PATH) as con:
+    ts, ts_us = _now()
+    last_reflect = _norm_reflect(last_reflect)
+    with _manager().writer() as con:
+        old = con.execute(
+            "SELECT last_scene, last_reflect FROM scene_state WHERE user_id=?", (user_id,)
+        ).fetchone()
         con.execute(
             """
-            INSERT INTO scene_state(user_id,last_scene,last_reflect,updated_at)
-            VALUES(?,?,?,?)
+            INSERT INTO scene_state(user_id,last_scene,last_reflect,updated_at,updated_us)
+            VALUES(?,?,?,?,?)
             ON CONFLICT(user_id) DO UPDATE SET
               last_scene=excluded.last_scene,
               last_reflect=excluded.last_reflect,
-              updated_at=excluded.updated_at
+              updated_at=excluded.updated_at,
+              updated_us=excluded.updated_us
             """,
-            (user_id, last_scene, last_reflect, ts),
+            (user_id, last_scene, last_reflect, ts, ts_us),
         )
-        con.commit()
+        _apply_scene_change(con, user_id, old, last_scene, last_reflect, ts)
+        # в журнал поиска — только новая рефлексия, не повтор прежней
+        if _has_text(last_reflect) and (old is None or old[1] != last_reflect):
+            _log_reflection(con, user_id, last_reflect, ts_us)
 
 
 def add_reflection(user_id: int, reflection: str) -> None:
-    ts = datetime.utcnow().isoformat() + "Z"
-    with _lock, sqlite3.connect(_DB_PATH) as con:
+    ts, ts_us = _now()
+    text = _norm_reflect(reflection)
+    with _manager().writer() as con:
+        old = con.execute(
+            "SELECT last_scene, last_reflect FROM scene_state WHERE user_id=?", (user_id,)
+        ).fetchone()
+        if old is None:
+            return
         con.execute(
             """
             UPDATE scene_state
-            SET last_reflect=?, updated_at=?
+            SET last_reflect=?, updated_at=?, updated_us=?
             WHERE user_id=?
             """,
-            (reflection.strip(), ts, user_id),
+            (text, ts, ts_us, user_id),
         )
-        con.commit()
+        _apply_scene_change(con, user_id, old, old[0], text, ts)
+        if _has_text(text) and old[1] != text:
+            _log_reflection(con, user_id, text, ts_us)
 
 
-def is_duplicate_update(update_id: int) -> bool:
-    with _lock, sqlite3.connect(_DB_PATH) as con:
-        cur = con.execute("SELECT 1 FROM webhook_seen WHERE update_id=?", (update_id,))
-        if cur.fetchone():
-            return True
+# --- dedup -------------------------------------------------------------------
+def _persist_seen(rows: list[tuple[int, int]], cutoff: int) -> None:
+    with _manager().writer() as con:
+        if rows:
+            con.executemany(
+                "INSERT OR IGNORE INTO core_webhook_seen(update_id, seen_at) VALUES(?, ?)", rows
+            )
         con.execute(
-            "INSERT INTO webhook_seen(update_id, seen_at) VALUES(?, ?)",
-            (update_id, datetime.utcnow().isoformat() + "Z"),
+            "DELETE FROM core_webhook_seen WHERE rowid IN "
+            "(SELECT rowid FROM core_webhook_seen WHERE seen_at < ? LIMIT 1000)",
+            (cutoff,),
         )
-        con.commit()
-        return False
 
 
-# --- HQ stats (расширенная) -------------------------------------------------
-def get_stats() -> dict:
-    with _lock, sqlite3.connect(_DB_PATH) as con:
-        con.row_factory = sqlite3.Row
+def _load_seen(cutoff: int) -> list[tuple[int, int]]:
+    with _manager().reader() as con:
+        return con.execute(
+            "SELECT update_id, seen_at FROM core_webhook_seen WHERE seen_at >= ?", (cutoff,)
+        ).fetchall()
 
-        row = con.execute(
-            "SELECT COUNT(*) AS users_cnt, MAX(updated_at) AS last_update FROM scene_state"
-        ).fetchone()
-        users_cnt = int(row["users_cnt"] or 0)
-        last_update = row["last_update"]
 
-        counts = {"intro": 0, "reflect": 0, "transition": 0}
-        for r in con.execute(
-            "SELECT last_scene, COUNT(*) AS c FROM scene_state GROUP BY last_scene"
-        ):
-            if r["last_scene"] in counts:
-                counts[r["last_scene"]] = int(r["c"] or 0)
+_dedup: DedupIndex | None = None
 
-        ref = con.execute(
-            """
-            SELECT last_reflect, updated_at
-            FROM scene_state
-            WHERE last_reflect IS NOT NULL AND TRIM(last_reflect) <> ''
-            ORDER BY updated_at DESC
-            LIMIT 1
-            """
-        ).fetchone()
-        last_reflect = ref["last_reflect"] if ref else None
-        last_reflect_at = ref["updated_at"] if ref else None
+
+def _dedup_index() -> DedupIndex:
+    # update_id у Telegram монотонны: старше окна — значит уже обработан
+    global _dedup
+    if _dedup is None:
+        with _pool_lock:
+            if _dedup is None:
+                _dedup = DedupIndex(
+                    STORE_DEDUP_TTL_SEC,
+                    monotonic=True,
+                    persist=_persist_seen,
+                    load=_load_seen,
+                )
+                _dedup.start_snapshots()
+    return _dedup
+
+
+def is_duplicate_update(update_id: int) -> bool:
+    return _dedup_index().seen(update_id)
+
+
+# --- HQ stats (расширенная) -------------------------------------------------
+def _read_aggregates() -> sqlite3.Row | None:
+    with _manager().reader() as con:
+        cur = con.cursor()
+        cur.row_factory = sqlite3.Row
+        return cur.execute("SELECT * FROM scene_stats WHERE id=1").fetchone()
+
+
+def get_stats() -> dict:
+    row = _read_aggregates()
+    counts = {k: int(row[k]) if row else 0 for k in _SCENE_COLUMNS}
 
     return {
-        "users": users_cnt,
-        "last_update": last_update,
+        "users": int(row["users"]) if row else 0,
+        "last_update": row["last_update"] if row else None,
         "counts": counts,
-        "last_reflection": {"text": last_reflect, "at": last_reflect_at},
+        "last_reflection": {
+            "text": row["last_reflect"] if row else None,
+            "at": row["last_reflect_at"] if row else None,
+        },
     }
 
 
 # --- HQ stats (компактная для /ui/stats.json) -------------------------------
 def get_scene_stats() -> dict:
-    with _lock, sqlite3.connect(_DB_PATH) as con:
-        counts = {"intro": 0, "reflect": 0, "transition": 0}
-        for scene, cnt in con.execute(
-            "SELECT last_scene, COUNT(*) FROM scene_state GROUP BY last_scene"
-        ).fetchall():
-            if scene in counts:
-                counts[scene] = int(cnt)
-
-        last_updated = con.execute(
-            "SELECT MAX(updated_at) FROM scene_state"
-        ).fetchone()[0]
-
-        last_reflection = con.execute(
-            """
-            SELECT last_reflect
-            FROM scene_state
-            WHERE last_reflect IS NOT NULL AND TRIM(last_reflect) <> ''
-            ORDER BY updated_at DESC
-            LIMIT 1
-            """
-        ).fetchone()
-        last_reflection = last_reflection[0] if last_reflection else None
+    row = _read_aggregates()
+    counts = {k: int(row[k]) if row else 0 for k in _SCENE_COLUMNS}
 
     return {
         "counts": counts,
-        "last_updated": last_updated,
-        "last_reflection": last_reflection,
+        "last_updated": row["last_update"] if row else None,
+        "last_reflection": row["last_reflect"] if row else None,
     }
 
 
 # --- Aggregates for UI / Pulse ----------------------------------------------
 def get_counts() -> dict:
-    with _lock, sqlite3.connect(_DB_PATH) as con:
-        cur = con.execute("SELECT COUNT(*) FROM scene_state")
-        users = cur.fetchone()[0] or 0
-
-        cur = con.execute(
-            """
-            SELECT last_scene, COUNT(*)
-            FROM scene_state
-            GROUP BY last_scene
-            """
-        )
-        by_scene = {row[0]: row[1] for row in cur.fetchall()}
-
-        cur = con.execute("SELECT COALESCE(MAX(updated_at), '') FROM scene_state")
-        last_updated = cur.fetchone()[0] or ""
+    row = _read_aggregates()
 
     return {
-        "users": users,
-        "intro": by_scene.get("intro", 0),
-        "reflect": by_scene.get("reflect", 0),
-        "transition": by_scene.get("transition", 0),
-        "last_updated": last_updated,
+        "users": int(row["users"]) if row else 0,
+        "intro": int(row["intro"]) if row else 0,
+        "reflect": int(row["reflect"]) if row else 0,
+        "transition": int(row["transition"]) if row else 0,
+        "last_updated": (row["last_update"] if row else None) or "",
     }
 
 
 def get_last_reflection() -> dict | None:
-    with _lock, sqlite3.connect(_DB_PATH) as con:
-        cur = con.execute(
-            """
-            SELECT user_id, last_reflect, updated_at
-            FROM scene_state
-            WHERE last_reflect IS NOT NULL AND TRIM(last_reflect) <> ''
-            ORDER BY updated_at DESC
-            LIMIT 1
-            """
-        )
-        row = cur.fetchone()
-        if not row:
-            return None
-        return {"user_id": row[0], "text": row[1], "updated_at": row[2]}
+    row = _read_aggregates()
+    if not row or row["last_reflect_user_id"] is None:
+        return None
+    return {
+        "user_id": row["last_reflect_user_id"],
+        "text": row["last_reflect"],
+        "updated_at": row["last_reflect_at"],
+    }
@@ -0,0 +1,401 @@
+# app/core/timeline_buffer.py
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.jsonfast import dumps, loads
+
+log = logging.getLogger(__name__)
+
+TIMELINE_CAPACITY = int(os.getenv("TIMELINE_CAPACITY", "5000"))
+# пусто — без спилла: вытесненные события просто забываются
+TIMELINE_SPILL_PATH = os.getenv("TIMELINE_SPILL_PATH", "")
+TIMELINE_SPILL_BATCH = int(os.getenv("TIMELINE_SPILL_BATCH", "256"))
+
+Event = Dict[str, Any]
+
+
+class _IdList:
+    """Возрастающие id событий одного source/scene; голова срезается при вытеснении."""
+
+    __slots__ = ("ids", "start")
+
+    def __init__(self) -> None:
+        self.ids: List[int] = []
+        self.start = 0
+
+    def __len__(self) -> int:
+        return len(self.ids) - self.start
+
+    def drop_below(self, first_id: int) -> None:
+        while self.start < len(self.ids) and self.ids[self.start] < first_id:
+            self.start += 1
+        # сжимаем список, когда мёртвая голова больше живого хвоста
+        if self.start > 64 and self.start * 2 > len(self.ids):
+            del self.ids[:self.start]
+            self.start = 0
+
+    def window(self, lo: int, hi: int):
+        """Срез индексов [i, j) с id в [lo, hi)."""
+        return (
+            bisect_left(self.ids, lo, self.start),
+            bisect_left(self.ids, hi, self.start),
+        )
+
+
+class _Spill:
+    """
+    Старые события на диске (SQLite), тем же форматом, что и в памяти.
+    write() зовёт только поток-флашер — у него своё соединение; чтения идут по
+    con из любых потоков, по одному за раз (_read_lock, не замок буфера).
+    """
+
+    def __init__(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.con = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL;")
+        self.con.execute("PRAGMA synchronous=NORMAL;")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS timeline_spill ("
+            " id INTEGER PRIMARY KEY, ts TEXT NOT NULL, source TEXT NOT NULL,"
+            " scene TEXT NOT NULL, payload TEXT NOT NULL)"
+        )
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_spill_source ON timeline_spill(source, id)")
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_spill_scene ON timeline_spill(scene, id)")
+        self._read_lock = threading.Lock()
+        self.wcon = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.wcon.execute("PRAGMA synchronous=NORMAL;")
+
+    def last_id(self) -> int:
+        return self.con.execute("SELECT COALESCE(MAX(id), 0) FROM timeline_spill").fetchone()[0]
+
+    def first_id(self) -> Optional[int]:
+        return self.con.execute("SELECT MIN(id) FROM timeline_spill").fetchone()[0]
+
+    def write(self, events: List[Event]) -> None:
+        rows = [(e["id"], e["ts"], e["source"], e["scene"], dumps(e["payload"])) for e in events]
+        self.wcon.execute("BEGIN")
+        try:
+            self.wcon.executemany(
+                "INSERT OR REPLACE INTO timeline_spill(id, ts, source, scene, payload) VALUES (?,?,?,?,?)",
+                rows,
+            )
+        except BaseException:
+            self.wcon.execute("ROLLBACK")
+            raise
+        self.wcon.execute("COMMIT")
+
+    def read(
+        self, lo: int, hi: int, limit: int, newest: bool,
+        source: Optional[str], scene: Optional[str],
+    ) -> List[Event]:
+        where, args = ["id >= ?", "id < ?"], [lo, hi]
+        if source is not None:
+            where.append("source = ?")
+            args.append(source)
+        if scene is not None:
+            where.append("scene = ?")
+            args.append(scene)
+        if lo >= hi or limit <= 0:
+            return []
+        with self._read_lock:
+            rows = self.con.execute(
+                "SELECT id, ts, source, scene, payload FROM timeline_spill WHERE "
+                + " AND ".join(where)
+                + (" ORDER BY id DESC" if newest else " ORDER BY id")
+                + " LIMIT ?",
+                (*args, limit),
+            ).fetchall()
+        return [
+            {"id": i, "ts": ts, "source": src, "scene": sc, "payload": loads(p)}
+            for i, ts, src, sc, p in rows
+        ]
+
+    def close(self) -> None:
+        self.wcon.close()
+        with self._read_lock:
+            self.con.close()
+
+
+class TimelineBuffer:
+    """
+    Таймлайн web-core с фиксированным бюджетом памяти.
+
+    - кольцо на capacity событий, id монотонно растут (слот = id % capacity);
+    - вторичные индексы по source и scene — возрастающие списки id;
+    - курсоры since_id / before_id: чтение стоит O(страницы), а не O(всех событий);
+    - spill_path — вытесненные события пачками уходят в SQLite и
+      продолжают отдаваться по before_id / since_id. Под замком вытеснение
+      только переставляет указатели и кладёт пачку в очередь; на диск её
+      пишет фоновый поток, до записи она читается из очереди.
+    """
+
+    shared = False  # см. SharedTimeline — общий для воркеров вариант
+
+    def __init__(
+        self,
+        capacity: int = TIMELINE_CAPACITY,
+        *,
+        spill_path: Optional[str] = TIMELINE_SPILL_PATH or None,
+        spill_batch: int = TIMELINE_SPILL_BATCH,
+    ) -> None:
+        self.capacity = max(1, int(capacity))
+        self._slots: List[Optional[Event]] = [None] * self.capacity
+        # те же события, сериализованные один раз при добавлении
+        self._raw: List[Optional[bytes]] = [None] * self.capacity
+        # метка экземпляра: ETag не совпадёт между рестартами без спилла
+        self.epoch = os.urandom(4).hex()
+        self._by_source: Dict[str, _IdList] = {}
+        self._by_scene: Dict[str, _IdList] = {}
+        self._lock = threading.Lock()
+        self._spill = _Spill(spill_path) if spill_path else None
+        # со спиллом вытесняем пачкой — одна транзакция на spill_batch событий
+        self._evict_batch = max(1, min(spill_batch, self.capacity)) if self._spill else 1
+        start = self._spill.last_id() + 1 if self._spill else 1
+        self._first_id = start  # самый старый id в кольце
+        self._next_id = start
+        # спилл не срезается: самое старое, что вообще можно отдать
+        self._oldest_id = (self._spill.first_id() or start) if self._spill else None
+        # вытесненные пачки, ещё не записанные флашером: id в [_spilled_id, _first_id)
+        self._pending: Deque[List[Event]] = deque()
+        self._spilled_id = start
+        self._flushed = threading.Condition(self._lock)
+        self._closing = False
+        self._flusher: Optional[threading.Thread] = None
+        if self._spill is not None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="timeline-spill", daemon=True)
+            self._flusher.start()
+
+    def __len__(self) -> int:
+        return self._next_id - self._first_id
+
+    @property
+    def blocking_reads(self) -> bool:
+        """page() может пойти в файл спилла — из event loop её зовут через run_blocking."""
+        return self._spill is not None
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    # --- запись ---
+
+    def append(self, source: str, scene: str, payload: Optional[Dict[str, Any]] = None,
+               ts: Optional[datetime] = None) -> Event:
+        return self.extend([(source, scene, payload)], ts=ts)[0]
+
+    def extend(self, items: List[tuple], ts: Optional[datetime] = None) -> List[Event]:
+        """Добавить пачку (source, scene, payload) под одной блокировкой: id идут подряд."""
+        stamp = (ts or datetime.now(timezone.utc)).isoformat()
+        events, tails = [], []
+        for source, scene, payload in items:
+            body = {"ts": stamp, "source": source, "scene": scene, "payload": payload or {}}
+            # сериализуем до блокировки; id подставляется префиксом
+            tails.append(b"," + dumps(body)[1:])
+            events.append({"id": 0, **body})
+        with self._lock:
+            for event, tail in zip(events, tails):
+                if len(self) >= self.capacity:
+                    self._evict(self._evict_batch)
+                eid = event["id"] = self._next_id
+                self._next_id += 1
+                slot = eid % self.capacity
+                self._slots[slot] = event
+                self._raw[slot] = b'{"id":%d' % eid + tail
+                self._by_source.setdefault(event["source"], _IdList()).ids.append(eid)
+                self._by_scene.setdefault(event["scene"], _IdList()).ids.append(eid)
+        return events
+
+    def encoded(self, events: List[Event]) -> List[bytes]:
+        """JSON-байты событий: из кольца, если ещё там, иначе сериализуем заново."""
+        cap = self.capacity
+        with self._lock:
+            return [
+                self._raw[e["id"] % cap] if self._first_id <= e["id"] < self._next_id else dumps(e)
+                for e in events
+            ]
+
+    def etag(self, *key: Any) -> str:
+        """Сильный ETag: экземпляр буфера + последний id + параметры запроса."""
+        digest = zlib.crc32(repr(key).encode("utf-8"))
+        return f'"{self.epoch}-{self.last_id}-{digest:08x}"'
+
+    def _evict(self, n: int) -> None:
+        # под _lock: диск не трогаем, пачка уходит флашеру
+        n = min(n, len(self))
+        gone = [self._slots[i % self.capacity] for i in range(self._first_id, self._first_id + n)]
+        if self._spill is not None and gone:
+            self._pending.append(gone)
+            self._flushed.notify_all()
+        for i in range(self._first_id, self._first_id + n):
+            self._slots[i % self.capacity] = None
+            self._raw[i % self.capacity] = None
+        self._first_id += n
+        for index, key in ((self._by_source, "source"), (self._by_scene, "scene")):
+            for name in {e[key] for e in gone}:
+                ids = index[name]
+                ids.drop_below(self._first_id)
+                if not len(ids):
+                    del index[name]
+
+    def _flush_loop(self) -> None:
+        spill = self._spill
+        assert spill is not None
+        while True:
+            with self._lock:
+                while not self._pending and not self._closing:
+                    self._flushed.wait()
+                if not self._pending:
+                    return
+                batch = self._pending[0]
+            try:
+                spill.write(batch)
+            except Exception:
+                log.exception("timeline spill: dropped %d events", len(batch))
+            with self._lock:
+                self._pending.popleft()
+                self._spilled_id = batch[-1]["id"] + 1
+                self._flushed.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться записи всех вытесненных пачек на диск (не из event loop)."""
+        with self._lock:
+            return self._flushed.wait_for(lambda: not self._pending, timeout)
+
+    # --- чтение ---
+
+    def _queued(self, lo: int, hi: int, source: Optional[str], scene: Optional[str]) -> List[Event]:
+        """Вытесненные, но ещё не записанные события из [lo, hi) (под _lock)."""
+        lo, hi = max(lo, self._spilled_id), min(hi, self._first_id)
+        if lo >= hi:
+            return []
+        return [
+            e for batch in self._pending for e in batch
+            if lo <= e["id"] < hi
+            and (source is None or e["source"] == source) and (scene is None or e["scene"] == scene)
+        ]
+
+    def _ring(self, lo: int, hi: int, limit: int, newest: bool,
+              source: Optional[str], scene: Optional[str]) -> List[Event]:
+        lo, hi = max(lo, self._first_id), min(hi, self._next_id)
+        if lo >= hi or limit <= 0:
+            return []
+        slots, cap = self._slots, self.capacity
+        lists = []
+        for index, key in ((self._by_source, source), (self._by_scene, scene)):
+            if key is not None:
+                if key not in index:
+                    return []
+                lists.append(index[key])
+        if not lists:
+            ids = range(hi - 1, lo - 1, -1) if newest else range(lo, hi)
+            return [slots[i % cap] for i in ids[:limit]]
+
+        # по самому короткому индексу, второе условие — проверкой поля
+        ids = min(lists, key=len)
+        i, j = ids.window(lo, hi)
+        seq = range(j - 1, i - 1, -1) if newest else range(i, j)
+        out: List[Event] = []
+        for k in seq:
+            ev = slots[ids.ids[k] % cap]
+            if (source is None or ev["source"] == source) and (scene is None or ev["scene"] == scene):
+                out.append(ev)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def page(
+        self,
+        limit: int = 50,
+        *,
+        since_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        source: Optional[str] = None,
+        scene: Optional[str] = None,
+        raw: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Страница событий в хронологическом порядке.
+        - без курсоров — последние limit событий;
+        - before_id — limit событий перед ним (листание назад);
+        - since_id — первые limit событий после него (догоняющий опрос).
+        raw=True — events как готовые JSON-байты (ответ собирается без сериализации).
+        first_id — самый старый id, который ещё можно получить (кольцо или спилл).
+        """
+        limit = max(0, int(limit))
+        hi = before_id if before_id is not None else 1 << 62
+        lo = since_id + 1 if since_id is not None else 0
+        newest = since_id is None
+        # под замком — только память: кольцо, очередь флашера и границы;
+        # SELECT по спиллу — после, чтобы append не ждал диска
+        with self._lock:
+            ring = self._ring(lo, hi, limit, newest, source, scene)
+            if raw:
+                cap = self.capacity
+                ring_out: List[Any] = [self._raw[e["id"] % cap] for e in ring]
+            else:
+                ring_out = ring
+            spill, spilled = self._spill, self._spilled_id
+            queued = self._queued(lo, hi, source, scene) if spill is not None else []
+            last_id = self.last_id
+            oldest = self._oldest_id if spill is not None else self._first_id
+        # на диске — всё, что ниже снятой границы spilled, и оно уже не исчезнет
+        cold_hi = min(hi, spilled)
+        if newest:
+            # новые -> старые: кольцо, очередь, спилл
+            events = ring + queued[::-1]
+            stored = spill.read(lo, cold_hi, limit - len(events), True, source, scene) if spill else []
+            events = (events + stored)[:limit]
+            events.reverse()
+        else:
+            stored = spill.read(lo, cold_hi, limit, False, source, scene) if spill else []
+            events = (stored + queued + ring)[:limit]
+        first = events[0]["id"] if events else None
+        if raw:
+            # кольцо уже сериализовано при добавлении, холодные — заново
+            if not stored and not queued:
+                events = ring_out[::-1] if newest else ring_out
+            else:
+                hot = {e["id"]: b for e, b in zip(ring, ring_out)}
+                events = [hot.get(e["id"]) or dumps(e) for e in events]
+        return {"events": events, "next_before_id": first, "last_id": last_id, "first_id": oldest}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "events": len(self),
+                "first_id": self._first_id,
+                "last_id": self.last_id,
+                "sources": len(self._by_source),
+                "scenes": len(self._by_scene),
+                "spill": self._spill is not None,
+                "spill_pending": sum(len(b) for b in self._pending),
+            }
+
+    def close(self) -> None:
+        # со спиллом кольцо сбрасывается на диск: после рестарта история и id продолжаются
+        with self._lock:
+            if self._spill is None:
+                return
+            if len(self):
+                self._evict(len(self))
+            self._closing = True
+            self._flushed.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            self._spill.close()
+            self._spill = None
+
+
+__all__ = ["TimelineBuffer", "TIMELINE_CAPACITY"]
@@ -0,0 +1,198 @@
+# app/core/timeline_hub.py
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+from app.core.jsonfast import dumps
+from app.core.timeline_buffer import TimelineBuffer
+from app.storage.aio import run_blocking
+
+HUB_QUEUE_SIZE = int(os.getenv("TIMELINE_HUB_QUEUE", "256"))
+# что делать с подписчиком, который не успевает: disconnect | drop
+HUB_SLOW_POLICY = os.getenv("TIMELINE_HUB_SLOW_POLICY", "disconnect").lower()
+HUB_PING_SEC = float(os.getenv("TIMELINE_HUB_PING_SEC", "15"))
+_REPLAY_PAGE = 500
+
+
+def resume_token(epoch: str, event_id: int) -> str:
+    """SSE id: / курсор переподключения — id вместе с меткой буфера, как в ETag."""
+    return f"{epoch}-{event_id}"
+
+
+def parse_resume(raw: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """'<epoch>-<id>' или просто '<id>' (старые клиенты) -> (epoch, id); мусор -> (None, None)."""
+    if not raw:
+        return None, None
+    epoch, _, tail = raw.rpartition("-")
+    try:
+        return epoch or None, int(tail)
+    except ValueError:
+        return None, None
+
+
+class Frame:
+    """Событие, сериализованное один раз на всех подписчиков."""
+
+    __slots__ = ("id", "epoch", "source", "scene", "json", "_sse")
+
+    def __init__(self, event: Dict[str, Any], raw: Optional[bytes] = None, epoch: str = "") -> None:
+        self.id: int = event["id"]
+        self.epoch = epoch
+        self.source: str = event["source"]
+        self.scene: str = event["scene"]
+        # raw — байты, уже сериализованные буфером при добавлении
+        self.json = (raw or dumps(event)).decode("utf-8")
+        self._sse: Optional[bytes] = None
+
+    @property
+    def sse(self) -> bytes:
+        if self._sse is None:
+            token = resume_token(self.epoch, self.id) if self.epoch else self.id
+            self._sse = f"id: {token}\nevent: timeline\ndata: {self.json}\n\n".encode("utf-8")
+        return self._sse
+
+
+class Subscription:
+    def __init__(self, hub: "TimelineHub", last_id: int,
+                 source: Optional[str], scene: Optional[str], maxsize: int) -> None:
+        self.hub = hub
+        self.last_id = last_id
+        self.source = source
+        self.scene = scene
+        self.queue: asyncio.Queue[Optional[Frame]] = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    def wants(self, frame: Frame) -> bool:
+        return (self.source is None or frame.source == self.source) and (
+            self.scene is None or frame.scene == self.scene
+        )
+
+    async def _replay(self) -> list[Frame]:
+        buf = self.hub.buffer
+        kwargs = {"since_id": self.last_id, "source": self.source, "scene": self.scene}
+        if buf.blocking_reads:
+            # общий таймлайн или спилл — SQLite: читаем в пуле storage, не в loop'е
+            events = (await run_blocking(buf.page, _REPLAY_PAGE, **kwargs))["events"]
+        else:
+            events = buf.page(_REPLAY_PAGE, **kwargs)["events"]
+        return [Frame(e, raw, buf.epoch) for e, raw in zip(events, buf.encoded(events))]
+
+    async def frames(self, ping_sec: float = HUB_PING_SEC) -> AsyncIterator[Optional[Frame]]:
+        """
+        Сначала догоняем пропущенное из буфера (после last_id), затем живые события.
+        None — пора слать keep-alive. Итерация кончается, если хаб отключил подписчика.
+        """
+        try:
+            # очередь уже подписана, так что между бэклогом и живыми событиями дыры нет
+            while not self.closed:
+                backlog = await self._replay()
+                for frame in backlog:
+                    self.last_id = frame.id
+                    yield frame
+                if len(backlog) < _REPLAY_PAGE:
+                    break
+            while not self.closed:
+                try:
+                    frame = await asyncio.wait_for(self.queue.get(), ping_sec)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if frame is None:
+                    return
+                if frame.id <= self.last_id:
+                    continue  # уже отдано из бэклога
+                self.last_id = frame.id
+                yield frame
+        finally:
+            self.hub.unsubscribe(self)
+
+
+class TimelineHub:
+    """
+    Fan-out новых событий таймлайна на SSE/WebSocket-подписчиков.
+
+    publish() не ждёт никого: у каждого подписчика своя ограниченная очередь,
+    переполнение — отключение (клиент переподключится с Last-Event-ID и
+    догонит из буфера) или, при policy=drop, выброс самого старого кадра.
+    """
+
+    def __init__(self, buffer: TimelineBuffer, *, queue_size: int = HUB_QUEUE_SIZE,
+                 slow_policy: str = HUB_SLOW_POLICY) -> None:
+        self.buffer = buffer
+        self.queue_size = max(1, queue_size)
+        self.slow_policy = slow_policy
+        self._subs: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.disconnected = 0
+
+    def subscribe(self, last_id: Optional[int] = None, *,
+                  source: Optional[str] = None, scene: Optional[str] = None,
+                  epoch: Optional[str] = None) -> Subscription:
+        """
+        last_id — с какого места догонять; epoch — метка буфера, при которой его
+        выдали. Курсор чужой метки или (у кольца в памяти, где id после рестарта
+        снова с 1) больше last_id буфера — устаревший: отдаём только новые.
+        """
+        self._loop = asyncio.get_running_loop()
+        buf = self.buffer
+        if epoch is not None and epoch != buf.epoch:
+            last_id = None
+        if last_id is None or (not buf.shared and last_id > buf.last_id):
+            last_id = buf.last_id  # только новые
+        sub = Subscription(self, last_id, source, scene, self.queue_size)
+        self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        sub.closed = True
+        self._subs.discard(sub)
+
+    def publish(self, event: Dict[str, Any], raw: Optional[bytes] = None) -> None:
+        if not self._subs:
+            return
+        frame = Frame(event, raw if raw is not None else self.buffer.encoded([event])[0], self.buffer.epoch)
+        loop = self._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is not None and running is not loop:
+            loop.call_soon_threadsafe(self._fanout, frame)
+        else:
+            self._fanout(frame)
+
+    def _fanout(self, frame: Frame) -> None:
+        self.published += 1
+        for sub in list(self._subs):
+            if not sub.wants(frame):
+                continue
+            q = sub.queue
+            if not q.full():
+                q.put_nowait(frame)
+                continue
+            if self.slow_policy == "drop":
+                q.get_nowait()
+                q.put_nowait(frame)
+                sub.dropped += 1
+                continue
+            # отключаем отстающего: чистим очередь и кладём сигнал конца
+            while not q.empty():
+                q.get_nowait()
+            q.put_nowait(None)
+            self.disconnected += 1
+            self.unsubscribe(sub)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subs),
+            "published": self.published,
+            "disconnected": self.disconnected,
+            "dropped": sum(s.dropped for s in self._subs),
+        }
+
+
+__all__ = ["TimelineHub", "Subscription", "Frame", "resume_token", "parse_resume"]
@@ -0,0 +1,280 @@
+# app/core/timeline_log.py
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+LOG_DIR = Path("data/timeline")
+
+_SEGMENT_BYTES = int(os.getenv("TIMELINE_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+_RETENTION_SEC = int(os.getenv("TIMELINE_RETENTION_SEC", "0"))  # 0 — хранить всё
+
+# запись индекса: offset, length, ts (epoch), crc32(source)
+_IDX = struct.Struct("<QIdI")
+# записи лога — элементы JSON-массива: `[source,text,created_at],\n`,
+# поэтому непрерывный хвост сегмента разбирается одним json.loads
+_SEP = b",\n"
+_decode = json.JSONDecoder().decode
+
+
+def _src_key(source: str) -> int:
+    return zlib.crc32(source.encode("utf-8"))
+
+
+class _Segment:
+    """
+    Один сегмент: <base>.log (JSON-записи через _SEP) + <base>.idx (_IDX на запись).
+    id события = base + порядковый номер записи в сегменте.
+    """
+
+    def __init__(self, root: Path, base: int) -> None:
+        self.base = base
+        self.log_path = root / f"{base:020d}.log"
+        self.idx_path = root / f"{base:020d}.idx"
+        self._log_f = None
+        self._idx_f = None
+        self.idx = bytearray()
+        self.size = 0
+        self._map: Optional[mmap.mmap] = None
+        self._map_size = 0
+
+    # --- открытие / восстановление ---
+
+    def load(self) -> None:
+        self.idx = bytearray(self.idx_path.read_bytes()) if self.idx_path.exists() else bytearray()
+        self.size = self.log_path.stat().st_size if self.log_path.exists() else 0
+        # хвост мог оборваться: неполная запись индекса или запись за концом лога
+        del self.idx[len(self.idx) - len(self.idx) % _IDX.size:]
+        while self.idx:
+            off, ln, _, _ = _IDX.unpack_from(self.idx, len(self.idx) - _IDX.size)
+            if off + ln <= self.size:
+                break
+            del self.idx[-_IDX.size:]
+        end = self.end_offset()
+        if self.size != end or (self.idx_path.exists() and self.idx_path.stat().st_size != len(self.idx)):
+            with open(self.log_path, "ab") as f:
+                f.truncate(end)
+            with open(self.idx_path, "wb") as f:
+                f.write(self.idx)
+            self.size = end
+
+    def end_offset(self) -> int:
+        if not self.idx:
+            return 0
+        off, ln, _, _ = _IDX.unpack_from(self.idx, len(self.idx) - _IDX.size)
+        return off + ln
+
+    def open_for_append(self) -> None:
+        if self._log_f is None:
+            self._log_f = open(self.log_path, "ab")
+            self._idx_f = open(self.idx_path, "ab")
+
+    def close(self) -> None:
+        for f in (self._log_f, self._idx_f):
+            if f is not None:
+                f.close()
+        self._log_f = self._idx_f = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._map_size = 0
+
+    def unlink(self) -> None:
+        self.close()
+        for p in (self.log_path, self.idx_path):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    # --- запись / чтение ---
+
+    def __len__(self) -> int:
+        return len(self.idx) // _IDX.size
+
+    def append(self, payload: bytes, ts: float, key: int, fsync: bool) -> None:
+        entry = _IDX.pack(self.size, len(payload), ts, key)
+        self._log_f.write(payload)
+        self._log_f.flush()
+        self._idx_f.write(entry)
+        self._idx_f.flush()
+        if fsync:
+            os.fsync(self._log_f.fileno())
+            os.fsync(self._idx_f.fileno())
+        self.idx += entry
+        self.size += len(payload)
+
+    def entry(self, i: int):
+        return _IDX.unpack_from(self.idx, i * _IDX.size)
+
+    def last_ts(self) -> float:
+        return self.entry(len(self) - 1)[2] if self.idx else 0.0
+
+    def view(self) -> mmap.mmap:
+        # закрытые сегменты мапятся один раз, активный — перемапливается после дозаписи
+        if self._map is None or self._map_size != self.size:
+            if self._map is not None:
+                self._map.close()
+            with open(self.log_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_size = self.size
+        return self._map
+
+
+class SegmentedTimelineStore:
+    """
+    Хранилище событий Элайи как сегментированный append-only лог.
+
+    API совпадает с TimelineStore (add_event / get_events / purge), но:
+    - запись — дозапись в конец текущего сегмента, без транзакций SQLite;
+    - сегмент ротируется по размеру (segment_bytes);
+    - у каждого сегмента компактный индекс смещений (24 байта на событие):
+      хвост и фильтр по source читаются через mmap без полного разбора;
+    - retention_sec удаляет закрытые сегменты целиком, когда их последнее
+      событие старше окна.
+    """
+
+    def __init__(
+        self,
+        root: Path = LOG_DIR,
+        *,
+        segment_bytes: int = _SEGMENT_BYTES,
+        retention_sec: int = _RETENTION_SEC,
+        fsync: bool = False,
+    ) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = max(1024, int(segment_bytes))
+        self.retention_sec = max(0, int(retention_sec))
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._open()
+
+    # --- сегменты ---
+
+    def _open(self) -> None:
+        bases = sorted(int(p.stem) for p in self.root.glob("*.log") if p.stem.isdigit())
+        for base in bases:
+            seg = _Segment(self.root, base)
+            seg.load()
+            self._segments.append(seg)
+        if not self._segments:
+            self._segments.append(_Segment(self.root, 1))
+        self._segments[-1].open_for_append()
+
+    def _next_id(self) -> int:
+        last = self._segments[-1]
+        return last.base + len(last)
+
+    def _rotate(self) -> None:
+        cur = self._segments[-1]
+        cur.close()
+        seg = _Segment(self.root, self._next_id())
+        seg.open_for_append()
+        self._segments.append(seg)
+        if self.retention_sec:
+            self._drop_expired(time.time() - self.retention_sec)
+
+    def _drop_expired(self, cutoff: float) -> int:
+        dropped = 0
+        # активный сегмент не трогаем
+        while len(self._segments) > 1 and self._segments[0].last_ts() < cutoff:
+            self._segments.pop(0).unlink()
+            dropped += 1
+        return dropped
+
+    # --- публичный API ---
+
+    def add_event(self, source: str, text: str) -> None:
+        now = datetime.now(timezone.utc)
+        payload = json.dumps(
+            [source, text, now.isoformat()], ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8") + _SEP
+        with self._lock:
+            seg = self._segments[-1]
+            if seg.size and seg.size + len(payload) > self.segment_bytes:
+                self._rotate()
+                seg = self._segments[-1]
+            seg.append(payload, now.timestamp(), _src_key(source), self.fsync)
+
+    def get_events(self, limit: int = 200, source: Optional[str] = None) -> List[Dict]:
+        out: List[Dict] = []
+        if limit <= 0:
+            return out
+        key = _src_key(source) if source else None
+        with self._lock:
+            for seg in reversed(self._segments):
+                n = len(seg)
+                if not n:
+                    continue
+                view = seg.view()
+                if key is None:
+                    # хвост без фильтра — один непрерывный кусок лога
+                    start = max(0, n - (limit - len(out)))
+                    off = seg.entry(start)[0]
+                    chunk = view[off:seg.size - len(_SEP)].decode("utf-8")
+                    rows = _decode("[" + chunk + "]")
+                    for i in range(len(rows) - 1, -1, -1):
+                        src, text, created_at = rows[i]
+                        out.append({"id": seg.base + start + i, "source": src,
+                                    "text": text, "created_at": created_at})
+                    if len(out) >= limit:
+                        return out
+                    continue
+                for i in range(n - 1, -1, -1):
+                    off, ln, _, k = seg.entry(i)
+                    if k != key:
+                        continue
+                    src, text, created_at = _decode(
+                        view[off:off + ln - len(_SEP)].decode("utf-8")
+                    )
+                    if src != source:
+                        continue  # коллизия crc32
+                    out.append({"id": seg.base + i, "source": src,
+                                "text": text, "created_at": created_at})
+                    if len(out) >= limit:
+                        return out
+        return out
+
+    def purge(self) -> None:
+        with self._lock:
+            next_id = self._next_id()
+            for seg in self._segments:
+                seg.unlink()
+            # id продолжают расти, как AUTOINCREMENT в SQLite-версии
+            seg = _Segment(self.root, next_id)
+            seg.open_for_append()
+            self._segments = [seg]
+
+    def enforce_retention(self, now: Optional[float] = None) -> int:
+        """Удалить закрытые сегменты старше retention_sec. Возвращает число удалённых."""
+        if not self.retention_sec:
+            return 0
+        with self._lock:
+            return self._drop_expired((now or time.time()) - self.retention_sec)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "events": sum(len(s) for s in self._segments),
+                "bytes": sum(s.size + len(s.idx) for s in self._segments),
+                "next_id": self._next_id(),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            for seg in self._segments:
+                seg.close()
+
+
+__all__ = ["SegmentedTimelineStore"]
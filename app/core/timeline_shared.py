@@ -0,0 +1,277 @@
+# app/core/timeline_shared.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.jsonfast import dumps, loads
+
+log = logging.getLogger(__name__)
+
+# путь к общему SQLite-файлу; пусто — таймлайн остаётся in-memory на процесс
+TIMELINE_SHARED_PATH = os.getenv("TIMELINE_SHARED_PATH", "")
+TIMELINE_SHARED_KEEP = int(os.getenv("TIMELINE_SHARED_KEEP", "100000"))
+TIMELINE_SHARED_POLL_MS = int(os.getenv("TIMELINE_SHARED_POLL_MS", "50"))
+_TRIM_EVERY = 1000
+_TAIL_PAGE = 500
+
+Event = Dict[str, Any]
+
+_SCHEMA = (
+    # tail — JSON события без id: '{"id":N' + tail дают готовые байты ответа
+    "CREATE TABLE IF NOT EXISTS timeline ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT NOT NULL, source TEXT NOT NULL,"
+    " scene TEXT NOT NULL, payload BLOB NOT NULL, tail BLOB NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_timeline_source ON timeline(source, id)",
+    "CREATE INDEX IF NOT EXISTS ix_timeline_scene ON timeline(scene, id)",
+    "CREATE TABLE IF NOT EXISTS timeline_meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)",
+)
+_COLS = "id, ts, source, scene, payload, tail"
+
+
+def _row_event(row: tuple) -> Event:
+    i, ts, source, scene, payload, _tail = row
+    return {"id": i, "ts": ts, "source": source, "scene": scene, "payload": loads(payload)}
+
+
+def _row_raw(row: tuple) -> bytes:
+    return b'{"id":%d' % row[0] + row[5]
+
+
+class SharedTimeline:
+    """
+    Таймлайн, общий для всех воркеров uvicorn на одном хосте: SQLite в WAL.
+
+    API совпадает с TimelineBuffer (extend / page / etag / encoded), поэтому
+    /api/timeline, /timeline и стримы работают поверх него без изменений.
+    - запись — одна транзакция на пачку; id выдаёт SQLite (AUTOINCREMENT),
+      порядок id совпадает с порядком коммитов во всех процессах;
+    - событие хранится и как payload, и как готовый JSON-хвост;
+    - новые события других воркеров замечает tail(): PRAGMA data_version
+      меняется, когда базу закоммитил кто-то другой;
+    - храним последние keep событий, старые срезаются раз в _TRIM_EVERY id.
+
+    Все методы, кроме last_id, ходят в SQLite и блокируют: из event loop их
+    зовут через run_blocking (пул storage). last_id — кэш без обращения к
+    файлу: его двигают extend/page/etag и tail() (события других воркеров).
+    """
+
+    shared = True
+    blocking_reads = True  # page/etag идут в файл — из loop'а через run_blocking
+
+    def __init__(self, path: str = TIMELINE_SHARED_PATH, *, keep: int = TIMELINE_SHARED_KEEP) -> None:
+        self.path = path
+        self.keep = max(1, int(keep))
+        self._local = threading.local()
+        # соединения всех потоков (пул storage тоже), чтобы close() закрыл каждое
+        self._cons: List[sqlite3.Connection] = []
+        self._cons_lock = threading.Lock()
+        self._last_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        con = self._con()
+        con.execute("BEGIN IMMEDIATE")
+        for sql in _SCHEMA:
+            con.execute(sql)
+        # одна метка на файл: ETag совпадает, на какой бы воркер ни попал опрос
+        con.execute("INSERT OR IGNORE INTO timeline_meta(k, v) VALUES ('epoch', ?)", (os.urandom(4).hex(),))
+        con.execute("COMMIT")
+        self.epoch = con.execute("SELECT v FROM timeline_meta WHERE k='epoch'").fetchone()[0]
+        self._last_id = 0
+        self._read_last_id(con)
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=10)
+            con.execute("PRAGMA journal_mode=WAL;")
+            con.execute("PRAGMA synchronous=NORMAL;")
+            con.execute("PRAGMA busy_timeout=5000;")
+            self._local.con = con
+            with self._cons_lock:
+                self._cons.append(con)
+        return con
+
+    def _seen(self, last_id: int) -> int:
+        with self._last_lock:
+            if last_id > self._last_id:
+                self._last_id = last_id
+        return last_id
+
+    def _read_last_id(self, con: sqlite3.Connection) -> int:
+        return self._seen(con.execute("SELECT COALESCE(MAX(id), 0) FROM timeline").fetchone()[0])
+
+    @property
+    def last_id(self) -> int:
+        """Последний известный воркеру id — без запроса к файлу (можно звать из loop'а)."""
+        return self._last_id
+
+    # --- запись ---
+
+    def append(self, source: str, scene: str, payload: Optional[Dict[str, Any]] = None,
+               ts: Optional[datetime] = None) -> Event:
+        return self.extend([(source, scene, payload)], ts=ts)[0]
+
+    def extend(self, items: List[tuple], ts: Optional[datetime] = None) -> List[Event]:
+        stamp = (ts or datetime.now(timezone.utc)).isoformat()
+        events, rows = [], []
+        for source, scene, payload in items:
+            body = {"ts": stamp, "source": source, "scene": scene, "payload": payload or {}}
+            rows.append((stamp, source, scene, dumps(body["payload"]), b"," + dumps(body)[1:]))
+            events.append({"id": 0, **body})
+        if not rows:
+            return events
+        con = self._con()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.executemany(
+                "INSERT INTO timeline(ts, source, scene, payload, tail) VALUES (?,?,?,?,?)", rows
+            )
+            # под write-lock'ом id пачки идут подряд и заканчиваются на MAX(id)
+            last = con.execute("SELECT MAX(id) FROM timeline").fetchone()[0]
+            if last // _TRIM_EVERY != (last - len(rows)) // _TRIM_EVERY:
+                con.execute("DELETE FROM timeline WHERE id <= ?", (last - self.keep,))
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+        self._seen(last)
+        for i, event in enumerate(events):
+            event["id"] = last - len(events) + 1 + i
+        return events
+
+    # --- чтение ---
+
+    def _select(self, lo: int, hi: int, limit: int, newest: bool,
+                source: Optional[str], scene: Optional[str]) -> List[tuple]:
+        where, args = ["id >= ?", "id < ?"], [lo, hi]
+        if source is not None:
+            where.append("source = ?")
+            args.append(source)
+        if scene is not None:
+            where.append("scene = ?")
+            args.append(scene)
+        return self._con().execute(
+            f"SELECT {_COLS} FROM timeline WHERE " + " AND ".join(where)
+            + (" ORDER BY id DESC" if newest else " ORDER BY id") + " LIMIT ?",
+            (*args, limit),
+        ).fetchall()
+
+    def page(
+        self,
+        limit: int = 50,
+        *,
+        since_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        source: Optional[str] = None,
+        scene: Optional[str] = None,
+        raw: bool = False,
+    ) -> Dict[str, Any]:
+        """Та же семантика курсоров, что у TimelineBuffer.page()."""
+        limit = max(0, int(limit))
+        hi = before_id if before_id is not None else 1 << 62
+        con = self._con()
+        # один снапшот на страницу и last_id
+        con.execute("BEGIN")
+        try:
+            if since_id is not None:
+                rows = self._select(since_id + 1, hi, limit, False, source, scene)
+            else:
+                rows = self._select(0, hi, limit, True, source, scene)
+                rows.reverse()
+            first_id, last_id = con.execute(
+                "SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM timeline"
+            ).fetchone()
+            self._seen(last_id)
+        finally:
+            con.execute("COMMIT")
+        return {
+            "events": [_row_raw(r) if raw else _row_event(r) for r in rows],
+            "next_before_id": rows[0][0] if rows else None,
+            "last_id": last_id,
+            "first_id": first_id,
+        }
+
+    def encoded(self, events: List[Event]) -> List[bytes]:
+        return [dumps(e) for e in events]
+
+    def etag(self, *key: Any) -> str:
+        digest = zlib.crc32(repr(key).encode("utf-8"))
+        return f'"{self.epoch}-{self._read_last_id(self._con())}-{digest:08x}"'
+
+    def stats(self) -> Dict[str, Any]:
+        con = self._con()
+        first, last, n = con.execute("SELECT MIN(id), MAX(id), COUNT(*) FROM timeline").fetchone()
+        return {"path": self.path, "events": n, "first_id": first or 0, "last_id": last or 0,
+                "keep": self.keep, "shared": True}
+
+    # --- уведомления о новых событиях ---
+
+    async def tail(self, publish, *, poll_ms: int = TIMELINE_SHARED_POLL_MS) -> None:
+        """
+        Фоновая задача воркера: отдаёт publish(event, raw) всё, что закоммичено
+        в файл (любым процессом), строго по возрастанию id. Запросы к SQLite
+        идут в пуле storage, в loop'е — только publish.
+        """
+        from app.storage.aio import run_blocking
+
+        # своё соединение: data_version видит коммиты всех остальных, включая extend
+        con = await run_blocking(sqlite3.connect, self.path, isolation_level=None,
+                                 check_same_thread=False, timeout=10)
+        busy = threading.Lock()  # опрос, брошенный отменой, может ещё идти в пуле
+
+        def poll(version: Optional[int], last: int) -> Tuple[int, List[tuple]]:
+            with busy:
+                # data_version меняется, только если базу закоммитило другое соединение
+                v = con.execute("PRAGMA data_version").fetchone()[0]
+                if v == version:
+                    return v, []
+                return v, con.execute(
+                    f"SELECT {_COLS} FROM timeline WHERE id > ? ORDER BY id LIMIT {_TAIL_PAGE}", (last,)
+                ).fetchall()
+
+        try:
+            last = await run_blocking(self._read_last_id, con)
+            version: Optional[int] = None
+            while True:
+                version, rows = await run_blocking(poll, version, last)
+                for row in rows:
+                    try:
+                        publish(_row_event(row), _row_raw(row))
+                    except Exception:
+                        log.exception("timeline tail: publish failed")
+                    last = row[0]
+                self._seen(last)
+                if len(rows) == _TAIL_PAGE:
+                    version = None  # есть ещё — следующую страницу без паузы
+                    continue
+                await asyncio.sleep(poll_ms / 1000.0)
+        finally:
+            with busy:
+                con.close()
+
+    def close(self) -> None:
+        """Закрыть соединения всех потоков, которые открывали файл."""
+        with self._cons_lock:
+            cons, self._cons = self._cons, []
+            self._local = threading.local()
+        for con in cons:
+            con.close()
+
+
+def open_timeline():
+    """TIMELINE для веб-ядра: общий SQLite при TIMELINE_SHARED_PATH, иначе кольцо в памяти."""
+    if TIMELINE_SHARED_PATH:
+        return SharedTimeline(TIMELINE_SHARED_PATH)
+    from app.core.timeline_buffer import TimelineBuffer
+
+    return TimelineBuffer()
+
+
+__all__ = ["SharedTimeline", "open_timeline", "TIMELINE_SHARED_PATH"]
@@ -0,0 +1,362 @@
+# app/core/web_pipeline.py
+from __future__ import annotations
+
+import os
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# brotli — опционально; без него сжимаем только gzip
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# ответы меньше порога не сжимаем: выигрыш меньше накладных расходов
+COMPRESS_MIN_BYTES = int(os.getenv("WEB_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("WEB_GZIP_LEVEL", "6"))
+# для динамики — быстрые уровни brotli, 11 слишком дорог на каждый ответ
+BROTLI_QUALITY = int(os.getenv("WEB_BROTLI_QUALITY", "4"))
+# TTL in-process кэша GET-ответов, секунды; 0 — кэш выключен
+RESPONSE_CACHE_TTL = float(os.getenv("WEB_RESPONSE_CACHE_TTL", "2"))
+RESPONSE_CACHE_ENTRIES = int(os.getenv("WEB_RESPONSE_CACHE_ENTRIES", "512"))
+RESPONSE_CACHE_MAX_BODY = int(os.getenv("WEB_RESPONSE_CACHE_MAX_BODY", str(1024 * 1024)))
+
+_CODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+_COMPRESSIBLE = ("text/", "application/json", "application/javascript", "application/xml",
+                 "application/x-ndjson", "image/svg+xml")
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    """Что веб-ядро делает с GET-ответом маршрута: заголовок кэша и TTL в памяти."""
+
+    cache_control: str
+    ttl: float = 0.0  # 0 — в ResponseCache не кладём
+
+
+# поллеры: короткий max-age + stale-while-revalidate, чтобы браузер не ждал ответа;
+# /api/timeline дополнительно ревалидируется по ETag (304)
+POLICIES: Dict[str, RoutePolicy] = {
+    "/api/timeline": RoutePolicy("public, max-age=1, stale-while-revalidate=5", RESPONSE_CACHE_TTL),
+    "/api/cycle/state": RoutePolicy("public, max-age=1, stale-while-revalidate=5", RESPONSE_CACHE_TTL),
+    "/timeline": RoutePolicy("public, max-age=2, stale-while-revalidate=10", RESPONSE_CACHE_TTL),
+    "/ui/stats.json": RoutePolicy("public, max-age=5, stale-while-revalidate=30", RESPONSE_CACHE_TTL),
+}
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Кодировка из Accept-Encoding: br или gzip с наибольшим q; None — без сжатия."""
+    prefs: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        prefs[name.strip()] = q
+    star = prefs.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in _CODINGS:  # при равном q — первый (br)
+        q = prefs.get(coding, star)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Gzip:
+    def __init__(self, level: int) -> None:
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        # sync flush: каждый кусок стрима уходит клиенту сразу, а не копится в zlib
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int) -> None:
+        self._c = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.finish()
+
+
+def _compressible(message: Message) -> bool:
+    if message["status"] in (204, 206, 304) or message["status"] < 200:
+        return False
+    headers = Headers(raw=message["headers"])
+    ctype = headers.get("content-type", "")
+    if "content-encoding" in headers or "no-transform" in headers.get("cache-control", ""):
+        return False
+    # SSE нельзя буферизовать и сжимать — события должны уходить сразу
+    if ctype.startswith("text/event-stream"):
+        return False
+    return ctype.startswith(_COMPRESSIBLE)
+
+
+class CompressionMiddleware:
+    """
+    Чистый ASGI: gzip/brotli для ответов больше minimum_size.
+
+    - ответ одним куском — сжимается целиком, Content-Length пересчитывается;
+    - стрим (more_body) — сжимается по кускам с flush, без Content-Length;
+    - SSE, уже сжатое, 204/304 и HEAD проходят как есть.
+    """
+
+    def __init__(self, app: ASGIApp, *, minimum_size: int = COMPRESS_MIN_BYTES,
+                 gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _encoder(self, coding: str):
+        return _Brotli(self.brotli_quality) if coding == "br" else _Gzip(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        encoder = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, encoder, passthrough
+            kind = message["type"]
+            if kind == "http.response.start":
+                if _compressible(message):
+                    start = message  # решаем по первому куску тела
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+            if kind != "http.response.body":
+                # pathsend и прочие расширения сервера — отдаём без сжатия
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(scope=start)
+                headers.add_vary_header("Accept-Encoding")
+                if not more and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = self._encoder(coding)
+                headers["Content-Encoding"] = coding
+                if not more:
+                    data = encoder.finish(body)
+                    headers["Content-Length"] = str(len(data))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                del headers["Content-Length"]
+                await send(start)
+            data = encoder.chunk(body) if more else encoder.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class CacheControlMiddleware:
+    """Проставляет Cache-Control из политики маршрута, если обработчик не задал свой."""
+
+    def __init__(self, app: ASGIApp, *, policies: Dict[str, RoutePolicy] = POLICIES) -> None:
+        self.app = app
+        self.policies = policies
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        policy = None
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            policy = self.policies.get(scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_policy(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] in (200, 203, 304):
+                headers = MutableHeaders(scope=message)
+                if "cache-control" not in headers:
+                    headers["Cache-Control"] = policy.cache_control
+            await send(message)
+
+        await self.app(scope, receive, send_with_policy)
+
+
+class _Entry:
+    __slots__ = ("expires", "version", "status", "headers", "body", "etag")
+
+    def __init__(self, expires: float, version: Any, status: int,
+                 headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        self.expires = expires
+        self.version = version
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = Headers(raw=headers).get("etag")
+
+
+class ResponseCache:
+    """LRU готовых ответов (уже сжатых) с TTL; запись устаревает и при смене версии данных."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_ENTRIES,
+                 max_body: int = RESPONSE_CACHE_MAX_BODY) -> None:
+        self.max_entries = max(1, max_entries)
+        self.max_body = max_body
+        self._data: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, version: Any) -> Optional[_Entry]:
+        entry = self._data.get(key)
+        if entry is not None and entry.version == version and entry.expires > time.monotonic():
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+        if entry is not None:
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, entry: _Entry) -> None:
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses,
+                "max_entries": self.max_entries}
+
+
+RESPONSE_CACHE = ResponseCache()
+
+
+class ResponseCacheMiddleware:
+    """
+    In-process кэш идемпотентных GET для маршрутов с policy.ttl > 0.
+
+    Ключ — путь, query и выбранная кодировка (в кэше лежат уже сжатые байты).
+    version() — версия данных (например, последний id таймлайна): её снимаем
+    до вызова обработчика, и запись перестаёт отдаваться, как только пришло
+    новое событие, не дожидаясь TTL. If-None-Match по ETag записи — сразу 304.
+    """
+
+    def __init__(self, app: ASGIApp, *, cache: ResponseCache = RESPONSE_CACHE,
+                 policies: Dict[str, RoutePolicy] = POLICIES,
+                 version: Optional[Callable[[], Any]] = None) -> None:
+        self.app = app
+        self.cache = cache
+        self.policies = policies
+        self.version = version or (lambda: None)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        policy = None
+        if scope["type"] == "http" and scope["method"] == "GET":
+            policy = self.policies.get(scope["path"])
+        if policy is None or policy.ttl <= 0:
+            await self.app(scope, receive, send)
+            return
+        # попадание в кэш до роутера не доходит: метрикам — метку маршрута сами
+        # (ключи policies — пути маршрутов без параметров)
+        scope["route_label"] = scope["path"]
+
+        req = Headers(scope=scope)
+        key = (scope["path"], scope["query_string"], negotiate(req.get("accept-encoding", "")))
+        version = self.version()
+        entry = self.cache.get(key, version)
+        if entry is not None:
+            inm = req.get("if-none-match")
+            if inm and entry.etag and entry.etag in (t.strip() for t in inm.split(",")):
+                keep = [(k, v) for k, v in entry.headers if k in (b"etag", b"cache-control", b"vary")]
+                await send({"type": "http.response.start", "status": 304, "headers": keep})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers})
+            await send({"type": "http.response.body", "body": entry.body})
+            return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+        storable = True
+
+        async def send_and_store(message: Message) -> None:
+            nonlocal start, size, storable
+            if message["type"] == "http.response.start":
+                start = message
+                storable = message["status"] == 200 and not any(
+                    k == b"set-cookie" for k, _ in message["headers"]
+                )
+            elif message["type"] == "http.response.body" and storable:
+                body = message.get("body", b"")
+                size += len(body)
+                if size > self.cache.max_body:
+                    storable = False
+                    chunks.clear()
+                else:
+                    chunks.append(body)
+                    if not message.get("more_body", False):
+                        self.cache.put(key, _Entry(
+                            time.monotonic() + policy.ttl, version, start["status"],
+                            list(start["headers"]), b"".join(chunks),
+                        ))
+            await send(message)
+
+        await self.app(scope, receive, send_and_store)
+
+
+def install_pipeline(app, *, version: Optional[Callable[[], Any]] = None,
+                     policies: Dict[str, RoutePolicy] = POLICIES) -> None:
+    """
+    Конвейер ответов веб-ядра (снаружи внутрь):
+    кэш ответов -> сжатие -> Cache-Control -> приложение.
+    """
+    # add_middleware оборачивает снаружи — добавляем от внутреннего к внешнему
+    app.add_middleware(CacheControlMiddleware, policies=policies)
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(ResponseCacheMiddleware, policies=policies, version=version)
+
+
+__all__ = [
+    "RoutePolicy",
+    "POLICIES",
+    "negotiate",
+    "CompressionMiddleware",
+    "CacheControlMiddleware",
+    "ResponseCache",
+    "ResponseCacheMiddleware",
+    "RESPONSE_CACHE",
+    "install_pipeline",
+]
@@ -12,9 +12,14 @@ from aiogram.enums import ParseMode
 
 from app.config import settings
 from app.build import BUILD_MARK
+from app.core.metrics import CONTENT_TYPE, HTTP_METRICS, MetricsMiddleware
+from app.core.web_pipeline import install_pipeline
 
 # ── FastAPI ───────────────────────────────────────────────────────────────────
 app = FastAPI(title="Elaya Stagecoach — webhook")
+# общий конвейер ответов веб-ядра (сжатие, Cache-Control, кэш GET)
+install_pipeline(app)
+app.add_middleware(MetricsMiddleware)
 WEBHOOK_PATH: str = (
     os.getenv("WEBHOOK_PATH")
     or getattr(settings, "WEBHOOK_PATH", None)
@@ -53,6 +58,11 @@ async def healthz() -> PlainTextResponse:
     return PlainTextResponse("ok")
 
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    return Response(HTTP_METRICS.render(), media_type=CONTENT_TYPE)
+
+
 # ── Webhook endpoint ──────────────────────────────────────────────────────────
 @app.post(WEBHOOK_PATH)
 async def tg_webhook(request: Request) -> Response:
@@ -93,6 +103,10 @@ async def on_startup() -> None:
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
+    # дописываем write-behind очереди репозитория до остановки процесса
+    from app.storage.repo import close_writers
+    await close_writers()
+
     bot: Bot | None = getattr(app.state, "bot", None)
     if bot:
         await bot.session.close()
@@ -26,13 +26,19 @@ TZ_OFFSET_HOURS = int(os.getenv("TZ_OFFSET_HOURS", "3"))  # МСК по умол
 RUN_AT_HOUR = int(os.getenv("NIGHTLY_HOUR", "23"))
 RUN_AT_MIN = int(os.getenv("NIGHTLY_MINUTE", "59"))
 CHANNEL_ID = int(os.getenv("HQ_CHANNEL_ID", "0"))  # укажи ID канала (со знаком минус)
+BACKUP_ENABLED = os.getenv("BACKUP_ENABLED", "1") not in ("0", "false", "no")
+BACKUP_AT_HOUR = int(os.getenv("BACKUP_HOUR", "4"))
+BACKUP_AT_MIN = int(os.getenv("BACKUP_MINUTE", "30"))
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "1") not in ("0", "false", "no")
+RETENTION_AT_HOUR = int(os.getenv("RETENTION_HOUR", "5"))
+RETENTION_AT_MIN = int(os.getenv("RETENTION_MINUTE", "0"))
 
 bot = Bot(TG_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 
 
-def _next_run(now: datetime) -> datetime:
+def _next_run(now: datetime, hour: int = RUN_AT_HOUR, minute: int = RUN_AT_MIN) -> datetime:
     """Ближайшее время запуска (сегодня 23:59 или завтра)."""
-    target = now.replace(hour=RUN_AT_HOUR, minute=RUN_AT_MIN, second=0, microsecond=0)
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
     if target <= now:
         target += timedelta(days=1)
     return target
@@ -62,9 +68,57 @@ async def nightly_loop() -> None:
             await asyncio.sleep(60)
 
 
+async def backup_loop() -> None:
+    """Ночной онлайн-бэкап всех SQLite-файлов (бюджеты — BACKUP_PAGES / BACKUP_MAX_MBPS)."""
+    from app.utils.maintenance import run_backups
+
+    tz = timezone(timedelta(hours=TZ_OFFSET_HOURS))
+    while True:
+        now = datetime.now(tz=tz)
+        run_at = _next_run(now, BACKUP_AT_HOUR, BACKUP_AT_MIN)
+        sleep_s = (run_at - now).total_seconds()
+        log.info("Backup scheduled for %s (in %.0f s)", run_at.isoformat(), sleep_s)
+        await asyncio.sleep(sleep_s)
+
+        try:
+            results = await asyncio.to_thread(run_backups)
+            log.info(
+                "Backup done: %s",
+                ", ".join(f"{r.name}={r.bytes}B/{r.seconds}s" for r in results) or "nothing to back up",
+            )
+        except Exception as e:
+            log.exception("Backup failed: %s", e)
+            await asyncio.sleep(60)
+
+
+async def retention_loop() -> None:
+    """Ночной перенос старых строк в помесячные архивы + чистка дедупа (после бэкапа)."""
+    from app.jobs.retention import run_retention
+
+    tz = timezone(timedelta(hours=TZ_OFFSET_HOURS))
+    while True:
+        now = datetime.now(tz=tz)
+        run_at = _next_run(now, RETENTION_AT_HOUR, RETENTION_AT_MIN)
+        sleep_s = (run_at - now).total_seconds()
+        log.info("Retention scheduled for %s (in %.0f s)", run_at.isoformat(), sleep_s)
+        await asyncio.sleep(sleep_s)
+
+        try:
+            stats = await asyncio.to_thread(run_retention)
+            log.info("Retention done: %s", ", ".join(f"{k}={v}" for k, v in stats.items()) or "nothing")
+        except Exception as e:
+            log.exception("Retention failed: %s", e)
+            await asyncio.sleep(60)
+
+
 async def main() -> None:
     # здесь МОЖНО добавлять дополнительные периодические задачи
-    await nightly_loop()
+    loops = [nightly_loop()]
+    if BACKUP_ENABLED:
+        loops.append(backup_loop())
+    if RETENTION_ENABLED:
+        loops.append(retention_loop())
+    await asyncio.gather(*loops)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,331 @@
+# app/jobs/retention.py
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# раскладка архивов — в слое хранилища: по ней же repo пересобирает прогресс
+from app.storage.archive import (
+    RETENTION_ARCHIVE_DIR,
+    archive_path as _archive_path,
+    archives as _archives,
+    table_exists as _table_exists,
+)
+
+log = logging.getLogger(__name__)
+
+RETENTION_HOT_DAYS = int(os.getenv("RETENTION_HOT_DAYS", "90"))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "2000"))
+RETENTION_PAUSE_MS = int(os.getenv("RETENTION_PAUSE_MS", "50"))
+RETENTION_DEDUP_TTL_SEC = int(os.getenv("RETENTION_DEDUP_TTL_SEC", os.getenv("STORE_DEDUP_TTL_SEC", "86400")))
+RETENTION_DEDUP_BATCH = int(os.getenv("RETENTION_DEDUP_BATCH", "500"))
+# VACUUM горячего файла, только если свободных страниц больше этой доли
+RETENTION_VACUUM_RATIO = float(os.getenv("RETENTION_VACUUM_RATIO", "0.3"))
+
+
+def _progress_db() -> str:
+    from app.storage import repo
+    return repo._DB_PATH
+
+
+def _timeline_db() -> str:
+    from app.core import storage
+    return str(storage.DB_PATH)
+
+
+@dataclass(frozen=True)
+class ArchiveSpec:
+    """Растущая append-only таблица: где лежит и по какой колонке времени режется."""
+
+    table: str
+    db_path: Callable[[], str]
+    ts_col: str
+    ts_kind: str  # "epoch" (INTEGER, секунды) | "iso" (TEXT, isoformat UTC)
+
+    def value(self, dt: datetime) -> Any:
+        return int(dt.timestamp()) if self.ts_kind == "epoch" else dt.isoformat()
+
+    def month_expr(self) -> str:
+        if self.ts_kind == "epoch":
+            return f"strftime('%Y-%m', {self.ts_col}, 'unixepoch')"
+        return f"substr({self.ts_col}, 1, 7)"
+
+
+SPECS: Dict[str, ArchiveSpec] = {
+    s.table: s
+    for s in (
+        ArchiveSpec("episodes", _progress_db, "ts", "epoch"),
+        ArchiveSpec("feedback", _progress_db, "ts", "epoch"),
+        ArchiveSpec("casting_sessions", _progress_db, "ts", "epoch"),
+        ArchiveSpec("events", _timeline_db, "created_at", "iso"),
+    )
+}
+
+
+def _open(path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(path, isolation_level=None, timeout=30, check_same_thread=False)
+    con.execute("PRAGMA busy_timeout=5000;")
+    return con
+
+
+def archive_table(
+    spec: ArchiveSpec,
+    *,
+    hot_days: int = RETENTION_HOT_DAYS,
+    archive_dir: str = RETENTION_ARCHIVE_DIR,
+    batch: int = RETENTION_BATCH,
+    pause_ms: int = RETENTION_PAUSE_MS,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Перенести строки старше hot_days в помесячные архивы (ATTACH).
+    Идём по rowid порциями по batch строк — вставка в архив и удаление из
+    горячей таблицы в одной короткой транзакции, между порциями пауза.
+    Возвращает число перенесённых строк.
+    """
+    db_path = spec.db_path()
+    if not os.path.isfile(db_path):
+        return 0
+    cutoff = spec.value((now or datetime.now(timezone.utc)) - timedelta(days=hot_days))
+    os.makedirs(archive_dir, exist_ok=True)
+    t, ts = spec.table, spec.ts_col
+
+    con = _open(db_path)
+    moved = 0
+    try:
+        if not _table_exists(con, t):
+            return 0
+        while True:
+            # таблицы append-only: rowid растёт вместе со временем записи
+            rows = con.execute(
+                f"SELECT rowid, {ts} < ?, {spec.month_expr()} FROM {t} ORDER BY rowid LIMIT ?",
+                (cutoff, batch),
+            ).fetchall()
+            by_month: Dict[str, List[int]] = {}
+            done = not rows
+            for rowid, expired, month in rows:
+                if not expired:
+                    done = True
+                    break
+                by_month.setdefault(month or "0000-00", []).append(rowid)
+            if by_month:
+                moved += _move_batch(con, spec, db_path, by_month, archive_dir)
+            if done or len(rows) < batch:
+                break
+            time.sleep(pause_ms / 1000.0)
+    finally:
+        con.close()
+    if moved:
+        log.info("retention: %s.%s -> archive, %s rows", os.path.basename(db_path), t, moved)
+    return moved
+
+
+def _move_batch(
+    con: sqlite3.Connection,
+    spec: ArchiveSpec,
+    db_path: str,
+    by_month: Dict[str, List[int]],
+    archive_dir: str,
+) -> int:
+    t, ts = spec.table, spec.ts_col
+    aliases = {}
+    for i, month in enumerate(sorted(by_month)):
+        alias = f"arch{i}"
+        con.execute("ATTACH DATABASE ? AS " + alias, (_archive_path(db_path, month, archive_dir),))
+        aliases[month] = alias
+    moved = 0
+    try:
+        for alias in aliases.values():
+            if not _table_exists(con, t, alias):
+                con.execute(f"CREATE TABLE {alias}.{t} AS SELECT * FROM main.{t} WHERE 0")
+                # уникальный id: повторный прогон после сбоя не задвоит строки
+                con.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {alias}.ux_{t}_id ON {t}(id)")
+                con.execute(f"CREATE INDEX IF NOT EXISTS {alias}.ix_{t}_{ts} ON {t}({ts})")
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            for month, ids in by_month.items():
+                marks = ",".join("?" * len(ids))
+                con.execute(
+                    f"INSERT OR IGNORE INTO {aliases[month]}.{t} "
+                    f"SELECT * FROM main.{t} WHERE rowid IN ({marks})",
+                    ids,
+                )
+                moved += con.execute(f"DELETE FROM main.{t} WHERE rowid IN ({marks})", ids).rowcount
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+    finally:
+        for alias in aliases.values():
+            con.execute("DETACH DATABASE " + alias)
+    return moved
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Дедуп: просроченные webhook_seen — маленькими порциями
+# ──────────────────────────────────────────────────────────────────────────────
+def _dedup_dbs() -> List[str]:
+    store_url = os.getenv("DB_URL", "sqlite:////data/elaya.db")
+    paths = [os.getenv("SQLITE_PATH", "/data/elaya.db")]
+    if store_url.startswith("sqlite:"):
+        paths.append(store_url.replace("sqlite:///", "/", 1))
+    out: List[str] = []
+    for p in paths:
+        if os.path.isfile(p) and os.path.realpath(p) not in out:
+            out.append(os.path.realpath(p))
+    return out
+
+
+def sweep_dedup(
+    db_path: str,
+    *,
+    ttl_sec: int = RETENTION_DEDUP_TTL_SEC,
+    batch: int = RETENTION_DEDUP_BATCH,
+    pause_ms: int = RETENTION_PAUSE_MS,
+    now: Optional[float] = None,
+) -> int:
+    """
+    Удалить просроченные строки дедупа: webhook_seen (app.storage.db, epoch;
+    плюс ISO-строки, оставшиеся от прежнего core.store) и core_webhook_seen (epoch).
+    """
+    cutoff = int(now or time.time()) - ttl_sec
+    # формат ISO, который раньше писал core.store
+    cutoff_iso = datetime.fromtimestamp(cutoff, tz=timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+    con = _open(db_path)
+    deleted = 0
+    try:
+        # числа в SQLite всегда меньше текста: «seen_at < cutoff» задевает только epoch-строки,
+        # «seen_at >= ''» — только ISO-строки
+        passes = (
+            ("webhook_seen", "seen_at < ?", cutoff),
+            ("webhook_seen", "seen_at >= '' AND seen_at < ?", cutoff_iso),
+            ("core_webhook_seen", "seen_at < ?", cutoff),
+        )
+        for table, where, arg in passes:
+            if not _table_exists(con, table):
+                continue
+            while True:
+                n = con.execute(
+                    f"DELETE FROM {table} WHERE rowid IN "
+                    f"(SELECT rowid FROM {table} WHERE {where} LIMIT ?)",
+                    (arg, batch),
+                ).rowcount
+                deleted += n
+                if n < batch:
+                    break
+                time.sleep(pause_ms / 1000.0)
+    finally:
+        con.close()
+    return deleted
+
+
+def compact(db_path: str, ratio: float = RETENTION_VACUUM_RATIO) -> bool:
+    """VACUUM, если после переноса в файле много свободных страниц."""
+    con = _open(db_path)
+    try:
+        pages = con.execute("PRAGMA page_count").fetchone()[0]
+        free = con.execute("PRAGMA freelist_count").fetchone()[0]
+        if not pages or free / pages < ratio:
+            con.execute("PRAGMA optimize")
+            return False
+        con.execute("VACUUM")
+        return True
+    finally:
+        con.close()
+
+
+def run_retention(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Полный проход: архивирование всех SPECS, чистка дедупа, компакция."""
+    stats: Dict[str, int] = {}
+    touched = set()
+    for name, spec in SPECS.items():
+        try:
+            stats[name] = archive_table(spec, now=now)
+            if stats[name]:
+                touched.add(spec.db_path())
+        except Exception:
+            log.exception("retention: archiving %s failed", name)
+    for path in _dedup_dbs():
+        try:
+            stats[f"webhook_seen:{os.path.basename(path)}"] = sweep_dedup(path)
+        except Exception:
+            log.exception("retention: dedup sweep of %s failed", path)
+    for path in touched:
+        try:
+            compact(path)
+        except Exception:
+            log.exception("retention: compaction of %s failed", path)
+    return stats
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Чтение истории: горячая таблица + архивы, прозрачно для отчётов
+# ──────────────────────────────────────────────────────────────────────────────
+def read_history(
+    table: "str | ArchiveSpec",
+    *,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    archive_dir: str = RETENTION_ARCHIVE_DIR,
+    **filters: Any,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Строки таблицы за [since, until) в хронологическом порядке — сначала из
+    помесячных архивов (только пересекающих интервал), затем из горячей.
+    filters — равенства по колонкам, например user_id=42.
+    """
+    spec = table if isinstance(table, ArchiveSpec) else SPECS[table]
+    table = spec.table
+    db_path = spec.db_path()
+    where, params = [], []
+    if since is not None:
+        where.append(f"{spec.ts_col} >= ?")
+        params.append(spec.value(since))
+    if until is not None:
+        where.append(f"{spec.ts_col} < ?")
+        params.append(spec.value(until))
+    for col, val in filters.items():
+        if not col.isidentifier():
+            raise ValueError(f"bad filter column: {col}")
+        where.append(f"{col} = ?")
+        params.append(val)
+    sql = f"SELECT * FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {spec.ts_col}, id"
+
+    lo = since.strftime("%Y-%m") if since else None
+    hi = until.strftime("%Y-%m") if until else None
+    sources = [
+        p for month, p in _archives(db_path, archive_dir)
+        if (lo is None or month >= lo) and (hi is None or month <= hi)
+    ]
+    if os.path.isfile(db_path):
+        sources.append(db_path)
+
+    for path in sources:
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        con.row_factory = sqlite3.Row
+        try:
+            if not _table_exists(con, table):
+                continue
+            for row in con.execute(sql, params):
+                yield dict(row)
+        finally:
+            con.close()
+
+
+__all__ = [
+    "ArchiveSpec",
+    "SPECS",
+    "archive_table",
+    "sweep_dedup",
+    "compact",
+    "run_retention",
+    "read_history",
+]
@@ -3,9 +3,13 @@ from __future__ import annotations
 
 from fastapi import FastAPI
 
-from app.routes import api, system, ui
+from app.core.jsonfast import FastJSONResponse
+from app.core.metrics import MetricsMiddleware
+from app.core.web_pipeline import install_pipeline
+from app.routes import api, cycle, diag, metrics, system, ui
 
-app = FastAPI()
+# orjson (если установлен) для всех JSON-ответов веб-ядра
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # --- роутеры веб-ядра ---
 
@@ -15,5 +19,40 @@ app.include_router(api.router)
 # системные /api-эндпоинты (healthz, timeline и т.п.)
 app.include_router(system.router)
 
+# состояние цикла ядра (/api/cycle/*)
+app.include_router(cycle.router)
+
 # UI-страницы
 app.include_router(ui.router)
+
+# служебные /diag (поиск по рефлексиям, пулы БД) — только с X-Guard-Key
+app.include_router(diag.router)
+
+# Prometheus-метрики HTTP (/metrics)
+app.include_router(metrics.router)
+
+# сжатие, Cache-Control по маршрутам и кэш GET-ответов до следующего события
+install_pipeline(app, version=system.timeline_version)
+# метрики — самым внешним слоем: время и размеры как у клиента
+app.add_middleware(MetricsMiddleware)
+
+# статика (CSS) с долгим кэшем, версия — в ?v=
+app.mount("/static", ui.static_app(), name="static")
+
+
+_tail_task = None
+
+
+@app.on_event("startup")
+async def _start_timeline_tail() -> None:
+    # общий таймлайн (TIMELINE_SHARED_PATH): события всех воркеров -> локальные стримы
+    global _tail_task
+    _tail_task = system.start_timeline_tail()
+
+
+@app.on_event("shutdown")
+async def _flush_timeline() -> None:
+    if _tail_task is not None:
+        _tail_task.cancel()
+    # со спиллом (TIMELINE_SPILL_PATH) кольцо таймлайна дописывается на диск
+    system.TIMELINE.close()
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-import csv
-import os
+import asyncio
+import logging
+import shutil
 import tempfile
+import time
 from datetime import datetime, timedelta
+from typing import Callable
 
 from aiogram import Router
 from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
@@ -16,11 +19,21 @@ from aiogram.types import (
 )
 
 from app.config import settings
+from app.storage.aio import StorageExecutor, storage
 from app.storage.models import User, Lead
-from app.storage.repo import session_scope
-from app.services.feedback import export_feedback_csv  # выгрузка отзывов
+from app.storage.repo import session_scope, CASTING_EXPORT_HEADER, iter_casting_applications
+from app.services.export import ExportResult, export_rows, iter_query
+from app.services.feedback import export_feedback  # выгрузка отзывов
 
 router = Router(name="admin")
+log = logging.getLogger(__name__)
+
+EXPORT_PROGRESS_SEC = 3.0
+# выгрузка занимает поток на всё время стриминга — свой пул, чтобы длинные
+# задачи не съели общий storage (им пользуются репозитории и group-commit)
+_export_pool = StorageExecutor(max_workers=1, max_pending=8, name="export")
+# фоновые выгрузки — держим ссылки, чтобы задачи не собрал GC
+_export_jobs: set[asyncio.Task] = set()
 
 
 # ---- helpers ----
@@ -42,6 +55,152 @@ def _is_admin(uid: int) -> bool:
     return uid in _admin_ids_set()
 
 
+# ---- блокирующие выборки (выполняются в пуле хранилища) ----
+def _load_user_tg_ids() -> list[int]:
+    with session_scope() as s:
+        return [tg_id for (tg_id,) in s.query(User.tg_id).all()]
+
+
+_LEADS_HEADER = ["ts", "tg_id", "username", "name", "channel", "contact", "note", "track"]
+
+
+def _lead_rows(track: str | None):
+    with session_scope() as s:
+        q = (
+            s.query(Lead, User)
+            .join(User, User.id == Lead.user_id)
+            .order_by(Lead.ts.desc())
+        )
+        if track:
+            q = q.filter(Lead.track == track)
+
+        for lead, user in iter_query(q):
+            yield (
+                lead.ts.isoformat(sep=" ", timespec="seconds"),
+                user.tg_id,
+                user.username,
+                user.name,
+                lead.channel,
+                lead.contact,
+                lead.note,
+                lead.track,
+            )
+
+
+def _export_leads(out_dir: str, opts: dict, progress, track: str | None) -> ExportResult:
+    # /leads_csv всегда отдавал CSV через запятую — потребители на это рассчитывают
+    return export_rows(
+        _lead_rows(track), _LEADS_HEADER, out_dir, "leads", progress=progress, delimiter=",", **opts
+    )
+
+
+def _export_feedback(out_dir: str, opts: dict, progress, since: datetime | None = None) -> ExportResult:
+    with session_scope() as s:
+        return export_feedback(s, out_dir, since=since, progress=progress, **opts)
+
+
+def _export_casting(out_dir: str, opts: dict, progress) -> ExportResult:
+    return export_rows(
+        iter_casting_applications(), CASTING_EXPORT_HEADER, out_dir, "casting",
+        progress=progress, **opts,
+    )
+
+
+def _export_args(text: str | None) -> tuple[dict, list[str]]:
+    """Флаги выгрузки из аргументов команды: ndjson, gz. Остальное — как есть."""
+    opts = {"fmt": "csv", "compress": False}
+    rest: list[str] = []
+    for word in (text or "").split()[1:]:
+        w = word.lower()
+        if w in ("ndjson", "json"):
+            opts["fmt"] = "ndjson"
+        elif w in ("gz", "gzip"):
+            opts["compress"] = True
+        elif w == "csv":
+            opts["fmt"] = "csv"
+        else:
+            rest.append(word)
+    return opts, rest
+
+
+async def _run_export(
+    m: Message, title: str, job: Callable[..., ExportResult], opts: dict, *args,
+    empty: str = "данных нет.",
+) -> None:
+    """
+    Выгрузка в фоне: строки пишутся потоково в пуле выгрузок (по одной за раз,
+    мимо общего storage), статус-сообщение обновляется раз в EXPORT_PROGRESS_SEC,
+    каждая часть отправляется, как только закрыта, — не дожидаясь конца выгрузки.
+    """
+    status = await m.answer(f"⏳ {title}: выгрузка запущена…")
+    out_dir = tempfile.mkdtemp(prefix="export_")
+    written = 0
+    started = time.monotonic()
+    loop = asyncio.get_running_loop()
+    ready: asyncio.Queue[str | None] = asyncio.Queue()
+
+    def on_progress(rows: int) -> None:
+        nonlocal written
+        written = rows
+
+    def on_part(path: str) -> None:
+        # вызывается в потоке выгрузки — передаём путь в event loop
+        loop.call_soon_threadsafe(ready.put_nowait, path)
+
+    async def ticker() -> None:
+        shown = -1
+        while True:
+            await asyncio.sleep(EXPORT_PROGRESS_SEC)
+            if written != shown:
+                shown = written
+                try:
+                    await status.edit_text(f"⏳ {title}: {written} строк…")
+                except TelegramBadRequest:
+                    pass
+
+    async def sender() -> int:
+        # части уходят по порядку; общее число частей заранее неизвестно
+        sent = 0
+        while (path := await ready.get()) is not None:
+            sent += 1
+            caption = title if sent == 1 else f"{title} — часть {sent}"
+            await m.answer_document(FSInputFile(path), caption=caption)
+        return sent
+
+    tick = asyncio.create_task(ticker())
+    send = asyncio.create_task(sender())
+    try:
+        try:
+            result = await _export_pool.run(job, out_dir, {**opts, "on_part": on_part}, on_progress, *args)
+        finally:
+            tick.cancel()
+            # call_soon_threadsafe из on_part уже в очереди loop'а — None встанет после них
+            loop.call_soon(ready.put_nowait, None)
+        total = await send
+        if not result.rows:
+            await status.edit_text(f"{title}: {empty}")
+            return
+        await status.edit_text(
+            f"✅ {title}: {result.rows} строк, {total} файл(ов), "
+            f"{result.bytes / 1024 / 1024:.1f} МБ за {time.monotonic() - started:.1f} с"
+        )
+    except Exception as e:  # noqa: BLE001
+        log.exception("export %s failed", title)
+        await m.answer(f"⚠️ {title}: выгрузка не удалась: {e!s}")
+    finally:
+        tick.cancel()
+        send.cancel()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def _start_export(
+    m: Message, title: str, job: Callable[..., ExportResult], opts: dict, *args, **kwargs
+) -> None:
+    task = asyncio.create_task(_run_export(m, title, job, opts, *args, **kwargs))
+    _export_jobs.add(task)
+    task.add_done_callback(_export_jobs.discard)
+
+
 # ---- commands ----
 @router.message(Command("admin"))
 async def admin_help(m: Message):
@@ -53,6 +212,8 @@ async def admin_help(m: Message):
         "/leads_csv [track] — выгрузка лидов (CSV), опционально по треку\n"
         "/feedback_csv — выгрузка всех отзывов (CSV)\n"
         "/feedback_daily — отзывы за последние 24 часа (CSV)\n"
+        "/casting_csv — выгрузка заявок кастинга (CSV)\n"
+        "  к выгрузкам можно добавить: ndjson, gz\n"
         "/post_training — пост в канал с кнопками"
     )
 
@@ -70,14 +231,13 @@ async def broadcast(m: Message):
     sent = 0
     failed = 0
 
-    # читаем список юзеров одной сессией
-    with session_scope() as s:
-        users = s.query(User).all()
+    # читаем список юзеров одной сессией (вне event loop)
+    tg_ids = await storage.run(_load_user_tg_ids)
 
     # шлём сообщения
-    for u in users:
+    for tg_id in tg_ids:
         try:
-            await m.bot.send_message(u.tg_id, text)
+            await m.bot.send_message(tg_id, text)
             sent += 1
         except (TelegramForbiddenError, TelegramBadRequest):
             failed += 1
@@ -90,57 +250,13 @@ async def leads_csv(m: Message):
     if not _is_admin(m.from_user.id):
         return await m.answer("⛔ Только для админов.")
 
-    # опциональный фильтр: "/leads_csv leader"
-    parts = m.text.split(maxsplit=1)
-    track: str | None = parts[1].strip() if len(parts) > 1 else None
+    # опциональный фильтр: "/leads_csv leader" (+ флаги ndjson/gz)
+    opts, rest = _export_args(m.text)
+    track: str | None = " ".join(rest) or None
 
-    # собираем данные Lead + User
-    with session_scope() as s:
-        q = (
-            s.query(Lead, User)
-            .join(User, User.id == Lead.user_id)
-            .order_by(Lead.ts.desc())
-        )
-        if track:
-            q = q.filter(Lead.track == track)
-
-        data = q.all()
-
-        rows = [
-            {
-                "ts": lead.ts.isoformat(sep=" ", timespec="seconds"),
-                "tg_id": user.tg_id,
-                "username": user.username,
-                "name": user.name,
-                "channel": lead.channel,
-                "contact": lead.contact,
-                "note": lead.note or "",
-                "track": lead.track or "",
-            }
-            for lead, user in data
-        ]
-
-    if not rows:
-        text = "Лидов пока нет." if not track else f"Лидов с треком «{track}» нет."
-        return await m.answer(text)
-
-    # пишем во временный CSV
-    fd, path = tempfile.mkstemp(prefix="leads_", suffix=".csv")
-    os.close(fd)
-    try:
-        fieldnames = ["ts", "tg_id", "username", "name", "channel", "contact", "note", "track"]
-        with open(path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
-
-        title = f"Leads ({track})" if track else "Leads (all)"
-        await m.answer_document(FSInputFile(path), caption=title)
-    finally:
-        try:
-            os.remove(path)
-        except OSError:
-            pass
+    title = f"Leads ({track})" if track else "Leads (all)"
+    empty = f"Лидов с треком «{track}» нет." if track else "Лидов пока нет."
+    _start_export(m, title, _export_leads, opts, track, empty=empty)
 
 
 # -------- NEW: выгрузка отзывов --------
@@ -149,10 +265,8 @@ async def feedback_csv(m: Message):
     if not _is_admin(m.from_user.id):
         return await m.answer("⛔ Только для админов.")
 
-    path = "exports/feedback_all.csv"
-    with session_scope() as s:
-        export_feedback_csv(s, path)
-    await m.answer_document(FSInputFile(path), caption="Feedback (all)")
+    opts, _ = _export_args(m.text)
+    _start_export(m, "Feedback (all)", _export_feedback, opts)
 
 
 @router.message(Command("feedback_daily"))
@@ -160,11 +274,18 @@ async def feedback_daily(m: Message):
     if not _is_admin(m.from_user.id):
         return await m.answer("⛔ Только для админов.")
 
+    opts, _ = _export_args(m.text)
     since = datetime.utcnow() - timedelta(days=1)
-    path = "exports/feedback_daily.csv"
-    with session_scope() as s:
-        export_feedback_csv(s, path, since=since)
-    await m.answer_document(FSInputFile(path), caption="Feedback (last 24h)")
+    _start_export(m, "Feedback (last 24h)", _export_feedback, opts, since)
+
+
+@router.message(Command("casting_csv"))
+async def casting_csv(m: Message):
+    if not _is_admin(m.from_user.id):
+        return await m.answer("⛔ Только для админов.")
+
+    opts, _ = _export_args(m.text)
+    _start_export(m, "Casting", _export_casting, opts)
 
 
 # -------- Публикация поста в канал с инлайн-кнопками --------
@@ -11,6 +11,7 @@ from aiogram.types import Message
 from sqlalchemy import inspect as sqla_inspect
 from sqlalchemy.sql.sqltypes import DateTime, Date
 
+from app.storage.aio import storage
 from app.storage.repo import session_scope
 from app.storage.models import User, DrillRun
 
@@ -47,20 +48,8 @@ def _is_admin(uid: int) -> bool:
     return not ids or uid in ids  # если список не задан — не режем доступ (dev)
 
 
-# ——— /traffic [days] — агрегированный отчёт по источникам ———
-@router.message(Command("traffic"))
-async def traffic_report(m: Message):
-    if not _is_admin(m.from_user.id):
-        return
-
-    # количество дней можно передать через /traffic 7
-    try:
-        parts = (m.text or "").strip().split()
-        days = int(parts[1]) if len(parts) > 1 else 7
-    except Exception:
-        days = 7
-    since = datetime.utcnow() - timedelta(days=days)
-
+def _collect_traffic(since: datetime) -> dict[str, dict[str, int]]:
+    """Блокирующий сбор агрегатов /traffic (выполняется в пуле хранилища)."""
     with session_scope() as s:
         # пользователи по источнику
         users = s.query(User).all()
@@ -115,6 +104,36 @@ async def traffic_report(m: Message):
                     src = "—"
                 by_src_premium[src] += 1
 
+    return {
+        "users_total": by_src_users_total,
+        "new_since": by_src_new_since,
+        "started": by_src_started,
+        "finished": by_src_finished,
+        "premium": by_src_premium,
+    }
+
+
+# ——— /traffic [days] — агрегированный отчёт по источникам ———
+@router.message(Command("traffic"))
+async def traffic_report(m: Message):
+    if not _is_admin(m.from_user.id):
+        return
+
+    # количество дней можно передать через /traffic 7
+    try:
+        parts = (m.text or "").strip().split()
+        days = int(parts[1]) if len(parts) > 1 else 7
+    except Exception:
+        days = 7
+    since = datetime.utcnow() - timedelta(days=days)
+
+    agg = await storage.run(_collect_traffic, since)
+    by_src_users_total = agg["users_total"]
+    by_src_new_since = agg["new_since"]
+    by_src_started = agg["started"]
+    by_src_finished = agg["finished"]
+    by_src_premium = agg["premium"]
+
     # нормализуем полный список источников
     sources = sorted(set().union(
         by_src_users_total.keys(),
@@ -4,6 +4,9 @@ from __future__ import annotations
 from fastapi import APIRouter
 
 from . import api
+from . import cycle
+from . import diag
+from . import metrics
 from . import system
 from . import ui
 
@@ -15,5 +18,14 @@ router.include_router(api.router)
 # системные /api-эндпоинты (таймлайн и т.п.)
 router.include_router(system.router)
 
+# состояние цикла ядра
+router.include_router(cycle.router)
+
 # UI-страницы
 router.include_router(ui.router)
+
+# служебные /diag (под X-Guard-Key)
+router.include_router(diag.router)
+
+# Prometheus /metrics
+router.include_router(metrics.router)
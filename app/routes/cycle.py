@@ -0,0 +1,41 @@
+# app/routes/cycle.py
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import APIRouter, Header
+
+from app.core.state import StateStore
+from app.routes.system import _check_guard
+
+router = APIRouter(prefix="/api/cycle", tags=["cycle"])
+
+# (cycle, ответ): пока цикл не сменился, отдаём тот же dict
+_cache: Tuple[int, Dict[str, Any]] = (-1, {})
+
+
+def _cycle_payload() -> Dict[str, Any]:
+    global _cache
+    cs = StateStore.get().cycle_state()
+    cycle, payload = _cache
+    if cycle != cs.cycle:
+        # last_update — поле, которое читает CLI (elaya cycle)
+        payload = {"ok": True, "cycle": {**cs.to_dict(), "last_update": cs.updated_at}}
+        _cache = (cs.cycle, payload)
+    return payload
+
+
+@router.get("/state")
+async def cycle_state() -> Dict[str, Any]:
+    """Высокоуровневое состояние цикла Элайи (для CLI и дашборда)."""
+    return _cycle_payload()
+
+
+@router.post("/next")
+async def cycle_next(
+    x_guard_key: Optional[str] = Header(default=None, alias="X-Guard-Key"),
+) -> Dict[str, Any]:
+    """Перейти к следующему шагу цикла (sync ядра) и вернуть новое состояние."""
+    _check_guard(x_guard_key)
+    StateStore.get().sync("cli")
+    return _cycle_payload()
@@ -0,0 +1,38 @@
+# app/routes/diag.py
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.routes.system import require_guard
+from app.storage.aio import run_blocking
+
+# служебные эндпоинты веб-ядра: отдают данные всех пользователей — только с X-Guard-Key
+router = APIRouter(prefix="/diag", tags=["diag"], dependencies=[Depends(require_guard)])
+
+
+@router.get("/reflections/search")
+async def reflections_search(
+    q: str = Query(..., min_length=1),
+    since: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=200),
+) -> Dict[str, Any]:
+    """
+    Поиск по рефлексиям всех пользователей (FTS5, по релевантности).
+    Пример: /diag/reflections/search?q=голос&since=2026-10-01
+    """
+    # store — лениво: при не-sqlite DB_URL его импорт падает, а веб-ядро должно подняться
+    from app.core import store
+
+    items = await run_blocking(store.search_reflections, q, since, limit)
+    return {"ok": True, "query": q, "items": items}
+
+
+@router.get("/db_pool")
+async def db_pool() -> Dict[str, Any]:
+    """Латентность checkout и состояние пулов всех созданных SQLAlchemy-движков."""
+    from app.storage.engine import pool_stats
+
+    return {"ok": True, "engines": pool_stats()}
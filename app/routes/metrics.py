@@ -0,0 +1,15 @@
+# app/routes/metrics.py
+from __future__ import annotations
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.metrics import CONTENT_TYPE, HTTP_METRICS
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def metrics() -> Response:
+    """Метрики HTTP этого воркера в текстовом формате Prometheus."""
+    return Response(HTTP_METRICS.render(), media_type=CONTENT_TYPE)
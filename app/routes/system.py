@@ -1,33 +1,52 @@
 # app/routes/system.py
 from __future__ import annotations
 
+import asyncio
 import os
+import zlib
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
-from fastapi import APIRouter, Header, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+
+from app.core.jsonfast import FastJSONResponse, dumps, loads
+from app.core.state import StateStore
+from app.core.timeline_hub import TimelineHub, parse_resume
+from app.core.timeline_shared import open_timeline
+from app.storage.aio import run_blocking
 
 router = APIRouter(prefix="/api", tags=["api"])
 
+T = TypeVar("T")
+
 # --- простая защита для POST (если GUARD_KEY задан) ---
 
 GUARD_KEY = os.getenv("GUARD_KEY", "").strip()
 
 
-def _check_guard(x_guard_key: Optional[str]) -> None:
+def _check_guard(x_guard_key: Optional[str], *, required: bool = False) -> None:
     """
     Если GUARD_KEY не задан в окружении — защита выключена.
     Если задан — все POST-запросы с изменением состояния должны
     присылать заголовок X-Guard-Key.
+    required=True — для чтения чужих данных: без GUARD_KEY эндпоинт закрыт.
     """
     if not GUARD_KEY:
+        if required:
+            raise HTTPException(status_code=403, detail="GUARD_KEY is not configured")
         return
 
     if (x_guard_key or "").strip() != GUARD_KEY:
         raise HTTPException(status_code=401, detail="invalid guard key")
 
 
+def require_guard(x_guard_key: Optional[str] = Header(default=None, alias="X-Guard-Key")) -> None:
+    """Зависимость для служебных роутеров (/diag): всегда по X-Guard-Key."""
+    _check_guard(x_guard_key, required=True)
+
+
 # --- модели событий таймлайна ---
 
 class TimelineEventIn(BaseModel):
@@ -40,34 +59,245 @@ class TimelineEventOut(TimelineEventIn):
     ts: datetime
 
 
-# in-memory хранилище (на каждый процесс)
-TIMELINE: List[TimelineEventOut] = []
+# in-memory кольцо на процесс (TIMELINE_CAPACITY, опционально спилл на диск)
+# или, при TIMELINE_SHARED_PATH, общий для всех воркеров SQLite
+TIMELINE = open_timeline()
+# live-подписчики (SSE / WebSocket)
+HUB = TimelineHub(TIMELINE)
 
 
-def _add_event(evt: TimelineEventIn) -> TimelineEventOut:
-    event = TimelineEventOut(
-        ts=datetime.now(timezone.utc),
-        source=evt.source,
-        scene=evt.scene,
-        payload=evt.payload or {},
-    )
-    TIMELINE.append(event)
-    return event
+async def _append(items: List[Tuple[str, str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    ts = datetime.now(timezone.utc)
+    # фазы цикла ядра (/api/cycle/state) считаются по тем же событиям
+    core = StateStore.get()
+    for source, scene, payload in items:
+        core.add_event(source, scene, payload)
+    if TIMELINE.shared:
+        # запись в общий файл — в пуле storage; живые события раздаёт tail()
+        # в порядке id, одинаково для событий любого воркера
+        return await run_blocking(TIMELINE.extend, items, ts)
+    events = TIMELINE.extend(items, ts=ts)
+    for event, raw in zip(events, TIMELINE.encoded(events)):
+        HUB.publish(event, raw)
+    return events
+
+
+async def _add_event(evt: TimelineEventIn) -> Dict[str, Any]:
+    # событие хранится уже готовым к сериализации dict'ом
+    return (await _append([(evt.source, evt.scene, evt.payload)]))[0]
+
+
+async def read_timeline(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Чтение таймлайна из хендлера: общий SQLite и спилл — в пуле storage, кольцо в памяти — сразу."""
+    if TIMELINE.blocking_reads:
+        return await run_blocking(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def timeline_version() -> Tuple[str, int, int]:
+    """
+    Версия данных для кэша ответов веб-ядра: меняется с каждым новым событием.
+    Зовётся в loop'е на каждый запрос: у SharedTimeline last_id — кэш, без SQLite.
+    """
+    return TIMELINE.epoch, TIMELINE.last_id, StateStore.get().version
+
+
+def start_timeline_tail() -> Optional["asyncio.Task[None]"]:
+    """Для общего таймлайна — фоновая раздача новых событий в HUB (на startup)."""
+    if not TIMELINE.shared:
+        return None
+    return asyncio.get_running_loop().create_task(TIMELINE.tail(HUB.publish), name="timeline-tail")
+
+
+# лимиты пакетной загрузки (после распаковки gzip)
+BATCH_MAX_ITEMS = int(os.getenv("TIMELINE_BATCH_MAX_ITEMS", "1000"))
+BATCH_MAX_BYTES = int(os.getenv("TIMELINE_BATCH_MAX_BYTES", str(4 * 1024 * 1024)))
+
+
+def _read_batch_body(raw: bytes, encoding: str) -> bytes:
+    if "gzip" not in encoding:
+        if len(raw) > BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="batch too large")
+        return raw
+    # распаковка с потолком: защищает от gzip-бомб
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        body = d.decompress(raw, BATCH_MAX_BYTES + 1)
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="bad gzip body")
+    if len(body) > BATCH_MAX_BYTES or d.unconsumed_tail:
+        raise HTTPException(status_code=413, detail="batch too large")
+    return body
+
+
+def _split_batch(body: bytes, content_type: str) -> List[Tuple[Any, Optional[str]]]:
+    """[(объект, ошибка разбора)] — JSON-массив или NDJSON (по строке на событие)."""
+    text = body.decode("utf-8", errors="replace").strip()
+    if "ndjson" not in content_type and "jsonl" not in content_type and text.startswith("["):
+        try:
+            items = loads(text)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"bad json: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="expected a json array")
+        return [(obj, None) for obj in items]
+    out: List[Tuple[Any, Optional[str]]] = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            out.append((loads(line), None))
+        except ValueError as e:
+            out.append((None, f"bad json: {e}"))
+    return out
+
+
+def _subscribe(resume: Optional[str], source: Optional[str], scene: Optional[str]):
+    # resume — '<epoch>-<id>' из SSE id: (или голый id): курсор другого буфера не доверяем
+    epoch, last_id = parse_resume(resume)
+    return HUB.subscribe(last_id, source=source, scene=scene, epoch=epoch)
 
 
 # --- API ---
 
 @router.get("/timeline")
-async def get_timeline(limit: int = 50) -> Dict[str, Any]:
+async def get_timeline(
+    limit: int = Query(50, ge=1, le=500),
+    since_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    source: Optional[str] = None,
+    scene: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
+) -> Response:
+    """
+    Вернуть события таймлайна (по возрастанию id).
+    Без курсоров — последние limit; ?before_id= — листать назад
+    (курсор next_before_id), ?since_id= — догнать новые после last_id.
+    Ответ собирается из заранее сериализованных событий; ETag зависит от
+    последнего id и параметров — без новых событий опрос получает 304.
+    """
+    etag = await read_timeline(TIMELINE.etag, limit, since_id, before_id, source, scene)
+    # Cache-Control — из политики маршрута (app.core.web_pipeline.POLICIES)
+    headers = {"ETag": etag}
+    if if_none_match and etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    page = await read_timeline(
+        TIMELINE.page, limit, since_id=since_id, before_id=before_id, source=source, scene=scene, raw=True
+    )
+    body = b"".join((
+        b'{"ok":true,"events":[',
+        b",".join(page["events"]),
+        b'],"next_before_id":',
+        dumps(page["next_before_id"]),
+        b',"last_id":',
+        dumps(page["last_id"]),
+        b"}",
+    ))
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.post("/timeline/batch")
+async def post_timeline_batch(
+    request: Request,
+    partial: bool = False,
+    x_guard_key: Optional[str] = Header(default=None, alias="X-Guard-Key"),
+) -> FastJSONResponse:
+    """
+    Пакет событий одним запросом: JSON-массив или NDJSON
+    (Content-Type: application/x-ndjson), можно с Content-Encoding: gzip.
+    Вся пачка валидируется за один проход и добавляется одной операцией
+    (id подряд). По умолчанию — всё или ничего (422 со статусами);
+    ?partial=1 — принять валидные, отклонить остальные.
+    """
+    _check_guard(x_guard_key)
+    body = _read_batch_body(await request.body(), request.headers.get("content-encoding", ""))
+    raw_items = _split_batch(body, request.headers.get("content-type", ""))
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"more than {BATCH_MAX_ITEMS} events")
+
+    statuses: List[Dict[str, Any]] = []
+    valid: List[Tuple[int, TimelineEventIn]] = []
+    for i, (obj, err) in enumerate(raw_items):
+        if err is None:
+            try:
+                valid.append((i, TimelineEventIn.model_validate(obj)))
+                statuses.append({"index": i, "status": "accepted"})
+                continue
+            except ValidationError as e:
+                first = e.errors()[0]
+                err = f"{'.'.join(map(str, first['loc'])) or 'event'}: {first['msg']}"
+        statuses.append({"index": i, "status": "invalid", "error": err})
+
+    rejected = len(raw_items) - len(valid)
+    if rejected and not partial:
+        for st in statuses:
+            if st["status"] == "accepted":
+                st["status"] = "skipped"
+        return FastJSONResponse(
+            {"ok": False, "accepted": 0, "rejected": rejected, "items": statuses},
+            status_code=422,
+        )
+
+    events = await _append([(e.source, e.scene, e.payload) for _, e in valid])
+    for (i, _), event in zip(valid, events):
+        statuses[i]["id"] = event["id"]
+    return FastJSONResponse(
+        {"ok": not rejected, "accepted": len(events), "rejected": rejected, "items": statuses}
+    )
+
+
+@router.get("/timeline/stream")
+async def timeline_stream(
+    request: Request,
+    source: Optional[str] = None,
+    scene: Optional[str] = None,
+    last_event_id: Optional[str] = Query(default=None),
+    last_event_header: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+) -> StreamingResponse:
     """
-    Вернуть последние события таймлайна.
+    Новые события таймлайна как Server-Sent Events.
+    Переподключение с Last-Event-ID (или ?last_event_id=) догоняет пропущенное.
     """
-    # конвертим в dict, чтобы всё было сериализуемо
-    events = [e.dict() for e in TIMELINE[-limit:]]
-    return {
-        "ok": True,
-        "events": events,
-    }
+    sub = _subscribe(last_event_header or last_event_id, source, scene)
+
+    async def body():
+        yield b"retry: 3000\n\n"
+        async for frame in sub.frames():
+            if frame is None:
+                if await request.is_disconnected():
+                    return
+                yield b": ping\n\n"
+            else:
+                yield frame.sse
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/timeline/ws")
+async def timeline_ws(
+    ws: WebSocket,
+    source: Optional[str] = None,
+    scene: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+) -> None:
+    """WebSocket-вариант стрима: по текстовому JSON-кадру на событие."""
+    await ws.accept()
+    sub = _subscribe(last_event_id, source, scene)
+    try:
+        async for frame in sub.frames():
+            if frame is not None:
+                await ws.send_text(frame.json)
+        # хаб отключил отстающего — клиент переподключится с last_event_id
+        await ws.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        HUB.unsubscribe(sub)
 
 
 @router.post("/timeline")
@@ -79,7 +309,7 @@ async def post_timeline(
     Добавить событие в таймлайн.
     """
     _check_guard(x_guard_key)
-    _add_event(event)
+    await _add_event(event)
     return {"ok": True}
 
 
@@ -92,7 +322,7 @@ async def post_event(
     Алиас для /api/timeline, чтобы CLI/бот могли стучаться и так, и так.
     """
     _check_guard(x_guard_key)
-    _add_event(event)
+    await _add_event(event)
     return {"ok": True}
 
 # app/routes/system.py
@@ -110,10 +340,10 @@ async def post_timeline(
     # 🔍 лог при любом POST
     print(f"[core] timeline POST: source={event.source}, scene={event.scene}, payload={event.payload}")
 
-    _add_event(event)
+    await _add_event(event)
     return {"ok": True}
 
 @router.get("/timeline/test-add")
 async def test_add() -> Dict[str, Any]:
-    evt = _add_event(TimelineEventIn(source="test", scene="ping", payload={"hello": "world"}))
-    return {"ok": True, "event": evt.dict()}
+    evt = await _add_event(TimelineEventIn(source="test", scene="ping", payload={"hello": "world"}))
+    return {"ok": True, "event": evt}
@@ -1,99 +1,104 @@
 # app/routes/ui.py
 from __future__ import annotations
 
-from typing import Any, Dict, List
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import urlencode
 
-from fastapi import APIRouter
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from starlette.staticfiles import StaticFiles
 
-from app.routes.system import TIMELINE
+from app.core.timeline_hub import resume_token
+from app.routes import system
 
 router = APIRouter(tags=["ui"])
 
+APP_DIR = Path(__file__).resolve().parents[1]
+STATIC_DIR = APP_DIR / "static"
+TEMPLATES_DIR = APP_DIR / "templates"
+# статика адресуется с ?v=<хэш содержимого>, поэтому её можно кэшировать «навсегда»
+STATIC_MAX_AGE = 365 * 24 * 3600
+_STREAM_CHUNK = 16 * 1024
 
-def _render_timeline(events: List[Dict[str, Any]]) -> str:
-    """
-    Простая текстовая верстка таймлайна.
-    """
-    if not events:
-        return "<p>Пока нет событий</p>"
-
-    parts: List[str] = []
-    for ev in events:
-        ts = ev.get("ts", "-")
-        source = ev.get("source", "")
-        scene = ev.get("scene", "")
-        payload = ev.get("payload", {})
-
-        parts.append(
-            f"""
-            <div class="event">
-              <div class="ts">{ts}</div>
-              <div class="meta">{source} — {scene}</div>
-              <pre class="payload">{payload}</pre>
-            </div>
-            """
-        )
-
-    return "\n".join(parts)
-
-
-@router.get("/timeline", response_class=HTMLResponse)
-async def timeline_page() -> HTMLResponse:
+_env = Environment(
+    loader=FileSystemLoader(str(TEMPLATES_DIR)),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,  # шаблон компилируется один раз на процесс
+    enable_async=False,
+)
+# payload в <pre> — читаемым JSON, без \\uXXXX для кириллицы
+_env.policies["json.dumps_kwargs"] = {"ensure_ascii": False, "sort_keys": False}
+
+
+@lru_cache(maxsize=None)
+def static_url(path: str) -> str:
+    digest = hashlib.sha1((STATIC_DIR / path).read_bytes()).hexdigest()[:10]
+    return f"/static/{path}?v={digest}"
+
+
+_env.globals["static_url"] = static_url
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles с долгим Cache-Control (версия файла — в ?v=)."""
+
+    def file_response(self, *args, **kwargs):
+        resp = super().file_response(*args, **kwargs)
+        resp.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+        return resp
+
+
+def static_app() -> CachedStaticFiles:
+    return CachedStaticFiles(directory=str(STATIC_DIR))
+
+
+def _chunks(parts: Iterator[str]) -> Iterator[bytes]:
+    # генератор Jinja отдаёт мелкие куски — склеиваем до ~16 КБ на write
+    buf, size = [], 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= _STREAM_CHUNK:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+@router.get("/timeline")
+async def timeline_page(
+    limit: int = Query(100, ge=1, le=500),
+    before_id: Optional[int] = None,
+    since_id: Optional[int] = None,
+) -> StreamingResponse:
     """
     Живая страница таймлайна Элайи.
-    Берём данные напрямую из in-memory TIMELINE.
-    """
-    # берём последние 100 событий
-    events = [e.dict() for e in TIMELINE[-100:]]
-
-    body = f"""
-    <!DOCTYPE html>
-    <html lang="ru">
-    <head>
-      <meta charset="utf-8" />
-      <title>Таймлайн Элайи</title>
-      <style>
-        body {{
-          background: #050811;
-          color: #f5f5f5;
-          font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-          padding: 24px;
-        }}
-        h1 {{
-          margin-bottom: 8px;
-        }}
-        .event {{
-          margin-bottom: 16px;
-          padding-bottom: 8px;
-          border-bottom: 1px solid #22263a;
-        }}
-        .ts {{
-          font-size: 13px;
-          color: #9ca3af;
-        }}
-        .meta {{
-          font-weight: 600;
-          margin-top: 2px;
-          margin-bottom: 4px;
-        }}
-        .payload {{
-          margin: 0;
-          font-size: 13px;
-          color: #e5e7eb;
-          background: #0b1020;
-          padding: 6px 8px;
-          border-radius: 4px;
-          white-space: pre-wrap;
-        }}
-      </style>
-    </head>
-    <body>
-      <h1>Таймлайн Элайи</h1>
-
-      {_render_timeline(events)}
-    </body>
-    </html>
+    Серверная пагинация (?before_id= / ?since_id=), шаблон timeline.html
+    рендерится потоком; на последней странице новые события приходят по SSE.
     """
+    page = await system.read_timeline(system.TIMELINE.page, limit, before_id=before_id, since_id=since_id)
+    events, last_id = page["events"], page["last_id"]
+
+    older_url = newer_url = None
+    if events:
+        # раньше — только если буфер ещё хранит что-то старше страницы
+        if events[0]["id"] > page["first_id"]:
+            older_url = "/timeline?" + urlencode({"limit": limit, "before_id": events[0]["id"]})
+        if events[-1]["id"] < last_id:
+            newer_url = "/timeline?" + urlencode({"limit": limit, "since_id": events[-1]["id"]})
+    live = newer_url is None
 
-    return HTMLResponse(content=body)
+    parts = _env.get_template("timeline.html").generate(
+        events=events,
+        # курсор для EventSource — с меткой буфера: после рестарта не «застрянет»
+        resume=resume_token(system.TIMELINE.epoch, events[-1]["id"] if events else last_id),
+        older_url=older_url,
+        newer_url=newer_url,
+        live=live,
+    )
+    # sync-итератор: Starlette гонит рендер Jinja в threadpool, а не в event loop
+    return StreamingResponse(_chunks(parts), media_type="text/html; charset=utf-8")
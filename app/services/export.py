@@ -0,0 +1,217 @@
+# app/services/export.py
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence
+
+# лимит Bot API на отправку документа — 50 МБ; оставляем запас под multipart
+TG_DOCUMENT_LIMIT = 50 * 1024 * 1024
+EXPORT_PART_BYTES = int(os.getenv("EXPORT_PART_BYTES", str(48 * 1024 * 1024)))
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", "1000"))
+EXPORT_PROGRESS_EVERY = 5000
+
+ProgressFn = Callable[[int], None]
+PartFn = Callable[[str], None]
+
+
+@dataclass
+class ExportResult:
+    parts: List[str] = field(default_factory=list)
+    rows: int = 0
+    bytes: int = 0
+
+
+def _cell(v: Any) -> Any:
+    if v is None:
+        return ""
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+def _json_default(v: Any) -> Any:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return str(v)
+
+
+class StreamingExporter:
+    """
+    Пишет строки в CSV/NDJSON по одной, без накопления в памяти.
+
+    - compress=True — gzip на лету (.csv.gz / .ndjson.gz);
+    - файл режется на части, как только размер на диске доходит до
+      max_part_bytes (по умолчанию под лимит документа Telegram);
+      у каждой CSV-части свой заголовок;
+    - progress(rows) вызывается каждые progress_every строк;
+    - on_part(path) — как только очередная непустая часть закрыта и готова
+      к отправке (вызывается в потоке выгрузки).
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        basename: str,
+        header: Sequence[str],
+        *,
+        fmt: str = "csv",
+        compress: bool = False,
+        max_part_bytes: Optional[int] = EXPORT_PART_BYTES,
+        delimiter: str = ";",
+        progress: Optional[ProgressFn] = None,
+        progress_every: int = EXPORT_PROGRESS_EVERY,
+        on_part: Optional[PartFn] = None,
+    ) -> None:
+        if fmt not in ("csv", "ndjson"):
+            raise ValueError(f"unknown export format: {fmt}")
+        self.out_dir = out_dir
+        self.basename = basename
+        self.header = list(header)
+        self.fmt = fmt
+        self.compress = compress
+        self.max_part_bytes = max_part_bytes
+        self.delimiter = delimiter
+        self.progress = progress
+        self.progress_every = max(1, progress_every)
+        self.on_part = on_part
+
+        self.result = ExportResult()
+        self._raw: Optional[io.BufferedWriter] = None
+        self._gz: Optional[gzip.GzipFile] = None
+        self._text: Optional[io.TextIOWrapper] = None
+        self._csv = None
+        self._part_rows = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    # --- части ---
+
+    def _part_path(self, n: int) -> str:
+        suffix = "" if n == 1 else f".{n}"
+        ext = self.fmt + (".gz" if self.compress else "")
+        return os.path.join(self.out_dir, f"{self.basename}{suffix}.{ext}")
+
+    def _open_part(self) -> None:
+        path = self._part_path(len(self.result.parts) + 1)
+        self._raw = open(path, "wb")
+        stream = self._raw
+        if self.compress:
+            self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6)
+            stream = self._gz
+        self._text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        self.result.parts.append(path)
+        self._part_rows = 0
+        if self.fmt == "csv":
+            self._csv = csv.writer(self._text, delimiter=self.delimiter)
+            self._csv.writerow(self.header)
+
+    def _close_part(self) -> None:
+        if self._text is None:
+            return
+        self._text.flush()
+        self._text.detach()
+        if self._gz is not None:
+            self._gz.close()
+        self.result.bytes += self._raw.tell()
+        self._raw.close()
+        self._raw = self._gz = self._text = self._csv = None
+        if self.on_part is not None and self._part_rows:
+            self.on_part(self.result.parts[-1])
+
+    def _part_full(self) -> bool:
+        # raw.tell() отстаёт на буферы TextIOWrapper/zlib — их покрывает запас до 50 МБ
+        return bool(self.max_part_bytes) and self._part_rows > 0 and (
+            self._raw.tell() >= self.max_part_bytes
+        )
+
+    # --- запись ---
+
+    def write(self, row: Sequence[Any]) -> None:
+        if self._text is None:
+            self._open_part()
+        elif self._part_full():
+            self._close_part()
+            self._open_part()
+        if self.fmt == "csv":
+            self._csv.writerow([_cell(v) for v in row])
+        else:
+            self._text.write(
+                json.dumps(dict(zip(self.header, row)), ensure_ascii=False, default=_json_default)
+            )
+            self._text.write("\n")
+        self._part_rows += 1
+        self.result.rows += 1
+        if self.progress and self.result.rows % self.progress_every == 0:
+            self.progress(self.result.rows)
+
+    def write_all(self, rows: Iterable[Sequence[Any]]) -> ExportResult:
+        for row in rows:
+            self.write(row)
+        return self.close()
+
+    def close(self) -> ExportResult:
+        if self._text is None and not self.result.parts:
+            self._open_part()  # пустая выгрузка — файл с одним заголовком
+        self._close_part()
+        if self.progress:
+            self.progress(self.result.rows)
+        return self.result
+
+    def __enter__(self) -> "StreamingExporter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._close_part()
+
+
+def export_rows(
+    rows: Iterable[Sequence[Any]],
+    header: Sequence[str],
+    out_dir: str,
+    basename: str,
+    **kwargs: Any,
+) -> ExportResult:
+    """Шорткат: выгрузить итератор строк целиком (см. StreamingExporter)."""
+    with StreamingExporter(out_dir, basename, header, **kwargs) as exp:
+        return exp.write_all(rows)
+
+
+# ---- источники строк (читают порциями, на стороне БД) ----
+def iter_query(q: Any, chunk: int = EXPORT_CHUNK) -> Iterator[Any]:
+    """SQLAlchemy Query/Result порциями по chunk строк (yield_per)."""
+    return iter(q.yield_per(chunk))
+
+
+def iter_sqlite(
+    db_path: str, sql: str, params: Sequence[Any] = (), chunk: int = EXPORT_CHUNK
+) -> Iterator[tuple]:
+    """Строки sqlite3-запроса через fetchmany; соединение закрывается в конце."""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+__all__ = [
+    "TG_DOCUMENT_LIMIT",
+    "EXPORT_PART_BYTES",
+    "ExportResult",
+    "PartFn",
+    "ProgressFn",
+    "StreamingExporter",
+    "export_rows",
+    "iter_query",
+    "iter_sqlite",
+]
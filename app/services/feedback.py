@@ -1,9 +1,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-import csv, os
+import os
 from sqlalchemy.orm import Session
 from app.storage.models import Feedback
+from app.services.export import ExportResult, PartFn, ProgressFn, export_rows, iter_query
+
+FEEDBACK_HEADER = ["id","user_id","first_source","context","context_id","score","text","voice_file_id","created_at"]
 
 @dataclass
 class FeedbackPayload:
@@ -30,18 +33,39 @@ def create_feedback(s: Session, user_id: int, p: FeedbackPayload) -> Feedback:
     s.refresh(fb)
     return fb
 
-def export_feedback_csv(s: Session, file_path: str, since: datetime | None = None) -> str:
+def _feedback_rows(s: Session, since: datetime | None = None):
     q = s.query(Feedback).order_by(Feedback.created_at.desc())
     if since:
         q = q.filter(Feedback.created_at >= since)
-    rows = q.all()
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f, delimiter=";")
-        w.writerow(["id","user_id","first_source","context","context_id","score","text","voice_file_id","created_at"])
-        for r in rows:
-            w.writerow([
-                r.id, r.user_id, r.first_source or "", r.context, r.context_id or "",
-                r.score if r.score is not None else "", r.text or "", r.voice_file_id or "", r.created_at.isoformat()
-            ])
+    for r in iter_query(q):
+        yield (
+            r.id, r.user_id, r.first_source, r.context, r.context_id,
+            r.score, r.text, r.voice_file_id, r.created_at,
+        )
+
+
+def export_feedback(
+    s: Session,
+    out_dir: str,
+    basename: str = "feedback",
+    *,
+    since: datetime | None = None,
+    fmt: str = "csv",
+    compress: bool = False,
+    progress: ProgressFn | None = None,
+    on_part: PartFn | None = None,
+) -> ExportResult:
+    """Потоковая выгрузка отзывов (CSV/NDJSON, gzip, части под лимит Telegram)."""
+    return export_rows(
+        _feedback_rows(s, since), FEEDBACK_HEADER, out_dir, basename,
+        fmt=fmt, compress=compress, progress=progress, on_part=on_part,
+    )
+
+
+def export_feedback_csv(s: Session, file_path: str, since: datetime | None = None) -> str:
+    out_dir, name = os.path.split(file_path)
+    export_rows(
+        _feedback_rows(s, since), FEEDBACK_HEADER, out_dir or ".",
+        os.path.splitext(name)[0], max_part_bytes=None,
+    )
     return file_path
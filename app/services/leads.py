@@ -1,10 +1,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Iterable
 from datetime import datetime
-import csv, os
+import os
 from sqlalchemy.orm import Session
 from app.storage.models import Lead
+from app.services.export import ExportResult, PartFn, ProgressFn, export_rows, iter_query
+
+LEADS_HEADER = ["id", "user_id", "channel", "contact", "note", "track", "ts"]
 
 @dataclass
 class LeadPayload:
@@ -27,15 +29,36 @@ def create_lead(s: Session, user_id: int, payload: LeadPayload) -> Lead:
     s.refresh(lead)
     return lead
 
-def export_leads_csv(s: Session, file_path: str, track: str | None = None) -> str:
+def _lead_rows(s: Session, track: str | None = None):
     q = s.query(Lead).order_by(Lead.ts.desc())
     if track:
         q = q.filter(Lead.track == track)
-    rows: Iterable[Lead] = q.all()
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f, delimiter=";")
-        w.writerow(["id", "user_id", "channel", "contact", "note", "track", "ts"])
-        for r in rows:
-            w.writerow([r.id, r.user_id, r.channel, r.contact, r.note or "", r.track or "", r.ts.isoformat()])
+    for r in iter_query(q):
+        yield (r.id, r.user_id, r.channel, r.contact, r.note, r.track, r.ts)
+
+
+def export_leads(
+    s: Session,
+    out_dir: str,
+    basename: str = "leads",
+    *,
+    track: str | None = None,
+    fmt: str = "csv",
+    compress: bool = False,
+    progress: ProgressFn | None = None,
+    on_part: PartFn | None = None,
+) -> ExportResult:
+    """Потоковая выгрузка лидов (CSV/NDJSON, gzip, части под лимит Telegram)."""
+    return export_rows(
+        _lead_rows(s, track), LEADS_HEADER, out_dir, basename,
+        fmt=fmt, compress=compress, progress=progress, on_part=on_part,
+    )
+
+
+def export_leads_csv(s: Session, file_path: str, track: str | None = None) -> str:
+    out_dir, name = os.path.split(file_path)
+    export_rows(
+        _lead_rows(s, track), LEADS_HEADER, out_dir or ".",
+        os.path.splitext(name)[0], max_part_bytes=None,
+    )
     return file_path
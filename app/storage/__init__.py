@@ -8,4 +8,6 @@ from .repo import (
     save_casting_session,
     save_feedback,
     log_progress_event,
+    flush_writes,
+    close_writers,
 )
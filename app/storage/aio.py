@@ -0,0 +1,141 @@
+# app/storage/aio.py
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+_WORKERS = int(os.getenv("STORAGE_WORKERS", "4"))
+_MAX_PENDING = int(os.getenv("STORAGE_MAX_PENDING", "256"))
+
+
+class StorageExecutor:
+    """
+    Выделенный пул потоков для блокирующих вызовов sqlite3 / sync SQLAlchemy.
+
+    Хендлеры aiogram делают `await storage.run(fn, ...)` — event loop не
+    блокируется, пока диск думает. Число ожидающих задач ограничено
+    (max_pending): при переполнении вызывающий корутин ждёт слот, а не
+    раздувает очередь. Метрики — глубина очереди и время ожидания.
+    """
+
+    def __init__(self, max_workers: int = _WORKERS, max_pending: int = _MAX_PENDING,
+                 name: str = "storage") -> None:
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(self.max_workers, int(max_pending))
+        self.name = name
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # семафор привязан к loop'у — пересоздаём, если loop сменился
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._sem_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._stats_lock = threading.Lock()
+        self._queued = 0          # отправлены в пул, но ещё не стартовали
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._slot_wait_ms = 0.0  # ожидание свободного слота (backpressure)
+        self._queue_wait_ms = 0.0
+        self._queue_wait_max_ms = 0.0
+        self._run_ms = 0.0
+
+    # --- внутреннее ---
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.name
+                    )
+        return self._pool
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._sem_loop is not loop:
+            self._sem = asyncio.Semaphore(self.max_pending)
+            self._sem_loop = loop
+        return self._sem
+
+    def _call(self, enqueued_at: float, fn: Callable[..., T]) -> T:
+        started = time.perf_counter()
+        waited = (started - enqueued_at) * 1000.0
+        with self._stats_lock:
+            self._queued -= 1
+            self._running += 1
+            self._queue_wait_ms += waited
+            if waited > self._queue_wait_max_ms:
+                self._queue_wait_max_ms = waited
+        ok = False
+        try:
+            result = fn()
+            ok = True
+            return result
+        finally:
+            with self._stats_lock:
+                self._running -= 1
+                self._completed += 1
+                if not ok:
+                    self._failed += 1
+                self._run_ms += (time.perf_counter() - started) * 1000.0
+
+    # --- публичный API ---
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Выполнить блокирующую функцию в пуле хранилища и дождаться результата."""
+        sem = self._semaphore()
+        t0 = time.perf_counter()
+        async with sem:
+            now = time.perf_counter()
+            with self._stats_lock:
+                self._slot_wait_ms += (now - t0) * 1000.0
+                self._submitted += 1
+                self._queued += 1
+            call = functools.partial(fn, *args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor(), functools.partial(self._call, now, call)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        done = self._completed or 1
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "queue_depth": self._queued,
+            "running": self._running,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "slot_wait_ms_total": round(self._slot_wait_ms, 3),
+            "queue_wait_ms_avg": round(self._queue_wait_ms / done, 3),
+            "queue_wait_ms_max": round(self._queue_wait_max_ms, 3),
+            "run_ms_avg": round(self._run_ms / done, 3),
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+
+
+# общий пул для репозиториев и отчётов
+storage = StorageExecutor()
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Шорткат: `await run_blocking(fn, ...)` через общий пул хранилища."""
+    return await storage.run(fn, *args, **kwargs)
+
+
+__all__ = ["StorageExecutor", "storage", "run_blocking"]
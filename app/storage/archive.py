@@ -0,0 +1,47 @@
+# app/storage/archive.py
+from __future__ import annotations
+
+import glob
+import os
+import sqlite3
+from typing import List, Optional
+
+# помесячные архивы retention: один файл на (исходная база, месяц),
+# внутри — таблицы с теми же именами, что и в основном файле
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "/data/archive")
+
+
+def archive_path(db_path: str, month: str, archive_dir: str) -> str:
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(archive_dir, f"{stem}-{month}.db")
+
+
+def archives(db_path: str, archive_dir: str) -> List[tuple[str, str]]:
+    """[(месяц 'YYYY-MM', путь)] по возрастанию месяца."""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    out = []
+    for p in glob.glob(os.path.join(glob.escape(archive_dir), f"{glob.escape(stem)}-????-??.db")):
+        out.append((os.path.basename(p)[len(stem) + 1:-3], p))
+    return sorted(out)
+
+
+def table_exists(con: sqlite3.Connection, table: str, schema: str = "main") -> bool:
+    return con.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type='table' AND name=?", (table,)
+    ).fetchone() is not None
+
+
+def archive_files(db_path: str, table: str, archive_dir: Optional[str] = None) -> List[str]:
+    """Архивы базы db_path, в которых есть таблица table, по возрастанию месяца."""
+    out = []
+    for _month, path in archives(db_path, archive_dir or RETENTION_ARCHIVE_DIR):
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            if table_exists(con, table):
+                out.append(path)
+        finally:
+            con.close()
+    return out
+
+
+__all__ = ["RETENTION_ARCHIVE_DIR", "archive_path", "archives", "archive_files", "table_exists"]
@@ -1,5 +1,7 @@
 import os, sqlite3, threading, time
-from typing import Optional, Tuple
+from typing import Iterable, List, Optional, Tuple
+
+from app.storage.dedup_index import DedupIndex
 
 _SQLITE_PATH = os.getenv("SQLITE_PATH", "/data/elaya.db")
 _INIT_SQL = """
@@ -61,16 +63,50 @@ def get_scene(user_id: int) -> Tuple[Optional[str], Optional[str], Optional[int]
     row = cur.fetchone()
     return (row[0], row[1], row[2]) if row else (None, None, None)
 
+# --- дедуп апдейтов: горячий путь в памяти, webhook_seen — только снапшот ---
+
+_SNAPSHOT_SEC = float(os.getenv("DEDUP_SNAPSHOT_SEC", "5"))
+_SWEEP_BATCH = 1000
+_dedup: dict[int, DedupIndex] = {}
+
+
+def _persist_seen(rows: List[Tuple[int, int]], cutoff: int) -> None:
+    conn = ensure_db()
+    with _lock, conn:
+        if rows:
+            conn.executemany(
+                "INSERT OR IGNORE INTO webhook_seen(update_id, seen_at) VALUES (?,?)", rows
+            )
+        # просроченные хвосты — небольшими порциями по индексу seen_at
+        conn.execute(
+            "DELETE FROM webhook_seen WHERE rowid IN "
+            "(SELECT rowid FROM webhook_seen WHERE seen_at < ? LIMIT ?)",
+            (cutoff, _SWEEP_BATCH),
+        )
+
+
+def _load_seen(cutoff: int) -> Iterable[Tuple[int, int]]:
+    conn = ensure_db()
+    with _lock:
+        rows = conn.execute(
+            "SELECT update_id, seen_at FROM webhook_seen WHERE seen_at >= ?", (cutoff,)
+        ).fetchall()
+    # старые ISO-строки прежнего app.core.store (TEXT > любого числа) — мимо
+    return [(uid, ts) for uid, ts in rows if isinstance(ts, int)]
+
+
+def _dedup_index(ttl_sec: int) -> DedupIndex:
+    idx = _dedup.get(ttl_sec)
+    if idx is None:
+        with _lock:
+            idx = _dedup.get(ttl_sec)
+            if idx is None:
+                idx = DedupIndex(ttl_sec, persist=_persist_seen, load=_load_seen)
+                idx.start_snapshots(_SNAPSHOT_SEC)
+                _dedup[ttl_sec] = idx
+    return idx
+
+
 def is_duplicate(update_id: int, ttl_sec: int) -> bool:
     """True, если update_id уже видели за последние ttl_sec."""
-    conn = ensure_db()
-    now = int(time.time())
-    cutoff = now - ttl_sec
-    with conn:
-        # Чистим старые хвосты по ходу
-        conn.execute("DELETE FROM webhook_seen WHERE seen_at < ?", (cutoff,))
-        cur = conn.execute("SELECT 1 FROM webhook_seen WHERE update_id=?", (update_id,))
-        if cur.fetchone():
-            return True
-        conn.execute("INSERT OR IGNORE INTO webhook_seen(update_id, seen_at) VALUES (?,?)", (update_id, now))
-    return False
+    return _dedup_index(ttl_sec).seen(update_id)
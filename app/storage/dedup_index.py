@@ -0,0 +1,174 @@
+# app/storage/dedup_index.py
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# persist(rows, cutoff): rows = [(update_id, seen_at_epoch)], cutoff — граница TTL
+PersistFn = Callable[[List[Tuple[int, int]], int], None]
+# load(cutoff) -> [(update_id, seen_at_epoch)] — строки внутри окна TTL
+LoadFn = Callable[[int], Iterable[Tuple[int, int]]]
+
+
+class DedupIndex:
+    """
+    In-memory индекс недавно виденных update_id.
+
+    - окно TTL нарезано на корзины по bucket_sec секунд; id -> номер корзины
+      в словаре, так что проверка — O(1) без обращения к диску;
+    - просроченные корзины выметаются только при смене корзины (амортизированно),
+      а не на каждом апдейте;
+    - monotonic=True включает watermark: id не больше максимального id из
+      уже выметенных корзин считается дублем (для Telegram update_id растут);
+    - при заданном persist новые id периодически сбрасываются в SQLite
+      фоновым потоком, load() поднимает окно после рестарта.
+    """
+
+    def __init__(
+        self,
+        ttl_sec: int,
+        *,
+        bucket_sec: Optional[int] = None,
+        monotonic: bool = False,
+        persist: Optional[PersistFn] = None,
+        load: Optional[LoadFn] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = max(1, int(ttl_sec))
+        self.bucket_sec = max(1, int(bucket_sec or max(1, self.ttl // 16)))
+        self.monotonic = monotonic
+        self._persist = persist
+        self._load = load
+        self._clock = clock
+
+        self._ids: Dict[int, int] = {}                       # update_id -> bucket
+        self._buckets: Deque[Tuple[int, List[int]]] = deque()  # (bucket, [ids])
+        self._watermark: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self._dirty: List[Tuple[int, int]] = []
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loaded = load is None
+
+        self.hits = 0
+        self.misses = 0
+
+    # --- внутреннее ---
+
+    def _bucket(self, now: float) -> int:
+        return int(now) // self.bucket_sec
+
+    def _sweep(self, current: int) -> None:
+        oldest_live = current - (self.ttl + self.bucket_sec - 1) // self.bucket_sec
+        while self._buckets and self._buckets[0][0] < oldest_live:
+            _, ids = self._buckets.popleft()
+            for uid in ids:
+                self._ids.pop(uid, None)
+                if self.monotonic and (self._watermark is None or uid > self._watermark):
+                    self._watermark = uid
+
+    def _remember(self, update_id: int, bucket: int) -> None:
+        if not self._buckets or self._buckets[-1][0] != bucket:
+            self._sweep(bucket)
+            self._buckets.append((bucket, []))
+        self._buckets[-1][1].append(update_id)
+        self._ids[update_id] = bucket
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        now = self._clock()
+        try:
+            rows = sorted(self._load(int(now) - self.ttl), key=lambda r: r[1])  # type: ignore[misc]
+        except Exception:  # noqa: BLE001
+            log.exception("dedup: failed to load snapshot")
+            return
+        for uid, seen_at in rows:
+            if uid not in self._ids:
+                self._remember(int(uid), self._bucket(seen_at))
+        if self.monotonic and rows:
+            # всё, что ниже самого старого id в окне, уже было обработано
+            self._watermark = min(int(r[0]) for r in rows) - 1
+
+    # --- публичный API ---
+
+    def seen(self, update_id: int) -> bool:
+        """True, если update_id уже встречался за окно TTL (и запомнить его)."""
+        now = self._clock()
+        current = self._bucket(now)
+        with self._lock:
+            self._ensure_loaded()
+            if self._buckets and self._buckets[-1][0] != current:
+                self._sweep(current)
+            if update_id in self._ids or (
+                self._watermark is not None and update_id <= self._watermark
+            ):
+                self.hits += 1
+                return True
+            self._remember(update_id, current)
+            if self._persist is not None:
+                self._dirty.append((update_id, int(now)))
+            self.misses += 1
+            return False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "size": len(self._ids),
+            "buckets": len(self._buckets),
+            "watermark": self._watermark,
+            "hits": self.hits,
+            "misses": self.misses,
+            "dirty": len(self._dirty),
+        }
+
+    # --- снапшоты в SQLite ---
+
+    def flush(self) -> int:
+        """Сбросить новые id в хранилище и подчистить просроченные. Возвращает число строк."""
+        if self._persist is None:
+            return 0
+        with self._lock:
+            rows, self._dirty = self._dirty, []
+        cutoff = int(self._clock()) - self.ttl
+        try:
+            self._persist(rows, cutoff)
+        except Exception:  # noqa: BLE001
+            log.exception("dedup: snapshot failed, will retry")
+            with self._lock:
+                self._dirty[:0] = rows
+            return 0
+        return len(rows)
+
+    def start_snapshots(self, interval_sec: float = 5.0) -> None:
+        """Запустить фоновый поток, который раз в interval_sec делает flush()."""
+        if self._persist is None or self._flusher is not None:
+            return
+
+        def _loop() -> None:
+            while not self._stop.wait(interval_sec):
+                self.flush()
+            self.flush()
+
+        self._flusher = threading.Thread(target=_loop, name="dedup-snapshot", daemon=True)
+        self._flusher.start()
+
+    def stop_snapshots(self) -> None:
+        if self._flusher is None:
+            return
+        self._stop.set()
+        self._flusher.join(timeout=5)
+        self._flusher = None
+        self._stop.clear()
+
+
+__all__ = ["DedupIndex"]
@@ -0,0 +1,251 @@
+# app/storage/engine.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+if TYPE_CHECKING:  # asyncio-часть SQLAlchemy (greenlet) нужна только async-движкам
+    from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+# ---- настройки пула / кэша (env) ----
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# SQLite: писатель всё равно один, несколько читателей в WAL — достаточно
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "5"))
+# кэш скомпилированных SQL (по умолчанию в SQLAlchemy — 500)
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "1200"))
+DB_ECHO = os.getenv("DB_ECHO", "0") in ("1", "true", "yes")
+
+# прагмы на каждое новое SQLite-соединение
+SQLITE_PRAGMAS: Tuple[Tuple[str, str], ...] = (
+    ("journal_mode", os.getenv("SQLITE_JOURNAL_MODE", "WAL")),
+    ("synchronous", os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")),
+    ("cache_size", os.getenv("SQLITE_CACHE_SIZE", "-32000")),  # ~32 МБ
+    ("mmap_size", os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    ("busy_timeout", os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+    ("temp_store", "MEMORY"),
+)
+
+_ASYNC_DRIVERS = ("+aiosqlite", "+asyncpg", "+aiomysql")
+
+
+def to_async_url(url: str) -> str:
+    """Нормализуем строку подключения: усиливаем sync-драйверы на async-аналоги."""
+    u = make_url(url)
+    backend = u.get_backend_name()  # 'sqlite' | 'postgresql' | 'mysql' | ...
+    driver = (u.drivername or "")
+    if any(x in driver for x in _ASYNC_DRIVERS):
+        return u.render_as_string(hide_password=False)
+    if backend == "sqlite":
+        u = u.set(drivername="sqlite+aiosqlite")
+    elif backend in ("postgresql", "postgres"):
+        u = u.set(drivername="postgresql+asyncpg")
+    elif backend == "mysql":
+        u = u.set(drivername="mysql+aiomysql")
+    return u.render_as_string(hide_password=False)
+
+
+def _is_memory(url: str) -> bool:
+    u = make_url(url)
+    return u.get_backend_name() == "sqlite" and (
+        not u.database or u.database == ":memory:" or "mode=memory" in str(u)
+    )
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Статистика ожидания соединения из пула
+# ──────────────────────────────────────────────────────────────────────────────
+class PoolStats:
+    """Латентность checkout (ожидание свободного соединения + открытие нового)."""
+
+    def __init__(self, window: int = 1024) -> None:
+        self._lock = threading.Lock()
+        self._recent: deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, sec: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += sec
+            if sec > self.max:
+                self.max = sec
+            self._recent.append(sec)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total, mx = self.count, self.total, self.max
+
+        def pct(p: float) -> float:
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(p * len(recent)))]
+
+        return {
+            "checkouts": count,
+            "avg_ms": round(total / count * 1000, 3) if count else 0.0,
+            "p50_ms": round(pct(0.50) * 1000, 3),
+            "p95_ms": round(pct(0.95) * 1000, 3),
+            "p99_ms": round(pct(0.99) * 1000, 3),
+            "max_ms": round(mx * 1000, 3),
+        }
+
+
+def _timed_pool(base: type, stats: PoolStats) -> type:
+    # подкласс на каждый движок: pool.recreate()/dispose() создаёт пул того же класса,
+    # поэтому статистика живёт в атрибуте класса, а не экземпляра
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return base._do_get(self)
+        finally:
+            stats.observe(time.perf_counter() - t0)
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get, "stats": stats})
+
+
+def _pool_kwargs(url: str, *, is_async: bool, stats: PoolStats) -> Dict[str, Any]:
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        if _is_memory(url):
+            # одна in-memory база живёт ровно в одном соединении
+            return {"poolclass": _timed_pool(StaticPool, stats)}
+        return {
+            "poolclass": _timed_pool(AsyncAdaptedQueuePool if is_async else QueuePool, stats),
+            "pool_size": SQLITE_POOL_SIZE,
+            "max_overflow": SQLITE_POOL_SIZE,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+    return {
+        "poolclass": _timed_pool(AsyncAdaptedQueuePool if is_async else QueuePool, stats),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_conn: Any, _record: Any) -> None:
+    cur = dbapi_conn.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS:
+            cur.execute(f"PRAGMA {name}={value}")
+    finally:
+        cur.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Фабрика: движки создаются лениво, по одному на (url, sync/async)
+# ──────────────────────────────────────────────────────────────────────────────
+_engines: Dict[Tuple[str, bool], Any] = {}
+_stats: Dict[Tuple[str, bool], PoolStats] = {}
+_lock = threading.Lock()
+
+
+def _default_url() -> str:
+    from app.storage.models import DB_URL
+    return DB_URL
+
+
+def _build(url: str, is_async: bool) -> Any:
+    stats = _stats.setdefault((url, is_async), PoolStats())
+    kwargs = dict(
+        echo=DB_ECHO,
+        query_cache_size=DB_QUERY_CACHE_SIZE,
+        **_pool_kwargs(url, is_async=is_async, stats=stats),
+    )
+    if is_async:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        eng = create_async_engine(url, **kwargs)
+        sync_engine = eng.sync_engine
+    else:
+        eng = create_engine(url, **kwargs)
+        sync_engine = eng
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+    return eng
+
+
+def get_engine(url: Optional[str] = None) -> "AsyncEngine":
+    """Async-движок (по умолчанию — models.DB_URL); sync-URL приводится к async-драйверу."""
+    url = to_async_url(url or _default_url())
+    key = (url, True)
+    with _lock:
+        eng = _engines.get(key)
+        if eng is None:
+            eng = _engines[key] = _build(url, True)
+    return eng
+
+
+def get_sync_engine(url: str) -> Engine:
+    """Sync-движок с теми же пулом, прагмами и кэшем (для mvp_repo и скриптов)."""
+    key = (url, False)
+    with _lock:
+        eng = _engines.get(key)
+        if eng is None:
+            eng = _engines[key] = _build(url, False)
+    return eng
+
+
+_sessionmakers: Dict[str, "async_sessionmaker"] = {}
+
+
+def get_sessionmaker(url: Optional[str] = None) -> "async_sessionmaker":
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+    eng = get_engine(url)
+    key = eng.url.render_as_string(hide_password=False)
+    sm = _sessionmakers.get(key)
+    if sm is None:
+        sm = _sessionmakers[key] = async_sessionmaker(eng, expire_on_commit=False, class_=AsyncSession)
+    return sm
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Статистика по всем созданным движкам: checkout-латентность + состояние пула."""
+    out: Dict[str, Dict[str, Any]] = {}
+    with _lock:
+        items = list(_engines.items())
+    for (url, is_async), eng in items:
+        pool = eng.pool if not is_async else eng.sync_engine.pool
+        snap = _stats[(url, is_async)].snapshot()
+        snap["pool"] = pool.status()
+        out[("async " if is_async else "sync ") + make_url(url).render_as_string()] = snap
+    return out
+
+
+async def dispose_engines() -> None:
+    with _lock:
+        items = list(_engines.items())
+        _engines.clear()
+        _sessionmakers.clear()
+    for (_url, is_async), eng in items:
+        if is_async:
+            await eng.dispose()
+        else:
+            eng.dispose()
+
+
+__all__ = [
+    "to_async_url",
+    "get_engine",
+    "get_sync_engine",
+    "get_sessionmaker",
+    "pool_stats",
+    "dispose_engines",
+    "PoolStats",
+    "SQLITE_PRAGMAS",
+]
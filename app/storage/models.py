@@ -7,8 +7,9 @@ from typing import Optional
 
 from sqlalchemy import String, Integer, Boolean, Date, DateTime, BigInteger
 from sqlalchemy.engine import make_url  # нормализация URL
-from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
-from sqlalchemy.orm import declarative_base, Mapped, mapped_column, sessionmaker, synonym
+from sqlalchemy.orm import declarative_base, Mapped, mapped_column, synonym
+
+from app.storage.engine import get_engine, get_sessionmaker, to_async_url
 
 # ---- Render / файловое хранилище ----
 # Для Render каталог /data доступен для записи между рестартами контейнера.
@@ -25,23 +26,7 @@ except Exception:
 # Если указан DB_URL — используем его. Иначе строим из DB_PATH.
 RAW_DB_URL = os.getenv("DB_URL") or f"sqlite+aiosqlite:///{DB_PATH}"
 
-def _to_async_url(url: str) -> str:
-    """Нормализуем строку подключения: усиливаем sync-драйверы на async-аналоги."""
-    u = make_url(url)
-    backend = u.get_backend_name()  # 'sqlite' | 'postgresql' | 'mysql' | ...
-    driver = (u.drivername or "")
-    # Уже async?
-    if any(x in driver for x in ("+aiosqlite", "+asyncpg", "+aiomysql")):
-        return str(u)
-    if backend == "sqlite":
-        return str(u.set(drivername="sqlite+aiosqlite"))
-    if backend in ("postgresql", "postgres"):
-        return str(u.set(drivername="postgresql+asyncpg"))
-    if backend == "mysql":
-        return str(u.set(drivername="mysql+aiomysql"))
-    return str(u)
-
-DB_URL = _to_async_url(RAW_DB_URL)
+DB_URL = to_async_url(RAW_DB_URL)
 
 # На всякий случай — если это sqlite://, создадим директорию файла ещё раз,
 # разобрав URL через make_url (важно для случаев с абсолютными путями).
@@ -57,10 +42,14 @@ except Exception:
 # ---- SQLAlchemy Base / Engine / Session ----
 Base = declarative_base()
 
-engine: AsyncEngine = create_async_engine(DB_URL, echo=False, future=True)
-async_session_maker = sessionmaker(
-    engine, expire_on_commit=False, class_=AsyncSession
-)
+# engine / async_session_maker создаются лениво при первом обращении
+# (пул, прагмы и кэш — в app.storage.engine), а не при импорте моделей
+def __getattr__(name: str):
+    if name == "engine":
+        return get_engine(DB_URL)
+    if name == "async_session_maker":
+        return get_sessionmaker(DB_URL)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ---- МОДЕЛИ ----
 
@@ -1,16 +1,36 @@
 from __future__ import annotations
 from datetime import date, datetime, timedelta
-from typing import Dict, Any
+from itertools import islice
+from typing import Dict, Any, Iterable, Mapping
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from app.config import settings
+from app.storage.engine import get_sync_engine
 
-_engine = create_engine(settings.db_url, future=True)
+
+def _engine():
+    # общий sync-движок из фабрики: пул, прагмы SQLite, кэш компиляции
+    return get_sync_engine(settings.db_url)
+
+
+# размер пачки для executemany в log_training_many
+_BULK_CHUNK = 5000
+# сколько дней читаем за один шаг при подсчёте стрика
+_STREAK_PAGE = 64
+
+_SQL_UPSERT_TRAINING = text("""
+    INSERT INTO training_log(user_id, day, level, done, created_at)
+    VALUES(:uid, :d, :level, :done, :ts)
+    ON CONFLICT(user_id, day) DO UPDATE SET
+        level = excluded.level,
+        done = excluded.done,
+        created_at = excluded.created_at
+""")
 
 
 def init_schema() -> None:
     """Создаём минимальные таблицы под MVP (idempotent)."""
-    with _engine.begin() as conn:
+    with _engine().begin() as conn:
         conn.execute(text("""
         CREATE TABLE IF NOT EXISTS training_log (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -22,6 +42,11 @@ def init_schema() -> None:
             UNIQUE (user_id, day)
         );
         """))
+        # стрик и счётчик за 7 дней читают только выполненные дни
+        conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_training_log_done
+            ON training_log(user_id, day) WHERE done = 1;
+        """))
         conn.execute(text("""
         CREATE TABLE IF NOT EXISTS casting_applications (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -34,43 +59,89 @@ def init_schema() -> None:
 
 def log_training(user_id: int, level: str, done: bool, day: date | None = None) -> None:
     """Upsert запись тренировки на день."""
-    d = day or date.today()
-    with _engine.begin() as conn:
-        conn.execute(text("DELETE FROM training_log WHERE user_id=:uid AND day=:d"),
-                     {"uid": user_id, "d": d})
-        conn.execute(text("""
-            INSERT INTO training_log(user_id, day, level, done, created_at)
-            VALUES(:uid, :d, :level, :done, :ts)
-        """), {"uid": user_id, "d": d, "level": level, "done": 1 if done else 0, "ts": datetime.utcnow()})
+    d = _as_date(day or date.today())
+    with _engine().begin() as conn:
+        conn.execute(_SQL_UPSERT_TRAINING, {
+            "uid": user_id, "d": d, "level": level,
+            "done": 1 if done else 0, "ts": datetime.utcnow(),
+        })
+
+
+def _as_date(v: Any) -> date:
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    return date.fromisoformat(str(v)[:10])
+
+
+def log_training_many(records: Iterable[Mapping[str, Any]]) -> int:
+    """
+    Массовый upsert для импорта/бэкфилла — одной транзакцией.
+    record: {"user_id", "day", "level", "done"[, "created_at"]}; day — date, datetime
+    или ISO-строка. Возвращает число строк.
+    """
+    now = datetime.utcnow().isoformat(" ")
+    rows = (
+        (
+            int(r["user_id"]),
+            _as_date(r["day"]).isoformat(),  # datetime/date/строка → один ключ YYYY-MM-DD
+            r["level"],
+            1 if r.get("done") else 0,
+            str(r.get("created_at") or now),
+        )
+        for r in records
+    )
+    # для sqlite — позиционные параметры прямо в драйвер (в ~2 раза быстрее text()+dict)
+    engine = _engine()
+    positional = engine.dialect.paramstyle == "qmark"
+    sql = str(_SQL_UPSERT_TRAINING.compile(dialect=engine.dialect))
+    keys = ("uid", "d", "level", "done", "ts")
+    total = 0
+    with engine.begin() as conn:
+        while True:
+            chunk = list(islice(rows, _BULK_CHUNK))
+            if not chunk:
+                break
+            if positional:
+                conn.exec_driver_sql(sql, chunk)
+            else:
+                conn.execute(_SQL_UPSERT_TRAINING, [dict(zip(keys, r)) for r in chunk])
+            total += len(chunk)
+    return total
 
 
 def progress_for(user_id: int) -> tuple[int, int]:
     """Возвращает (streak, count_7_days)."""
     today = date.today()
     week_ago = today - timedelta(days=6)
-    with _engine.begin() as conn:
-        rows = conn.execute(text("""
-            SELECT day, done FROM training_log
-            WHERE user_id=:uid AND done=1
-            ORDER BY day DESC
-        """), {"uid": user_id}).all()
+    with _engine().begin() as conn:
         last7 = conn.execute(text("""
             SELECT COUNT(*) FROM training_log
-            WHERE user_id=:uid AND done=1 AND day>=:d
-        """), {"uid": user_id, "d": week_ago}).scalar_one()
+            WHERE user_id=:uid AND done=1 AND day>=:d AND day<=:today
+        """), {"uid": user_id, "d": week_ago, "today": today}).scalar_one()
 
-    # считаем стрик от сегодня назад
-    streak = 0
-    days = {r[0] for r in rows}
-    cursor = today
-    while cursor in days:
-        streak += 1
-        cursor -= timedelta(days=1)
-    return streak, int(last7 or 0)
+        # стрик: идём от сегодня назад страницами по индексу, до первого разрыва
+        streak = 0
+        cursor = today
+        while True:
+            days = conn.execute(text("""
+                SELECT day FROM training_log
+                WHERE user_id=:uid AND done=1 AND day<=:d
+                ORDER BY day DESC
+                LIMIT :lim
+            """), {"uid": user_id, "d": cursor, "lim": _STREAK_PAGE}).scalars().all()
+            for d in days:
+                if _as_date(d) != cursor:
+                    return streak, int(last7 or 0)
+                streak += 1
+                cursor -= timedelta(days=1)
+            if len(days) < _STREAK_PAGE:
+                return streak, int(last7 or 0)
 
 
 def save_casting_application(user_id: int, payload_json: str) -> int:
-    with _engine.begin() as conn:
+    with _engine().begin() as conn:
         res = conn.execute(text("""
             INSERT INTO casting_applications(user_id, payload)
             VALUES(:uid, :payload)
@@ -80,6 +151,6 @@ def save_casting_application(user_id: int, payload_json: str) -> int:
 
 
 def purge_user(user_id: int) -> None:
-    with _engine.begin() as conn:
+    with _engine().begin() as conn:
         conn.execute(text("DELETE FROM training_log WHERE user_id=:uid"), {"uid": user_id})
         conn.execute(text("DELETE FROM casting_applications WHERE user_id=:uid"), {"uid": user_id})
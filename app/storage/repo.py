@@ -7,7 +7,11 @@ import time
 import logging
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Iterator
+
+from app.storage.aio import storage
+from app.storage.archive import archive_files
+from app.storage.writer import GroupCommitWriter
 
 log = logging.getLogger(__name__)
 
@@ -24,6 +28,32 @@ def _connect() -> sqlite3.Connection:
     return conn
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# group-commit: вставки идут через write-behind очередь (по одной на файл)
+# ──────────────────────────────────────────────────────────────────────────────
+_writers: Dict[str, GroupCommitWriter] = {}
+
+
+def writer_for(db_path: Optional[str] = None) -> GroupCommitWriter:
+    path = db_path or _DB_PATH
+    w = _writers.get(path)
+    if w is None:
+        w = _writers[path] = GroupCommitWriter(path)
+    return w
+
+
+async def flush_writes() -> None:
+    """Дождаться записи всех поставленных в очередь строк."""
+    for w in list(_writers.values()):
+        await w.flush()
+
+
+async def close_writers() -> None:
+    """Shutdown-хук: дописать очереди и закрыть соединения."""
+    for w in list(_writers.values()):
+        await w.close()
+
+
 def ensure_schema() -> None:
     """
     Создаёт/мигрит простые таблицы. Идём без внешних зависимостей.
@@ -42,6 +72,27 @@ def ensure_schema() -> None:
         """)
         conn.execute("CREATE INDEX IF NOT EXISTS idx_ep_user_ts ON episodes(user_id, ts);")
 
+        # Роллапы прогресса: сутки (UTC) и текущий стрик — обновляются в add_episode
+        had_rollups = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='user_streak'"
+        ).fetchone()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_daily_progress (
+            user_id   INTEGER NOT NULL,
+            day       TEXT    NOT NULL,    -- YYYY-MM-DD (UTC)
+            episodes  INTEGER NOT NULL DEFAULT 0,
+            points    INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID;
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_streak (
+            user_id   INTEGER PRIMARY KEY,
+            current   INTEGER NOT NULL DEFAULT 0,
+            last_day  TEXT    NOT NULL     -- последний день с эпизодом
+        );
+        """)
+
         # Заявки кастинга (длинная форма)
         conn.execute("""
         CREATE TABLE IF NOT EXISTS casting_applications (
@@ -80,6 +131,100 @@ def ensure_schema() -> None:
         """)
 
         conn.commit()
+        if not had_rollups:
+            # первый запуск поверх существующих эпизодов — наполняем роллапы
+            _rebuild_rollups(conn, _DB_PATH)
+    finally:
+        conn.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Роллапы прогресса
+# ──────────────────────────────────────────────────────────────────────────────
+_SQL_DAILY = """
+    INSERT INTO user_daily_progress(user_id, day, episodes, points) VALUES (?, ?, 1, ?)
+    ON CONFLICT(user_id, day) DO UPDATE SET
+      episodes = episodes + 1,
+      points   = points + excluded.points
+"""
+# (user_id, day, yesterday): тот же день — без изменений, вчера — +1, разрыв — 1;
+# эпизод из прошлого (бэкфилл вне порядка) стрик не трогает
+_SQL_STREAK = """
+    INSERT INTO user_streak(user_id, current, last_day) VALUES (?, 1, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+      current = CASE
+        WHEN excluded.last_day <= user_streak.last_day THEN user_streak.current
+        WHEN user_streak.last_day = ? THEN user_streak.current + 1
+        ELSE 1
+      END,
+      last_day = MAX(user_streak.last_day, excluded.last_day)
+"""
+
+
+def _day(ts: int) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).date().isoformat()
+
+
+_SQL_DAILY_ADD = """
+    INSERT INTO user_daily_progress(user_id, day, episodes, points) VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, day) DO UPDATE SET
+      episodes = episodes + excluded.episodes,
+      points   = points + excluded.points
+"""
+_SQL_DAILY_AGG = """
+    SELECT user_id, date(ts, 'unixepoch'), COUNT(*), SUM(points)
+    FROM episodes
+    GROUP BY user_id, date(ts, 'unixepoch')
+"""
+
+
+def _rebuild_rollups(conn: sqlite3.Connection, db_path: str) -> int:
+    """
+    Пересобрать user_daily_progress/user_streak из episodes — горячей таблицы
+    и помесячных архивов retention (старые эпизоды уже не в основном файле).
+    Возвращает число юзеров.
+    """
+    conn.execute("DELETE FROM user_daily_progress")
+    conn.execute("DELETE FROM user_streak")
+    # архив и горячая таблица не пересекаются: строка переносится вставкой+удалением в одной транзакции
+    for path in archive_files(db_path, "episodes"):
+        arch = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            conn.executemany(_SQL_DAILY_ADD, arch.execute(_SQL_DAILY_AGG).fetchall())
+        finally:
+            arch.close()
+    conn.executemany(_SQL_DAILY_ADD, conn.execute(_SQL_DAILY_AGG).fetchall())
+
+    streaks: List[Tuple[int, int, str]] = []
+    uid: Optional[int] = None
+    current, last = 0, None
+    for r in conn.execute("SELECT user_id, day FROM user_daily_progress ORDER BY user_id, day"):
+        d = datetime.strptime(r[1], "%Y-%m-%d").date()
+        if r[0] != uid:
+            if uid is not None:
+                streaks.append((uid, current, last.isoformat()))
+            uid, current = r[0], 1
+        elif last is not None and d - last == timedelta(days=1):
+            current += 1
+        else:
+            current = 1
+        last = d
+    if uid is not None:
+        streaks.append((uid, current, last.isoformat()))
+
+    conn.executemany(
+        "INSERT INTO user_streak(user_id, current, last_day) VALUES (?, ?, ?)", streaks
+    )
+    conn.commit()
+    return len(streaks)
+
+
+def rebuild_progress_rollups(db_path: Optional[str] = None) -> int:
+    """Бэкфилл роллапов из episodes (см. scripts/backfill_progress.py)."""
+    conn = sqlite3.connect(db_path or _DB_PATH, check_same_thread=False)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        return _rebuild_rollups(conn, db_path or _DB_PATH)
     finally:
         conn.close()
 
@@ -104,45 +249,58 @@ class ProgressRepo:
         conn.row_factory = sqlite3.Row
         return conn
 
-    async def add_episode(self, *, user_id: int, kind: str = "training", points: int = 1) -> None:
+    async def add_episode(
+        self, *, user_id: int, kind: str = "training", points: int = 1, durable: bool = False
+    ) -> None:
         ts = int(time.time())
-        conn = self._conn()
-        try:
-            conn.execute(
-                "INSERT INTO episodes(user_id, kind, points, ts) VALUES (?, ?, ?, ?)",
-                (user_id, kind, points, ts),
-            )
-            conn.commit()
-        finally:
-            conn.close()
+        day = _day(ts)
+        yesterday = (datetime.fromisoformat(day) - timedelta(days=1)).date().isoformat()
+        # эпизод и его роллапы — одной группой, т.е. в одной транзакции
+        await writer_for(self.db_path).submit_many(
+            [
+                (
+                    "INSERT INTO episodes(user_id, kind, points, ts) VALUES (?, ?, ?, ?)",
+                    (user_id, kind, points, ts),
+                ),
+                (_SQL_DAILY, (user_id, day, points)),
+                (_SQL_STREAK, (user_id, day, yesterday)),
+            ],
+            wait=durable,
+        )
 
     async def get_summary(self, *, user_id: int) -> ProgressSummary:
+        # read-your-writes: дописываем свою очередь перед чтением
+        await writer_for(self.db_path).flush()
+        return await storage.run(self._get_summary_sync, user_id)
+
+    def _get_summary_sync(self, user_id: int) -> ProgressSummary:
         conn = self._conn()
         try:
-            now = datetime.now(timezone.utc)
-            start_7 = int((now - timedelta(days=7)).timestamp())
-            rows = conn.execute(
-                "SELECT ts, points FROM episodes WHERE user_id=? AND ts>=? ORDER BY ts DESC",
-                (user_id, start_7),
-            ).fetchall()
-
-            per_day: Dict[str, int] = {}
-            for r in rows:
-                d = datetime.fromtimestamp(r["ts"], tz=timezone.utc).date().isoformat()
-                per_day[d] = per_day.get(d, 0) + 1
+            today = datetime.now(timezone.utc).date()
+            first = today - timedelta(days=6)
+
+            # две точечные выборки по PK, независимо от длины истории
+            per_day: Dict[str, Tuple[int, int]] = {
+                r["day"]: (int(r["episodes"]), int(r["points"]))
+                for r in conn.execute(
+                    "SELECT day, episodes, points FROM user_daily_progress "
+                    "WHERE user_id=? AND day>=? AND day<=?",
+                    (user_id, first.isoformat(), today.isoformat()),
+                )
+            }
+            st = conn.execute(
+                "SELECT current, last_day FROM user_streak WHERE user_id=?", (user_id,)
+            ).fetchone()
 
             days_list: List[Tuple[str, int]] = []
             for i in range(7):
-                d = (now.date() - timedelta(days=6 - i)).isoformat()
-                days_list.append((d, per_day.get(d, 0)))
+                d = (first + timedelta(days=i)).isoformat()
+                days_list.append((d, per_day.get(d, (0, 0))[0]))
 
-            streak = 0
-            cur = now.date()
-            while per_day.get(cur.isoformat(), 0) > 0:
-                streak += 1
-                cur = cur - timedelta(days=1)
+            # стрик считается от сегодняшнего дня
+            streak = int(st["current"]) if st and st["last_day"] == today.isoformat() else 0
 
-            points_7d = sum(int(r["points"]) for r in rows)
+            points_7d = sum(p for _, p in per_day.values())
             episodes_7d = sum(cnt for _, cnt in days_list)
             return ProgressSummary(streak, episodes_7d, points_7d, days_list)
         finally:
@@ -165,53 +323,79 @@ async def save_casting(
     contact: str,
     portfolio: Optional[str],
     agree_contact: bool = True,
+    durable: bool = False,
 ) -> None:
     ts = int(time.time())
-    conn = _connect()
-    try:
-        conn.execute(
-            """INSERT INTO casting_applications
-               (tg_id, name, age, city, experience, contact, portfolio, agree_contact, ts)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (tg_id, name, age, city, experience, contact, portfolio, 1 if agree_contact else 0, ts),
-        )
-        conn.commit()
-        log.info("save_casting: tg_id=%s, name=%r, age=%s, city=%r", tg_id, name, age, city)
-    finally:
-        conn.close()
+    await writer_for().submit(
+        """INSERT INTO casting_applications
+           (tg_id, name, age, city, experience, contact, portfolio, agree_contact, ts)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (tg_id, name, age, city, experience, contact, portfolio, 1 if agree_contact else 0, ts),
+        wait=durable,
+    )
+    log.info("save_casting: tg_id=%s, name=%r, age=%s, city=%r", tg_id, name, age, city)
 
 
-async def save_casting_session(*, tg_id: int, payload: str) -> None:
+async def save_casting_session(*, tg_id: int, payload: str, durable: bool = False) -> None:
     """
     Мини-кастинг — сохранить «шаги/ответы» одним куском текста/JSON.
     """
     ts = int(time.time())
-    conn = _connect()
-    try:
-        conn.execute(
-            "INSERT INTO casting_sessions(tg_id, payload, ts) VALUES (?, ?, ?)",
-            (tg_id, payload, ts),
-        )
-        conn.commit()
-        log.info("save_casting_session: tg_id=%s", tg_id)
-    finally:
-        conn.close()
+    await writer_for().submit(
+        "INSERT INTO casting_sessions(tg_id, payload, ts) VALUES (?, ?, ?)",
+        (tg_id, payload, ts),
+        wait=durable,
+    )
+    log.info("save_casting_session: tg_id=%s", tg_id)
 
 
-async def save_feedback(*, tg_id: int, text: str, rating: Optional[int] = None) -> None:
+async def save_feedback(
+    *, tg_id: int, text: str, rating: Optional[int] = None, durable: bool = False
+) -> None:
     ts = int(time.time())
-    conn = _connect()
+    await writer_for().submit(
+        "INSERT INTO feedback(tg_id, rating, text, ts) VALUES (?, ?, ?, ?)",
+        (tg_id, rating, text, ts),
+        wait=durable,
+    )
+    log.info("save_feedback: tg_id=%s, rating=%s", tg_id, rating)
+
+
+async def log_progress_event(
+    *, tg_id: int, kind: str, points: int = 1, durable: bool = False
+) -> None:
+    # тупо прокидываем в episodes как «событие прогресса»
+    await progress.add_episode(user_id=tg_id, kind=kind, points=points, durable=durable)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Выгрузка заявок кастинга (читается порциями, см. app/services/export.py)
+# ──────────────────────────────────────────────────────────────────────────────
+CASTING_EXPORT_HEADER = [
+    "id", "tg_id", "name", "age", "city", "experience", "contact", "portfolio",
+    "agree_contact", "created_at",
+]
+
+
+def iter_casting_applications(
+    since_ts: Optional[int] = None, chunk: int = 1000
+) -> Iterator[Tuple[Any, ...]]:
+    """Заявки кастинга (новые сверху) без загрузки всей таблицы в память."""
+    conn = sqlite3.connect(_DB_PATH, check_same_thread=False)
     try:
-        conn.execute(
-            "INSERT INTO feedback(tg_id, rating, text, ts) VALUES (?, ?, ?, ?)",
-            (tg_id, rating, text, ts),
+        cur = conn.execute(
+            """SELECT id, tg_id, name, age, city, experience, contact, portfolio,
+                      agree_contact, ts
+               FROM casting_applications
+               WHERE ts >= ?
+               ORDER BY id DESC""",
+            (since_ts or 0,),
         )
-        conn.commit()
-        log.info("save_feedback: tg_id=%s, rating=%s", tg_id, rating)
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            for r in rows:
+                yield r[:-1] + (datetime.fromtimestamp(r[-1], tz=timezone.utc).isoformat(),)
     finally:
         conn.close()
-
-
-async def log_progress_event(*, tg_id: int, kind: str, points: int = 1) -> None:
-    # тупо прокидываем в episodes как «событие прогресса»
-    await progress.add_episode(user_id=tg_id, kind=kind, points=points)
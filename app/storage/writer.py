@@ -0,0 +1,255 @@
+# app/storage/writer.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.storage.aio import StorageExecutor, storage
+
+log = logging.getLogger(__name__)
+
+_MAX_BATCH = int(os.getenv("WRITER_MAX_BATCH", "500"))
+_MAX_DELAY_MS = int(os.getenv("WRITER_MAX_DELAY_MS", "20"))
+_MAX_QUEUE = int(os.getenv("WRITER_MAX_QUEUE", "10000"))
+
+_Stmt = Tuple[str, Sequence[Any]]
+# элемент очереди: (группа statement'ов | None для барьера, future | None)
+_Item = Tuple[Optional[Tuple[_Stmt, ...]], Optional["asyncio.Future[None]"]]
+
+
+class GroupCommitWriter:
+    """
+    Write-behind очередь с групповым коммитом для одного SQLite-файла.
+
+    Хендлеры кладут строку в очередь и сразу идут дальше. Одна фоновая
+    задача забирает пачку (до max_batch строк или max_delay_ms ожидания)
+    и пишет её одной транзакцией: строки группируются по SQL и уходят через
+    executemany, порядок внутри одного SQL сохраняется. submit_many() кладёт
+    несколько statement'ов одним элементом — они всегда в одной транзакции.
+
+    - очередь ограничена (max_queue) — при переполнении submit() ждёт;
+    - submit(..., wait=True) возвращается только после коммита пачки;
+    - ошибка одного элемента не роняет пачку: он откатывается по SAVEPOINT,
+      исключение уходит в его future (или в лог, если ждать некому);
+    - flush() дожидается записи всего, что поставлено раньше;
+    - close() дописывает хвост и останавливает задачу (вызывать на shutdown).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        max_batch: int = _MAX_BATCH,
+        max_delay_ms: int = _MAX_DELAY_MS,
+        max_queue: int = _MAX_QUEUE,
+        executor: StorageExecutor = storage,
+    ) -> None:
+        self.db_path = db_path
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = max(0, int(max_delay_ms)) / 1000.0
+        self.max_queue = max(1, int(max_queue))
+        self._executor = executor
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._queue: Optional["asyncio.Queue[_Item]"] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = False
+
+        self._rows = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._dropped = 0
+        self._commit_ms = 0.0
+
+    # --- жизненный цикл ---
+
+    def _ensure_started(self) -> "asyncio.Queue[_Item]":
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop or self._task is None or self._task.done():
+            if self._loop is not loop:
+                self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._loop = loop
+            self._closing = False
+            self._task = loop.create_task(self._run(), name=f"group-commit:{self.db_path}")
+        assert self._queue is not None
+        return self._queue
+
+    async def close(self) -> None:
+        """Дописать всё из очереди и остановить фоновую задачу."""
+        if self._task is None or self._queue is None:
+            return
+        self._closing = True
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await self._executor.run(conn.close)
+
+    # --- публичный API ---
+
+    async def submit(self, sql: str, params: Sequence[Any], *, wait: bool = False) -> None:
+        """
+        Поставить строку в очередь. При wait=True — дождаться коммита
+        (исключение записи пробрасывается вызывающему).
+        """
+        await self.submit_many([(sql, params)], wait=wait)
+
+    async def submit_many(self, stmts: Sequence[_Stmt], *, wait: bool = False) -> None:
+        """Поставить группу statement'ов, которые попадут в одну транзакцию."""
+        queue = self._ensure_started()
+        fut: Optional["asyncio.Future[None]"] = None
+        if wait:
+            fut = asyncio.get_running_loop().create_future()
+        await queue.put((tuple((sql, tuple(params)) for sql, params in stmts), fut))
+        if fut is not None:
+            await fut
+
+    async def flush(self) -> None:
+        """Дождаться, пока всё поставленное до этого вызова будет закоммичено."""
+        if self._queue is None or self._task is None or self._task.done():
+            return
+        fut: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        await self._queue.put((None, fut))
+        await fut
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "db_path": self.db_path,
+            "queue_depth": self.pending(),
+            "max_queue": self.max_queue,
+            "rows": self._rows,
+            "batches": self._batches,
+            "failed_batches": self._failed_batches,
+            "dropped": self._dropped,
+            "avg_batch": round(self._rows / self._batches, 2) if self._batches else 0.0,
+            "commit_ms_avg": round(self._commit_ms / self._batches, 3) if self._batches else 0.0,
+        }
+
+    # --- фоновая задача ---
+
+    async def _collect(self, queue: "asyncio.Queue[_Item]") -> List[_Item]:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        queue = self._queue
+        assert queue is not None
+        while True:
+            batch = await self._collect(queue)
+            errors: Dict[int, BaseException] = {}
+            try:
+                errors = await self._executor.run(self._write_batch, batch)
+            except Exception as e:  # noqa: BLE001
+                # не удалось даже изолированно (база заблокирована, нет диска…) — падает вся пачка
+                errors = {i: e for i, (stmts, _fut) in enumerate(batch) if stmts is not None}
+                self._failed_batches += 1
+                log.exception("group-commit: batch of %s rows failed", len(batch))
+            for i, (stmts, fut) in enumerate(batch):
+                error = errors.get(i)
+                if error is not None and fut is None:
+                    # fire-and-forget: вызывающий уже ушёл — строка теряется, фиксируем в логе
+                    self._dropped += 1
+                    log.error("group-commit: dropped %r: %s", stmts, error)
+                if fut is not None and not fut.done():
+                    if error is None:
+                        fut.set_result(None)
+                    else:
+                        fut.set_exception(error)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL;")
+            self._conn.execute("PRAGMA synchronous=NORMAL;")
+            self._conn.execute("PRAGMA busy_timeout=5000;")
+        return self._conn
+
+    def _write_batch(self, batch: List[_Item]) -> Dict[int, BaseException]:
+        """
+        Пачка одной транзакцией; возвращает ошибки по индексам элементов.
+        Если быстрый путь (executemany по SQL) упал, пачка переписывается
+        поэлементно с SAVEPOINT на каждый элемент: откатывается только
+        сломанный элемент, остальные коммитятся.
+        """
+        grouped: Dict[str, List[Sequence[Any]]] = {}
+        for stmts, _fut in batch:
+            for sql, params in stmts or ():
+                grouped.setdefault(sql, []).append(params)
+        if not grouped:
+            return {}
+
+        t0 = time.perf_counter()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = 0
+            for sql, params in grouped.items():
+                conn.executemany(sql, params)
+                rows += len(params)
+            errors: Dict[int, BaseException] = {}
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            rows, errors = self._write_isolated(conn, batch)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        self._rows += rows
+        self._batches += 1
+        self._commit_ms += (time.perf_counter() - t0) * 1000.0
+        return errors
+
+    def _write_isolated(self, conn: sqlite3.Connection, batch: List[_Item]) -> Tuple[int, Dict[int, BaseException]]:
+        rows, errors = 0, {}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for i, (stmts, _fut) in enumerate(batch):
+                if not stmts:
+                    continue
+                conn.execute("SAVEPOINT item")
+                try:
+                    for sql, params in stmts:
+                        conn.execute(sql, params)
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO item")
+                    errors[i] = e
+                else:
+                    rows += len(stmts)
+                conn.execute("RELEASE item")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return rows, errors
+
+__all__ = ["GroupCommitWriter"]
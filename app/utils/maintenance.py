@@ -1,37 +1,196 @@
-import os, shutil, sqlite3
+import gzip, logging, os, sqlite3, time
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 from app.config import settings
 
+log = logging.getLogger(__name__)
+
+# бюджеты бэкапа: страниц за шаг backup API и потолок скорости чтения/записи
+BACKUP_DIR = os.getenv("BACKUP_DIR", "/data/backups")
+BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "256"))
+BACKUP_MAX_MBPS = float(os.getenv("BACKUP_MAX_MBPS", "16"))
+BACKUP_RETENTION_DAYS = int(os.getenv("BACKUP_RETENTION_DAYS", "7"))
+_GZIP_CHUNK = 1024 * 1024
+
+
 def _sqlite_path() -> str | None:
-    url = (settings.db_url or "").lower()
+    url = (getattr(settings, "db_url", None) or "").lower()
     if not url.startswith("sqlite"):
         return None
     # sqlite:////data/elaya.db  -> берём часть после '///'
     return url.split("///", 1)[1] if "///" in url else None
 
-def backup_sqlite(retention_days: int = 7) -> str:
-    db = _sqlite_path()
-    if not db or not os.path.exists(db):
-        return "no sqlite db"
 
-    dst_dir = "/data/backups"
+def store_files() -> dict[str, str]:
+    """
+    Все SQLite-файлы приложения: имя -> путь (без дублей и несуществующих).
+    Пути считаются так же, как в модулях-владельцах, но без их импорта.
+    """
+    store_url = os.getenv("DB_URL", "sqlite:////data/elaya.db")
+    candidates = [
+        ("settings", _sqlite_path()),
+        ("elaya", store_url.replace("sqlite:///", "/", 1) if store_url.startswith("sqlite:") else None),
+        ("core", os.getenv("SQLITE_PATH", "/data/elaya.db")),
+        ("progress", os.getenv("PROGRESS_DB_PATH") or os.getenv("DATABASE_FILE") or "/data/elaya_progress.sqlite3"),
+        ("bot", os.getenv("DB_PATH", "/data/bot.db")),
+        ("memory", "data/memory.db"),
+        ("timeline", "data.db"),
+    ]
+    for i, extra in enumerate(filter(None, os.getenv("BACKUP_EXTRA_FILES", "").split(","))):
+        candidates.append((Path(extra.strip()).stem or f"extra{i}", extra.strip()))
+
+    files: dict[str, str] = {}
+    seen: set[str] = set()
+    for name, path in candidates:
+        if not path or not os.path.isfile(path):
+            continue
+        real = os.path.realpath(path)
+        if real in seen:
+            continue
+        seen.add(real)
+        files[name if name not in files else f"{name}-{len(files)}"] = real
+    return files
+
+
+class _Throttle:
+    """Держит среднюю скорость не выше max_mbps (0 — без ограничения)."""
+
+    def __init__(self, max_mbps: float) -> None:
+        self.rate = max_mbps * 1024 * 1024
+        self.started = time.monotonic()
+        self.done = 0
+
+    def account(self, nbytes: int) -> None:
+        self.done += nbytes
+        if self.rate <= 0:
+            return
+        ahead = self.done / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+@dataclass
+class BackupResult:
+    name: str
+    source: str
+    path: str
+    pages: int
+    bytes: int
+    seconds: float
+    integrity: str
+
+
+def backup_database(
+    src: str,
+    dst_dir: str = BACKUP_DIR,
+    name: str | None = None,
+    *,
+    pages: int = BACKUP_PAGES,
+    max_mbps: float = BACKUP_MAX_MBPS,
+    compress: bool = True,
+) -> BackupResult:
+    """
+    Онлайн-бэкап одного SQLite-файла через backup API:
+    - копируем по `pages` страниц за шаг, между шагами — пауза под max_mbps;
+    - на источнике держим read-транзакцию: в WAL писатели не блокируются,
+      а снапшот не меняется (без неё запись в базу перезапускает копирование);
+    - копию проверяем PRAGMA integrity_check и сжимаем gzip (тоже в бюджете).
+    """
+    name = name or Path(src).stem
     os.makedirs(dst_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    raw = os.path.join(dst_dir, f"{name}-{stamp}.db")
+    t0 = time.monotonic()
 
-    stamp = datetime.now(timezone.utc).strftime("%Y%m%d")
-    dst = os.path.join(dst_dir, f"elaya-{stamp}.db")
-    shutil.copy2(db, dst)
+    source = sqlite3.connect(f"file:{src}?mode=ro", uri=True, isolation_level=None)
+    target = sqlite3.connect(raw)
+    try:
+        page_size = source.execute("PRAGMA page_size").fetchone()[0]
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        throttle = _Throttle(max_mbps)
+        copied = 0
 
-    # чистим старше retention_days
-    now = datetime.now(timezone.utc)
-    for p in Path(dst_dir).glob("elaya-*.db"):
+        def _step(status: int, remaining: int, total: int) -> None:
+            nonlocal copied
+            done = total - remaining
+            throttle.account((done - copied) * page_size)
+            copied = done
+
+        source.backup(target, pages=max(1, pages), progress=_step)
+        source.execute("COMMIT")
+        integrity = target.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        source.close()
+        target.close()
+
+    if integrity != "ok":
+        bad = raw + ".corrupt"
+        os.replace(raw, bad)
+        raise RuntimeError(f"backup of {src} failed integrity_check: {integrity} ({bad})")
+
+    path = raw
+    if compress:
+        path = raw + ".gz"
+        throttle = _Throttle(max_mbps)
+        with open(raw, "rb") as fin, gzip.open(path + ".part", "wb", compresslevel=6) as fout:
+            while True:
+                chunk = fin.read(_GZIP_CHUNK)
+                if not chunk:
+                    break
+                fout.write(chunk)
+                throttle.account(len(chunk))
+        os.replace(path + ".part", path)
+        os.remove(raw)
+
+    return BackupResult(
+        name=name,
+        source=src,
+        path=path,
+        pages=copied,
+        bytes=os.path.getsize(path),
+        seconds=round(time.monotonic() - t0, 3),
+        integrity=integrity,
+    )
+
+
+def prune_backups(dst_dir: str = BACKUP_DIR, retention_days: int = BACKUP_RETENTION_DAYS) -> int:
+    """Удалить бэкапы старше retention_days. Возвращает число удалённых файлов."""
+    now = time.time()
+    removed = 0
+    for p in Path(dst_dir).glob("*.db*"):
         try:
-            if (now - datetime.fromtimestamp(p.stat().st_mtime, tz=timezone.utc)).days > retention_days:
+            if now - p.stat().st_mtime > retention_days * 86400:
                 p.unlink()
-        except Exception:
+                removed += 1
+        except OSError:
             pass
+    return removed
+
+
+def run_backups(
+    dst_dir: str = BACKUP_DIR, retention_days: int = BACKUP_RETENTION_DAYS
+) -> list[BackupResult]:
+    """Бэкап всех store-файлов по очереди + чистка старых копий."""
+    results: list[BackupResult] = []
+    for name, src in store_files().items():
+        try:
+            res = backup_database(src, dst_dir, name)
+            log.info("backup %s: %s (%d bytes, %.1fs)", name, res.path, res.bytes, res.seconds)
+            results.append(res)
+        except Exception:
+            log.exception("backup %s (%s) failed", name, src)
+    prune_backups(dst_dir, retention_days)
+    return results
+
+
+def backup_sqlite(retention_days: int = 7) -> str:
+    results = run_backups(retention_days=retention_days)
+    if not results:
+        return "no sqlite db"
+    return "\n".join(r.path for r in results)
 
-    return dst
 
 def vacuum_sqlite() -> str:
     db = _sqlite_path()
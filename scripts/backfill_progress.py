@@ -0,0 +1,15 @@
+"""
+Пересборка роллапов прогресса (user_daily_progress / user_streak) из episodes.
+
+Запуск:  PROGRESS_DB_PATH=/data/elaya_progress.sqlite3 python scripts/backfill_progress.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.storage import repo  # noqa: E402
+
+repo.ensure_schema()
+users = repo.rebuild_progress_rollups()
+print(f"progress rollups rebuilt: {users} users")
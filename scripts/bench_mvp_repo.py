@@ -0,0 +1,61 @@
+"""
+Бенчмарк mvp_repo: массовый upsert тренировок и подсчёт стрика.
+
+log_training_many (позиционные параметры в драйвер, пачками) сравнивается
+с наивным text()+dict по строке; progress_for — на длинном стрике.
+
+Запуск:  python scripts/bench_mvp_repo.py [N_USERS] [DAYS]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+for _k in ("TG_BOT_TOKEN", "WEBHOOK_SECRET", "BASE_URL"):
+    os.environ.setdefault(_k, "bench")
+
+from app.storage import engine as db_engine  # noqa: E402
+from app.storage import mvp_repo  # noqa: E402
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+DAYS = int(sys.argv[2]) if len(sys.argv) > 2 else 365
+
+today = date.today()
+
+
+def records():
+    for uid in range(USERS):
+        for i in range(DAYS):
+            yield {"user_id": uid, "day": today - timedelta(days=i), "level": "mid", "done": True}
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    for name in ("naive", "bulk"):
+        eng = db_engine.get_sync_engine(f"sqlite:///{Path(tmp) / name}.db")
+        mvp_repo._engine = lambda eng=eng: eng
+        mvp_repo.init_schema()
+        t0 = time.perf_counter()
+        if name == "bulk":
+            n = mvp_repo.log_training_many(records())
+        else:
+            n = 0
+            with eng.begin() as conn:
+                for r in records():
+                    conn.execute(mvp_repo._SQL_UPSERT_TRAINING, {
+                        "uid": r["user_id"], "d": r["day"], "level": r["level"],
+                        "done": 1, "ts": "2024-01-01 00:00:00",
+                    })
+                    n += 1
+        print(f"{name:6s} upsert {n} rows: {time.perf_counter() - t0:.2f}s")
+
+    times = []
+    for uid in range(min(USERS, 50)):
+        t0 = time.perf_counter()
+        streak, _ = mvp_repo.progress_for(uid)
+        times.append((time.perf_counter() - t0) * 1000)
+    print(f"progress_for streak {streak}: p50 {statistics.median(times):.2f} ms   max {max(times):.2f} ms")
+    eng.dispose()
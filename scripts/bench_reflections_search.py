@@ -0,0 +1,76 @@
+"""
+Бенчмарк полнотекстового поиска по рефлексиям (FTS5).
+
+Словарь с распределением Ципфа (как в живом тексте), время записи растёт
+вместе с id. Для каждого запроса печатается число совпадений.
+
+Запуск:  python scripts/bench_reflections_search.py [N_REFLECTIONS]
+"""
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core import store  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+THEMES = (
+    "голос дыхание сцена пауза тело страх свобода партнёр текст ритм взгляд "
+    "тишина зал импровизация образ энергия темп интонация жест память"
+).split()
+QUERIES = ["голос", "дыхание пауза", "страх сцена", "импровиз", "слово4242", "тишина зал"]
+
+rnd = random.Random(1)
+vocab = [f"слово{i}" for i in range(20_000)]
+for i, w in enumerate(THEMES):
+    vocab.insert(5 + i * 7, w)  # тематические слова — среди самых частых
+cum = list(accumulate(1.0 / (r + 1) for r in range(len(vocab))))
+
+with tempfile.TemporaryDirectory() as tmp:
+    store._DB_PATH = str(Path(tmp) / "elaya.db")
+    store.start_migration = lambda: None
+    store.init_db()
+
+    now_us = int(time.time() * 1_000_000)
+    step_us = 365 * 86400 * 1_000_000 // N
+
+    def rows():
+        for i in range(N):
+            words = rnd.choices(vocab, cum_weights=cum, k=rnd.randint(6, 25))
+            yield (i % 10_000, " ".join(words).capitalize(), now_us - (N - i) * step_us)
+
+    t0 = time.perf_counter()
+    with store._manager().writer() as con:
+        con.executemany(
+            "INSERT INTO reflection_log(user_id, text, created_us) VALUES(?,?,?)", rows()
+        )
+    print(f"insert {N} reflections (+ FTS trigger): {time.perf_counter() - t0:.1f}s")
+    t0 = time.perf_counter()
+    store.rebuild_reflection_index()
+    print(f"rebuild+optimize index: {time.perf_counter() - t0:.1f}s")
+
+    month_ago = datetime.utcnow() - timedelta(days=30)
+    with store._manager().reader() as con:
+        for q in QUERIES:
+            hits = con.execute(
+                "SELECT COUNT(*) FROM reflection_fts WHERE reflection_fts MATCH ?",
+                (store._fts_query(q),),
+            ).fetchone()[0]
+            for since in (None, month_ago):
+                store.search_reflections(q, since=since)  # прогрев
+                times = []
+                for _ in range(20):
+                    t0 = time.perf_counter()
+                    store.search_reflections(q, since=since, limit=20)
+                    times.append((time.perf_counter() - t0) * 1000)
+                label = f"{q!r}" + (" since 30d" if since else "")
+                print(
+                    f"{label:28s} matches {hits:7d}   "
+                    f"p50 {statistics.median(times):6.2f} ms   max {max(times):6.2f} ms"
+                )
@@ -0,0 +1,48 @@
+"""
+Сравнение бэкендов TimelineStore: SQLite vs сегментированный лог.
+
+Запуск:  python scripts/bench_timeline.py [N_EVENTS]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core.storage import TimelineStore  # noqa: E402
+from app.core.timeline_log import SegmentedTimelineStore  # noqa: E402
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+QUERIES = 500
+SOURCES = ("bot", "web", "core", "cron")
+
+
+def bench(name, store):
+    t0 = time.perf_counter()
+    for i in range(N):
+        store.add_event(SOURCES[i % len(SOURCES)], f"event {i} " + "x" * 40)
+    write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(QUERIES):
+        store.get_events(limit=200)
+    tail = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for i in range(QUERIES):
+        store.get_events(limit=50, source=SOURCES[i % len(SOURCES)])
+    by_source = time.perf_counter() - t0
+
+    print(
+        f"{name:10s} add: {N / write:10.0f} ev/s | "
+        f"tail(200): {tail / QUERIES * 1000:7.3f} ms | "
+        f"source(50): {by_source / QUERIES * 1000:7.3f} ms"
+    )
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    bench("sqlite", TimelineStore(Path(tmp) / "timeline.db"))
+    seg = SegmentedTimelineStore(Path(tmp) / "timeline")
+    bench("segmented", seg)
+    seg.close()
@@ -0,0 +1,68 @@
+"""
+N одиночных POST /api/timeline против пакетов POST /api/timeline/batch.
+
+Запуск:  python scripts/bench_timeline_batch.py [N_EVENTS] [BATCH] [BASE_URL]
+Без BASE_URL приложение гоняется в процессе (httpx + ASGITransport) —
+это сравнение накладных расходов на запрос без сети; с BASE_URL — по HTTP.
+"""
+import asyncio
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+BATCH = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+BASE_URL = sys.argv[3].rstrip("/") if len(sys.argv) > 3 else ""
+
+
+def _event(i):
+    return {"source": "bot", "scene": "reflect", "payload": {"user_id": i % 50, "step": i, "text": "x" * 80}}
+
+
+def _client():
+    if BASE_URL:
+        return httpx.AsyncClient(base_url=BASE_URL, timeout=30)
+    from app.main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+async def singles(client):
+    t0 = time.perf_counter()
+    for i in range(N):
+        r = await client.post("/api/timeline", json=_event(i))
+        r.raise_for_status()
+    return time.perf_counter() - t0
+
+
+async def batches(client, compress):
+    t0 = time.perf_counter()
+    for start in range(0, N, BATCH):
+        body = "\n".join(json.dumps(_event(i)) for i in range(start, min(N, start + BATCH))).encode()
+        headers = {"Content-Type": "application/x-ndjson"}
+        if compress:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        r = await client.post("/api/timeline/batch", content=body, headers=headers)
+        r.raise_for_status()
+    return time.perf_counter() - t0
+
+
+async def main():
+    async with _client() as client:
+        single = await singles(client)
+        plain = await batches(client, False)
+        gz = await batches(client, True)
+    print(f"{N} events, batch={BATCH}, {'http ' + BASE_URL if BASE_URL else 'in-process'}")
+    for name, sec in (("single POST", single), ("batch ndjson", plain), ("batch ndjson+gzip", gz)):
+        print(f"  {name:18s} {sec:7.3f}s  {N / sec:9.0f} ev/s  x{single / sec:5.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from app.core import db
+
+
+@pytest.fixture()
+def core_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "elaya.db"))
+    monkeypatch.setattr(db, "CORE_FLUSH_SEC", 3600.0)
+    db.init_schema()
+    yield db
+    db.stop_core_flusher()
+
+
+def test_bump_core_accumulates_and_flushes_once(core_db):
+    def worker(n):
+        for i in range(500):
+            core_db.bump_core(delta_users=1, delta_intro=2, last_updated=f"{n}-{i}")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    core_db.bump_core(delta_reflect=1, last_updated="final")
+
+    # ещё не сброшено, но читатель видит точные значения
+    state = core_db.read_state()["core"]
+    assert (state["users"], state["intro"], state["reflect"]) == (2000, 4000, 1)
+    assert state["last_updated"] == "final"
+
+    assert core_db.flush_core() is True
+    assert core_db.flush_core() is False
+    conn = core_db.get_conn()
+    row = dict(conn.execute("SELECT * FROM core_state WHERE id = 1").fetchone())
+    conn.close()
+    assert (row["users"], row["intro"], row["reflect"], row["last_updated"]) == (2000, 4000, 1, "final")
+    assert core_db.read_state()["core"]["users"] == 2000
@@ -0,0 +1,50 @@
+import threading
+
+from app.core.state import StateStore
+
+
+def test_ring_is_bounded_and_snapshots_are_shared_until_next_write():
+    store = StateStore(capacity=5)
+    for i in range(12):
+        store.add_event("bot", "reflect" if i % 3 else "intro", {"i": i})
+    store.sync("ui")
+
+    snap = store.get_state()
+    assert store.get_state() is snap  # без записей — тот же объект
+    assert snap.cycle == 13 and len(snap.events) == 5
+    assert snap.events[0].scene == "transition" and snap.events[1]["payload"] == {"i": 11}
+    assert (snap.intro, snap.reflect, snap.transition) == (4, 8, 1)
+
+    d = store.snapshot()
+    assert d["events"][0]["cycle"] == 13 and d["intro"] == 4
+
+    store.add_event("web", "custom")
+    store.add_event("web", "intro")
+    fresh = store.get_state()
+    # произвольные сцены в ленте есть, но счётчики — только базовые фазы
+    assert fresh is not snap and fresh.events[1].scene == "custom" and fresh.intro == 5
+    assert sorted(fresh.counters) == ["intro", "reflect", "transition"]
+    # старый снапшот не изменился
+    assert snap.cycle == 13 and len(snap.events) == 5 and snap.intro == 4
+
+
+def test_concurrent_writers_and_readers():
+    store = StateStore(capacity=50)
+
+    def write():
+        for _ in range(2000):
+            store.add_event("bot", "intro")
+
+    def read():
+        for _ in range(2000):
+            s = store.get_state()
+            assert len(s.events) <= 50
+            assert [e.cycle for e in s.events] == sorted((e.cycle for e in s.events), reverse=True)
+
+    threads = [threading.Thread(target=write) for _ in range(4)] + [threading.Thread(target=read) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    s = store.get_state()
+    assert s.cycle == 8000 and s.intro == 8000 and s.events[0].cycle == 8000
@@ -0,0 +1,186 @@
+import threading
+
+import pytest
+
+from app.core import store
+
+
+@pytest.fixture()
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "_DB_PATH", str(tmp_path / "elaya.db"))
+    monkeypatch.setattr(store, "_pool", None)
+    monkeypatch.setattr(store, "_dedup", None)
+    store.init_db()
+    yield store
+    if store._dedup is not None:
+        store._dedup.stop_snapshots()
+    store._manager().close()
+
+
+def test_scene_roundtrip(db):
+    db.upsert_scene(1, "intro")
+    db.upsert_scene(2, "reflect", "тишина")
+    db.add_reflection(1, "  голос  ")
+
+    row = db.get_scene(1)
+    assert row.last_scene == "intro"
+    assert row.last_reflect == "голос"
+
+    stats = db.get_stats()
+    assert stats["users"] == 2
+    assert stats["counts"] == {"intro": 1, "reflect": 1, "transition": 0}
+    assert stats["last_reflection"]["text"] == "голос"
+
+    assert db.is_duplicate_update(10) is False
+    assert db.is_duplicate_update(10) is True
+
+
+def test_concurrent_readers_and_writer(db):
+    errors = []
+
+    def worker(uid: int) -> None:
+        try:
+            for _ in range(20):
+                db.upsert_scene(uid, "transition")
+                db.get_scene(uid)
+                db.get_counts()
+        except Exception as e:  # pragma: no cover - вывод в assert
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert db.get_counts()["transition"] == 8
+    stats = db.pool_stats()
+    assert stats["readers_open"] <= stats["readers_max"]
+    assert stats["write"]["count"] >= 8 * 20
+
+
+def test_aggregates_match_rebuild(db):
+    import random
+
+    rnd = random.Random(5)
+    for _ in range(300):
+        uid = rnd.randint(1, 25)
+        op = rnd.random()
+        if op < 0.6:
+            reflect = rnd.choice([None, "", "  ", "свет", "голос дрожит"])
+            db.upsert_scene(uid, rnd.choice(["intro", "reflect", "transition", "other"]), reflect)
+        else:
+            db.add_reflection(uid, rnd.choice(["", "тишина", " шаг "]))
+
+    incremental = (db.get_stats(), db.get_scene_stats(), db.get_counts(), db.get_last_reflection())
+    db.rebuild_aggregates()
+    rebuilt = (db.get_stats(), db.get_scene_stats(), db.get_counts(), db.get_last_reflection())
+    assert incremental == rebuilt
+    assert incremental[0]["users"] == 25
+
+
+def test_schema_v2_online_migration(tmp_path, monkeypatch):
+    import sqlite3
+
+    path = str(tmp_path / "legacy.db")
+    con = sqlite3.connect(path)
+    con.execute(
+        "CREATE TABLE scene_state (user_id INTEGER PRIMARY KEY, last_scene TEXT NOT NULL,"
+        " last_reflect TEXT, updated_at TEXT NOT NULL)"
+    )
+    con.executemany(
+        "INSERT INTO scene_state VALUES (?,?,?,?)",
+        [
+            (i, "reflect", f" мысль {i} " if i % 3 else "  ", f"2025-11-{10 + i % 9:02d}T08:00:00.000{i:03d}Z")
+            for i in range(1, 1200)
+        ],
+    )
+    con.commit()
+    con.close()
+
+    monkeypatch.setattr(store, "_DB_PATH", path)
+    monkeypatch.setattr(store, "_pool", None)
+    monkeypatch.setattr(store, "_schema_v2", False)
+    monkeypatch.setattr(store, "start_migration", lambda: None)
+    store.init_db()
+    assert store._schema_v2 is False
+    legacy = store.get_last_reflection()
+
+    store.upsert_scene(5000, "intro")  # запись во время миграции
+    assert store.migrate_v2(batch_size=100, pause_sec=0) == 1199
+    assert store._schema_v2 is True
+
+    with store._manager().reader() as con:
+        assert con.execute("PRAGMA user_version").fetchone()[0] == store.SCHEMA_VERSION
+        assert con.execute("SELECT COUNT(*) FROM scene_state WHERE updated_us IS NULL").fetchone()[0] == 0
+        plan = " ".join(
+            r[-1]
+            for r in con.execute(
+                "EXPLAIN QUERY PLAN SELECT user_id FROM scene_state "
+                "WHERE last_reflect IS NOT NULL AND last_reflect <> '' "
+                "ORDER BY updated_us DESC LIMIT 1"
+            )
+        )
+    assert "idx_scene_state_reflect_us" in plan
+    assert store.get_last_reflection()["text"] == legacy["text"].strip()
+    assert store.get_counts()["users"] == 1200
+    store._manager().close()
+
+
+def test_reflection_search_ranked_and_in_sync(db):
+    from datetime import datetime, timedelta
+
+    db.upsert_scene(1, "reflect", "Сегодня работала над голосом и дыханием")
+    db.upsert_scene(2, "reflect", "Голос, голос и ещё раз голос")
+    db.upsert_scene(3, "intro", "Про пластику")
+    # повтор той же рефлексии не дублирует запись в журнале
+    db.upsert_scene(2, "transition", "Голос, голос и ещё раз голос")
+    db.add_reflection(3, "Новый голос на сцене")
+
+    hits = db.search_reflections("голос")
+    assert [h["user_id"] for h in hits][:1] == [2]
+    assert sorted(h["user_id"] for h in hits) == [1, 2, 3]
+    assert hits[0]["created_at"].endswith("Z")
+
+    assert db.search_reflections('голос" OR пластик') == []
+    assert db.search_reflections("голос", since=datetime.utcnow() + timedelta(hours=1)) == []
+    assert db.rebuild_reflection_index() == 4
+    assert len(db.search_reflections("ПЛАСТИК")) == 1
+
+
+def test_reflection_search_endpoint_is_mounted_and_guarded(db, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.routes import system
+
+    db.upsert_scene(1, "reflect", "Работала над голосом")
+    client = TestClient(app)
+
+    monkeypatch.setattr(system, "GUARD_KEY", "")
+    assert client.get("/diag/reflections/search", params={"q": "голос"}).status_code == 403
+
+    monkeypatch.setattr(system, "GUARD_KEY", "secret")
+    assert client.get("/diag/reflections/search", params={"q": "голос"}).status_code == 401
+    r = client.get("/diag/reflections/search", params={"q": "голос"}, headers={"X-Guard-Key": "secret"})
+    assert r.status_code == 200
+    assert [i["user_id"] for i in r.json()["items"]] == [1]
+
+
+def test_reader_pool_exhaustion_raises_descriptive_error(tmp_path):
+    import sqlite3
+
+    from app.core.sqlite_pool import ConnectionManager
+
+    pool = ConnectionManager(str(tmp_path / "pool.db"), readers=1, timeout=0.05)
+    try:
+        with pool.reader():
+            with pytest.raises(sqlite3.OperationalError, match=r"reader pool exhausted after 0.05s \(1 readers"):
+                with pool.reader():
+                    pass
+        assert pool.stats()["reader_timeouts"] == 1
+        with pool.reader() as con:  # соединение вернулось в пул
+            assert con.execute("SELECT 1").fetchone() == (1,)
+    finally:
+        pool.close()
@@ -0,0 +1,40 @@
+import random
+
+from fastapi.testclient import TestClient
+
+from app.core.cycle_state import CycleState
+from app.core.state import StateStore
+
+
+def test_projection_matches_full_recompute():
+    rnd = random.Random(7)
+    store = StateStore(capacity=16)
+    assert store.cycle_state() == CycleState.from_core(store.snapshot())
+    for _ in range(300):
+        if rnd.random() < 0.1:
+            store.sync("ui")
+        else:
+            store.add_event(rnd.choice(["bot", "web"]), rnd.choice(["intro", "reflect", "transition", "next", ""]))
+        projected = store.cycle_state()
+        assert projected == CycleState.from_core(store.snapshot())
+        assert store.cycle_state() is projected  # цикл не сменился — тот же объект
+
+
+def test_cycle_state_route(monkeypatch):
+    from app.main import app
+
+    store = StateStore(capacity=10)
+    monkeypatch.setattr(StateStore, "_instance", store)
+    client = TestClient(app)
+    client.post("/api/event", json={"source": "bot", "scene": "reflect"})
+
+    data = client.get("/api/cycle/state").json()
+    assert data["ok"] and data["cycle"]["cycle"] == 1 and data["cycle"]["phase"] == "reflect"
+    assert data["cycle"]["last_update"] == data["cycle"]["updated_at"]
+
+    from app.routes import system
+
+    monkeypatch.setattr(system, "GUARD_KEY", "secret")
+    assert client.post("/api/cycle/next").status_code == 401
+    nxt = client.post("/api/cycle/next", headers={"X-Guard-Key": "secret"}).json()["cycle"]
+    assert nxt["cycle"] == 2 and nxt["phase"] == "transition" and nxt["total_reflect"] == 1
@@ -0,0 +1,96 @@
+import sqlite3
+
+from app.storage.dedup_index import DedupIndex
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_window_and_amortized_sweep():
+    clock = FakeClock()
+    idx = DedupIndex(60, bucket_sec=10, clock=clock)
+
+    assert idx.seen(1) is False
+    assert idx.seen(1) is True
+    clock.now += 30
+    assert idx.seen(2) is False
+    assert idx.seen(1) is True
+
+    # после TTL старая корзина выметается, id снова считается новым
+    clock.now += 45
+    assert idx.seen(1) is False
+    assert idx.seen(2) is True
+    assert len(idx) == 2
+
+
+def test_monotonic_watermark():
+    clock = FakeClock()
+    idx = DedupIndex(20, bucket_sec=10, monotonic=True, clock=clock)
+    assert idx.seen(100) is False
+    clock.now += 60
+    assert idx.seen(101) is False
+    # 100 уже выметен из окна, но ниже watermark — это дубль
+    assert idx.seen(100) is True
+    assert idx.seen(50) is True
+
+
+def test_snapshot_roundtrip(tmp_path):
+    path = tmp_path / "seen.db"
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE webhook_seen(update_id INTEGER PRIMARY KEY, seen_at INTEGER)")
+
+    def persist(rows, cutoff):
+        con.executemany("INSERT OR IGNORE INTO webhook_seen VALUES (?,?)", rows)
+        con.execute("DELETE FROM webhook_seen WHERE seen_at < ?", (cutoff,))
+        con.commit()
+
+    def load(cutoff):
+        return con.execute(
+            "SELECT update_id, seen_at FROM webhook_seen WHERE seen_at >= ?", (cutoff,)
+        ).fetchall()
+
+    clock = FakeClock()
+    first = DedupIndex(600, persist=persist, load=load, clock=clock)
+    for uid in range(5):
+        first.seen(uid)
+    assert first.flush() == 5
+
+    # «рестарт»: новый индекс поднимает окно из снапшота
+    second = DedupIndex(600, persist=persist, load=load, clock=clock)
+    assert second.seen(3) is True
+    assert second.seen(5) is False
+
+
+def test_shared_webhook_seen_keeps_other_writers_rows(tmp_path, monkeypatch):
+    import time
+
+    from app.core import store
+    from app.storage import db as dbmod
+
+    path = str(tmp_path / "elaya.db")
+    monkeypatch.setattr(store, "_DB_PATH", path)
+    monkeypatch.setattr(store, "_pool", None)
+    monkeypatch.setattr(dbmod, "_SQLITE_PATH", path)
+    monkeypatch.setattr(dbmod, "_conn", None)
+    store.init_db()
+
+    now = int(time.time())
+    # оба дедупа в одном файле: чистка одного не задевает свежие строки другого
+    dbmod._persist_seen([(1, now), (2, now - 10_000)], now - 900)
+    store._persist_seen([(3, now), (4, now - 10_000)], now - 900)
+    store._persist_seen([], now - 900)
+    dbmod._persist_seen([], now - 900)
+
+    con = sqlite3.connect(path)
+    assert {r[0] for r in con.execute("SELECT update_id FROM webhook_seen")} == {1}
+    assert {r[0] for r in con.execute("SELECT update_id FROM core_webhook_seen")} == {3}
+    con.close()
+    assert {uid for uid, _ in dbmod._load_seen(now - 900)} == {1}
+    assert {uid for uid, _ in store._load_seen(now - 900)} == {3}
+    store._manager().close()
+    dbmod._conn.close()
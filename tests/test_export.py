@@ -0,0 +1,54 @@
+import csv
+import gzip
+import json
+
+from app.services.export import StreamingExporter, export_rows
+
+
+def test_streaming_export_splits_parts_with_headers(tmp_path):
+    header = ["id", "text"]
+    rows = ((i, "x" * 100) for i in range(2000))
+    seen = []
+    result = export_rows(
+        rows, header, str(tmp_path), "fb", max_part_bytes=50_000, progress=seen.append,
+        progress_every=500,
+    )
+    assert result.rows == 2000
+    assert len(result.parts) > 1
+    assert seen[-1] == 2000
+
+    ids = []
+    for path in result.parts:
+        with open(path, newline="", encoding="utf-8") as f:
+            part = list(csv.reader(f, delimiter=";"))
+        assert part[0] == header
+        ids += [int(r[0]) for r in part[1:]]
+    assert ids == list(range(2000))
+
+
+def test_streaming_export_ndjson_gzip(tmp_path):
+    with StreamingExporter(str(tmp_path), "leads", ["id", "note"], fmt="ndjson", compress=True) as exp:
+        result = exp.write_all([(1, "привет"), (2, None)])
+    assert result.parts == [str(tmp_path / "leads.ndjson.gz")]
+    with gzip.open(result.parts[0], "rt", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [
+            {"id": 1, "note": "привет"},
+            {"id": 2, "note": None},
+        ]
+
+
+def test_on_part_fires_as_each_part_closes(tmp_path):
+    closed = []
+    rows = ((i, "x" * 100) for i in range(2000))
+    result = export_rows(
+        rows, ["id", "text"], str(tmp_path), "leads", max_part_bytes=50_000, delimiter=",",
+        on_part=lambda path: closed.append((path, len(closed))),
+    )
+    # части отдаются по порядку, каждая — сразу после закрытия
+    assert [p for p, _ in closed] == result.parts and len(closed) > 1
+    with open(result.parts[0], newline="", encoding="utf-8") as f:
+        assert next(csv.reader(f)) == ["id", "text"]
+
+    empty = []
+    export_rows(iter(()), ["id"], str(tmp_path), "none", on_part=empty.append)
+    assert empty == []  # файл с одним заголовком не отправляем
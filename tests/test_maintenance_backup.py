@@ -0,0 +1,54 @@
+import gzip
+import sqlite3
+import threading
+
+
+def _maintenance(monkeypatch):
+    for k in ("TG_BOT_TOKEN", "WEBHOOK_SECRET", "BASE_URL"):
+        monkeypatch.setenv(k, "test")
+    from app.utils import maintenance
+
+    return maintenance
+
+
+def test_online_backup_during_writes_is_consistent(tmp_path, monkeypatch):
+    maintenance = _maintenance(monkeypatch)
+    src = tmp_path / "elaya.db"
+    con = sqlite3.connect(src)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("CREATE TABLE t(x TEXT)")
+    con.executemany("INSERT INTO t VALUES (?)", [("y" * 200,) for _ in range(20000)])
+    con.commit()
+
+    stop = threading.Event()
+
+    def writer():
+        w = sqlite3.connect(src)
+        while not stop.is_set():
+            w.execute("INSERT INTO t VALUES ('z')")
+            w.commit()
+        w.close()
+
+    th = threading.Thread(target=writer)
+    th.start()
+    try:
+        res = maintenance.backup_database(str(src), str(tmp_path / "backups"), pages=16, max_mbps=0)
+    finally:
+        stop.set()
+        th.join()
+
+    assert res.integrity == "ok" and res.path.endswith(".db.gz")
+    restored = tmp_path / "restored.db"
+    with gzip.open(res.path, "rb") as f:
+        restored.write_bytes(f.read())
+    r = sqlite3.connect(restored)
+    assert r.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert r.execute("SELECT COUNT(*) FROM t WHERE x <> 'z'").fetchone()[0] == 20000
+    r.close()
+
+    monkeypatch.setenv("DB_URL", f"sqlite:///{src}")
+    monkeypatch.setenv("SQLITE_PATH", str(src))
+    monkeypatch.setenv("PROGRESS_DB_PATH", str(restored))
+    files = maintenance.store_files()
+    assert files["elaya"] == str(src) and files["progress"] == str(restored)
+    assert "core" not in files  # тот же файл, что и elaya
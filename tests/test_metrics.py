@@ -0,0 +1,86 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.metrics import Histogram, HttpMetrics, MetricsMiddleware
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    h = Histogram((0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v)
+    lines = h.lines("x", 'a="b"')
+    assert lines[0] == 'x_bucket{a="b",le="0.1"} 2'
+    assert lines[1] == 'x_bucket{a="b",le="1"} 3'
+    assert lines[2] == 'x_bucket{a="b",le="+Inf"} 4'
+    assert lines[-1] == 'x_count{a="b"} 4'
+
+
+def test_middleware_labels_by_route_template_and_status():
+    metrics = HttpMetrics()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(404)
+        return {"id": item_id}
+
+    @app.post("/echo")
+    async def echo(body: dict):
+        return body
+
+    @app.get("/metrics")
+    async def expose():
+        from fastapi.responses import Response
+
+        return Response(metrics.render(), media_type="text/plain")
+
+    client = TestClient(app)
+    for i in (1, 2, 0):
+        client.get(f"/items/{i}")
+    client.post("/echo", json={"text": "x" * 300})
+    client.get("/nope")
+
+    text = client.get("/metrics").text
+    ok = 'method="GET",route="/items/{item_id}",status="200"'
+    assert f"http_request_duration_seconds_count{{{ok}}} 2" in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="404"} 1' in text
+    assert 'route="<unmatched>",status="404"' in text
+    assert 'http_request_size_bytes_bucket{method="POST",route="/echo",status="200",le="512"} 1' in text
+    # сам запрос /metrics ещё в работе
+    assert 'http_requests_in_flight{method="GET"} 1' in text
+    assert "# TYPE http_response_size_bytes histogram" in text
+
+
+def test_main_app_exposes_metrics():
+    from app.main import app
+
+    client = TestClient(app)
+    client.get("/api/cycle/state")
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'route="/api/cycle/state",status="200"' in r.text
+
+
+def test_cached_responses_keep_their_route_label(monkeypatch):
+    from app.core.metrics import HTTP_METRICS
+    from app.core.timeline_buffer import TimelineBuffer
+    from app.core.web_pipeline import RESPONSE_CACHE
+    from app.main import app
+    from app.routes import system
+
+    buf = TimelineBuffer(capacity=100, spill_path=None)
+    monkeypatch.setattr(system, "TIMELINE", buf)
+    buf.append("bot", "intro", {})
+    RESPONSE_CACHE.clear()
+    HTTP_METRICS.reset()
+    client = TestClient(app)
+    hits = RESPONSE_CACHE.hits
+    for _ in range(3):
+        assert client.get("/api/timeline?limit=5").status_code == 200
+    assert RESPONSE_CACHE.hits - hits == 2  # два ответа — из кэша, мимо роутера
+
+    text = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/timeline",status="200"} 3' in text
+    assert 'route="<unmatched>"' not in text
@@ -0,0 +1,63 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    for k in ("TG_BOT_TOKEN", "WEBHOOK_SECRET", "BASE_URL"):
+        monkeypatch.setenv(k, "test")
+    from app.storage import engine as db_engine
+    from app.storage import mvp_repo
+
+    eng = db_engine.get_sync_engine(f"sqlite:///{tmp_path / 'training.db'}")
+    monkeypatch.setattr(mvp_repo, "_engine", lambda: eng)
+    mvp_repo.init_schema()
+    yield mvp_repo
+    eng.dispose()
+
+
+def _days(repo):
+    with repo._engine().connect() as conn:
+        return conn.exec_driver_sql("SELECT day, level, done FROM training_log ORDER BY day").fetchall()
+
+
+def test_log_training_many_upserts_same_day_across_input_types(repo):
+    today = date.today()
+    n = repo.log_training_many([
+        {"user_id": 1, "day": today, "level": "easy", "done": False},
+        {"user_id": 1, "day": datetime.combine(today, datetime.min.time()).replace(hour=21), "level": "mid", "done": True},
+        {"user_id": 1, "day": today.isoformat(), "level": "hard", "done": True},
+    ])
+    assert n == 3
+    assert _days(repo) == [(today.isoformat(), "hard", 1)]
+
+    repo.log_training(1, "easy", False, day=datetime.now())
+    assert _days(repo) == [(today.isoformat(), "easy", 0)]
+
+
+def test_progress_streak_longer_than_page_and_gaps(repo):
+    today = date.today()
+    long_streak = repo._STREAK_PAGE * 2 + 5
+    repo.log_training_many(
+        {"user_id": 1, "day": today - timedelta(days=i), "level": "x", "done": True}
+        for i in range(long_streak)
+    )
+    assert repo.progress_for(1) == (long_streak, 7)
+
+    # разрыв вчера: стрик — только сегодня; невыполненный день тоже разрыв
+    repo.log_training_many([
+        {"user_id": 2, "day": today, "level": "x", "done": True},
+        {"user_id": 2, "day": today - timedelta(days=2), "level": "x", "done": True},
+        {"user_id": 3, "day": today, "level": "x", "done": True},
+        {"user_id": 3, "day": today - timedelta(days=1), "level": "x", "done": False},
+        {"user_id": 3, "day": today - timedelta(days=2), "level": "x", "done": True},
+    ])
+    assert repo.progress_for(2) == (1, 2)
+    assert repo.progress_for(3) == (1, 2)
+
+    # сегодня не отмечено — стрика нет, но неделя считается
+    repo.log_training_many({"user_id": 4, "day": today - timedelta(days=i), "level": "x", "done": True}
+                           for i in range(1, 4))
+    assert repo.progress_for(4) == (0, 3)
+    assert repo.progress_for(99) == (0, 0)
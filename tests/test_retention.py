@@ -0,0 +1,95 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from app.jobs import retention
+
+NOW = datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+
+def _episodes_db(path):
+    con = sqlite3.connect(path)
+    con.execute(
+        "CREATE TABLE episodes(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, "
+        "kind TEXT, points INTEGER, ts INTEGER)"
+    )
+    # 4 месяца истории по дню, id растут вместе с ts
+    start = NOW - timedelta(days=120)
+    rows = [(i % 3, "drill", 1, int((start + timedelta(days=i)).timestamp())) for i in range(120)]
+    con.executemany("INSERT INTO episodes(user_id, kind, points, ts) VALUES (?,?,?,?)", rows)
+    con.commit()
+    con.close()
+    return len(rows)
+
+
+def test_archive_moves_cold_rows_and_history_spans_both(tmp_path):
+    db = str(tmp_path / "progress.sqlite3")
+    total = _episodes_db(db)
+    spec = retention.ArchiveSpec("episodes", lambda: db, "ts", "epoch")
+    arch = str(tmp_path / "archive")
+
+    moved = retention.archive_table(spec, hot_days=30, archive_dir=arch, batch=7, pause_ms=0, now=NOW)
+    assert moved == 90
+    # повторный прогон ничего не двигает
+    assert retention.archive_table(spec, hot_days=30, archive_dir=arch, batch=7, pause_ms=0, now=NOW) == 0
+
+    con = sqlite3.connect(db)
+    cutoff = int((NOW - timedelta(days=30)).timestamp())
+    assert con.execute("SELECT COUNT(*), MIN(ts) >= ? FROM episodes", (cutoff,)).fetchone() == (30, 1)
+    con.close()
+    months = [m for m, _ in retention._archives(db, arch)]
+    assert months == ["2026-06", "2026-07", "2026-08", "2026-09"]
+
+    rows = list(retention.read_history(spec, archive_dir=arch))
+    assert len(rows) == total
+    assert [r["id"] for r in rows] == list(range(1, total + 1))
+
+    since = NOW - timedelta(days=45)
+    mine = list(retention.read_history(spec, since=since, archive_dir=arch, user_id=1))
+    assert mine and all(r["user_id"] == 1 and r["ts"] >= since.timestamp() for r in mine)
+    assert len(mine) == sum(1 for r in rows if r["user_id"] == 1 and r["ts"] >= since.timestamp())
+
+
+def test_sweep_dedup_handles_epoch_and_iso(tmp_path):
+    db = str(tmp_path / "elaya.db")
+    con = sqlite3.connect(db)
+    con.execute("CREATE TABLE webhook_seen(update_id INTEGER PRIMARY KEY, seen_at)")
+    now = int(NOW.timestamp())
+    iso = lambda t: datetime.fromtimestamp(t, tz=timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+    rows = [(i, now - 200_000) for i in range(1000)]  # старые epoch
+    rows += [(1000 + i, iso(now - 200_000)) for i in range(1000)]  # старые ISO
+    rows += [(5000, now - 10), (5001, iso(now - 10))]  # свежие
+    con.executemany("INSERT INTO webhook_seen VALUES (?,?)", rows)
+    con.commit()
+    con.close()
+
+    assert retention.sweep_dedup(db, ttl_sec=86400, batch=300, pause_ms=0, now=now) == 2000
+    con = sqlite3.connect(db)
+    assert sorted(r[0] for r in con.execute("SELECT update_id FROM webhook_seen")) == [5000, 5001]
+    con.close()
+
+
+def test_rollups_rebuild_after_archiving_keeps_history(tmp_path, monkeypatch):
+    from app.storage import archive, repo
+
+    db = str(tmp_path / "progress.sqlite3")
+    arch = str(tmp_path / "archive")
+    monkeypatch.setattr(repo, "_DB_PATH", db)
+    monkeypatch.setattr(archive, "RETENTION_ARCHIVE_DIR", arch)
+    repo.ensure_schema()
+
+    now = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
+    # серия из 120 дней подряд до сегодня, по 2 очка в день
+    rows = [(5, "training", 2, int((now - timedelta(days=i)).timestamp())) for i in reversed(range(120))]
+    con = sqlite3.connect(db)
+    con.executemany("INSERT INTO episodes(user_id, kind, points, ts) VALUES (?,?,?,?)", rows)
+    con.commit()
+    con.close()
+
+    spec = retention.ArchiveSpec("episodes", lambda: db, "ts", "epoch")
+    assert retention.archive_table(spec, hot_days=90, archive_dir=arch, pause_ms=0, now=now) == 29
+    assert repo.rebuild_progress_rollups(db) == 1
+
+    con = sqlite3.connect(db)
+    assert con.execute("SELECT current FROM user_streak WHERE user_id=5").fetchone()[0] == 120
+    assert con.execute("SELECT SUM(episodes), SUM(points) FROM user_daily_progress").fetchone() == (120, 240)
+    con.close()
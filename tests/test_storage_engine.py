@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from sqlalchemy import text
+
+from app.storage import engine as db_engine
+
+
+def test_sync_engine_applies_pragmas_and_counts_checkouts(tmp_path):
+    url = f"sqlite:///{tmp_path / 'mvp.db'}"
+    eng = db_engine.get_sync_engine(url)
+    assert db_engine.get_sync_engine(url) is eng
+    try:
+        with eng.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        with eng.connect():
+            pass
+        stats = [v for k, v in db_engine.pool_stats().items() if k.startswith("sync ") and "mvp.db" in k]
+        assert stats and stats[0]["checkouts"] == 2
+        assert stats[0]["max_ms"] >= stats[0]["p50_ms"] >= 0
+    finally:
+        eng.dispose()
+
+
+def test_async_engine_is_lazy_and_normalizes_driver(tmp_path):
+    pytest.importorskip("greenlet")
+    url = f"sqlite:///{tmp_path / 'bot.db'}"
+
+    async def run():
+        eng = db_engine.get_engine(url)
+        assert eng.url.drivername == "sqlite+aiosqlite"
+        async with db_engine.get_sessionmaker(url)() as s:
+            mode = (await s.execute(text("PRAGMA journal_mode"))).scalar()
+        await db_engine.dispose_engines()
+        return mode
+
+    assert asyncio.run(run()) == "wal"
+
+
+def test_db_pool_is_served_by_main_app_behind_guard(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.routes import system
+
+    eng = db_engine.get_sync_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    try:
+        with eng.connect():
+            pass
+        client = TestClient(app)
+        monkeypatch.setattr(system, "GUARD_KEY", "")
+        assert client.get("/diag/db_pool").status_code == 403
+        monkeypatch.setattr(system, "GUARD_KEY", "secret")
+        assert client.get("/diag/db_pool").status_code == 401
+        r = client.get("/diag/db_pool", headers={"X-Guard-Key": "secret"})
+        assert r.status_code == 200
+        assert any("pool.db" in k for k in r.json()["engines"])
+    finally:
+        eng.dispose()
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from app.storage import repo
+from app.storage.aio import storage
+
+
+@pytest.fixture()
+def progress_repo(tmp_path, monkeypatch):
+    path = str(tmp_path / "progress.sqlite3")
+    monkeypatch.setattr(repo, "_DB_PATH", path)
+    repo.ensure_schema()
+    return repo.ProgressRepo(db_path=path)
+
+
+def test_episodes_summary_via_storage_pool(progress_repo):
+    async def scenario():
+        await asyncio.gather(
+            *(progress_repo.add_episode(user_id=7, points=2) for _ in range(5))
+        )
+        summary = await progress_repo.get_summary(user_id=7)
+        await repo.close_writers()
+        return summary
+
+    summary = asyncio.run(scenario())
+    assert summary.episodes_7d == 5
+    assert summary.points_7d == 10
+    assert summary.streak == 1
+
+    stats = storage.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["running"] == 0
+
+
+def test_group_commit_batches_and_confirms(tmp_path):
+    import sqlite3
+
+    from app.storage.writer import GroupCommitWriter
+
+    path = str(tmp_path / "gc.sqlite3")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE t(id INTEGER PRIMARY KEY, v INTEGER NOT NULL)")
+    con.commit()
+    con.close()
+
+    async def scenario():
+        w = GroupCommitWriter(path, max_batch=100, max_delay_ms=5, max_queue=50)
+        for i in range(1000):
+            await w.submit("INSERT INTO t(v) VALUES (?)", (i,))
+        await w.submit("INSERT INTO t(v) VALUES (?)", (-1,), wait=True)
+        stats = w.stats()
+        try:
+            await w.submit("INSERT INTO missing(v) VALUES (?)", (1,), wait=True)
+        except sqlite3.OperationalError:
+            failed = True
+        else:
+            failed = False
+        await w.submit("INSERT INTO t(v) VALUES (?)", (-2,))
+        await w.close()
+        return stats, failed
+
+    stats, failed = asyncio.run(scenario())
+    assert failed
+    assert stats["rows"] == 1001
+    assert stats["batches"] < 1001
+
+    con = sqlite3.connect(path)
+    assert con.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1002
+    con.close()
+
+
+def test_group_commit_isolates_bad_item(tmp_path):
+    import sqlite3
+
+    from app.storage.writer import GroupCommitWriter
+
+    path = str(tmp_path / "gc.sqlite3")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE t(id INTEGER PRIMARY KEY, v INTEGER NOT NULL)")
+    con.commit()
+    con.close()
+
+    async def scenario():
+        w = GroupCommitWriter(path, max_batch=100, max_delay_ms=50)
+        for i in range(10):
+            await w.submit("INSERT INTO t(v) VALUES (?)", (i,))
+        await w.submit("INSERT INTO t(v) VALUES (?)", (None,))  # fire-and-forget, NOT NULL
+        bad = asyncio.ensure_future(w.submit("INSERT INTO t(v) VALUES (?)", (None,), wait=True))
+        ok = asyncio.ensure_future(w.submit("INSERT INTO t(v) VALUES (?)", (99,), wait=True))
+        results = await asyncio.gather(bad, ok, return_exceptions=True)
+        stats = w.stats()
+        await w.close()
+        return results, stats
+
+    (bad, ok), stats = asyncio.run(scenario())
+    assert isinstance(bad, sqlite3.IntegrityError) and ok is None
+    assert stats["dropped"] == 1 and stats["rows"] == 11
+
+    con = sqlite3.connect(path)
+    assert con.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 11
+    con.close()
+
+
+def test_progress_rollups_match_backfill(progress_repo):
+    import sqlite3
+    import time
+
+    day = 86400
+    now = int(time.time())
+    con = sqlite3.connect(progress_repo.db_path)
+    # 3 дня подряд до вчера + старый эпизод с разрывом
+    con.executemany(
+        "INSERT INTO episodes(user_id, kind, points, ts) VALUES (?, 'training', ?, ?)",
+        [(9, 1, now - 10 * day), (9, 2, now - 3 * day), (9, 3, now - 2 * day), (9, 4, now - day)],
+    )
+    con.commit()
+    con.close()
+    assert repo.rebuild_progress_rollups(progress_repo.db_path) == 1
+
+    async def scenario():
+        await progress_repo.add_episode(user_id=9, points=5)
+        summary = await progress_repo.get_summary(user_id=9)
+        await repo.close_writers()
+        return summary
+
+    summary = asyncio.run(scenario())
+    assert summary.streak == 4
+    assert summary.points_7d == 14
+    assert summary.episodes_7d == 4
+
+    con = sqlite3.connect(progress_repo.db_path)
+    live = con.execute("SELECT * FROM user_daily_progress ORDER BY day").fetchall()
+    streak = con.execute("SELECT current, last_day FROM user_streak").fetchall()
+    con.close()
+    repo.rebuild_progress_rollups(progress_repo.db_path)
+    con = sqlite3.connect(progress_repo.db_path)
+    assert con.execute("SELECT * FROM user_daily_progress ORDER BY day").fetchall() == live
+    assert con.execute("SELECT current, last_day FROM user_streak").fetchall() == streak
+    con.close()
@@ -0,0 +1,67 @@
+import gzip
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.timeline_buffer import TimelineBuffer
+from app.routes import system
+
+
+def _client(monkeypatch):
+    buf = TimelineBuffer(capacity=100, spill_path=None)
+    monkeypatch.setattr(system, "TIMELINE", buf)
+    monkeypatch.setattr(system, "HUB", system.TimelineHub(buf))
+    app = FastAPI()
+    app.include_router(system.router)
+    return TestClient(app), buf
+
+
+def test_batch_json_array_ndjson_and_gzip(monkeypatch):
+    client, buf = _client(monkeypatch)
+    items = [{"source": "bot", "scene": f"s{i}", "payload": {"i": i}} for i in range(3)]
+
+    r = client.post("/api/timeline/batch", json=items)
+    assert r.status_code == 200
+    assert [it["id"] for it in r.json()["items"]] == [1, 2, 3]
+
+    nd = "\n".join(json.dumps(x) for x in items).encode()
+    r = client.post(
+        "/api/timeline/batch",
+        content=gzip.compress(nd),
+        headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+    )
+    assert r.json()["accepted"] == 3
+    assert buf.last_id == 6
+
+
+def test_batch_is_all_or_nothing_unless_partial(monkeypatch):
+    client, buf = _client(monkeypatch)
+    items = [{"source": "bot", "scene": "a"}, {"source": "bot"}, {"source": "bot", "scene": "c"}]
+
+    r = client.post("/api/timeline/batch", json=items)
+    assert r.status_code == 422
+    assert [it["status"] for it in r.json()["items"]] == ["skipped", "invalid", "skipped"]
+    assert "scene" in r.json()["items"][1]["error"]
+    assert buf.last_id == 0
+
+    r = client.post("/api/timeline/batch?partial=1", json=items)
+    assert r.status_code == 200 and r.json()["accepted"] == 2 and r.json()["rejected"] == 1
+    assert [e["scene"] for e in buf.page(10)["events"]] == ["a", "c"]
+
+
+def test_get_timeline_etag_and_304(monkeypatch):
+    client, buf = _client(monkeypatch)
+    client.post("/api/timeline/batch", json=[{"source": "bot", "scene": "a", "payload": {"x": "ё"}}])
+
+    r = client.get("/api/timeline?limit=5")
+    assert r.status_code == 200 and r.json()["events"][0]["payload"] == {"x": "ё"}
+    etag = r.headers["etag"]
+    assert client.get("/api/timeline?limit=5", headers={"If-None-Match": etag}).status_code == 304
+    # другой limit — другой ETag
+    assert client.get("/api/timeline?limit=6", headers={"If-None-Match": etag}).status_code == 200
+
+    client.post("/api/timeline/batch", json=[{"source": "bot", "scene": "b"}])
+    r = client.get("/api/timeline?limit=5", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    assert [e["scene"] for e in r.json()["events"]] == ["a", "b"]
@@ -0,0 +1,126 @@
+from app.core.timeline_buffer import TimelineBuffer
+
+
+def test_ring_evicts_and_paginates_by_cursor():
+    buf = TimelineBuffer(capacity=100, spill_path=None)
+    for i in range(250):
+        buf.append("bot" if i % 2 else "web", f"scene{i % 5}", {"i": i})
+
+    assert buf.stats()["events"] == 100 and buf.stats()["first_id"] == 151
+    page = buf.page(10)
+    assert [e["id"] for e in page["events"]] == list(range(241, 251))
+    assert page["next_before_id"] == 241 and page["last_id"] == 250
+
+    older = buf.page(10, before_id=241)
+    assert [e["id"] for e in older["events"]] == list(range(231, 241))
+    assert [e["id"] for e in buf.page(5, since_id=245)["events"]] == [246, 247, 248, 249, 250]
+    # вытесненное без спилла недоступно
+    assert buf.page(10, before_id=151)["events"] == []
+
+    web = buf.page(5, source="web", scene="scene3")["events"]
+    assert [e["payload"]["i"] for e in web] == [208, 218, 228, 238, 248]
+    assert all(e["source"] == "web" for e in buf.page(100, source="web")["events"])
+
+
+def test_spill_serves_evicted_events(tmp_path):
+    path = str(tmp_path / "spill.db")
+    buf = TimelineBuffer(capacity=50, spill_path=path, spill_batch=20)
+    for i in range(200):
+        buf.append("bot", "s" if i % 3 else "t", {"i": i})
+
+    assert len(buf) <= 50
+    ids = []
+    cursor = None
+    while True:
+        page = buf.page(33, before_id=cursor)
+        if not page["events"]:
+            break
+        ids = [e["id"] for e in page["events"]] + ids
+        cursor = page["next_before_id"]
+    assert ids == list(range(1, 201))
+    t = buf.page(10, since_id=0, scene="t")["events"]
+    assert [e["payload"]["i"] for e in t] == list(range(0, 30, 3))
+    buf.close()
+
+    # после рестарта id продолжаются со спилла
+    again = TimelineBuffer(capacity=50, spill_path=path)
+    assert again.append("bot", "s")["id"] == 201
+    assert [e["id"] for e in again.page(3)["events"]] == [199, 200, 201]
+    again.close()
+
+
+def test_spill_writes_run_off_the_caller_thread(tmp_path):
+    import threading
+
+    path = str(tmp_path / "spill.db")
+    buf = TimelineBuffer(capacity=20, spill_path=path, spill_batch=10)
+    release, writers = threading.Event(), []
+    write = buf._spill.write
+
+    def slow_write(events):
+        writers.append(threading.current_thread().name)
+        release.wait(5)
+        write(events)
+
+    buf._spill.write = slow_write
+    for i in range(50):
+        buf.append("bot", "s", {"i": i})  # диск «завис», а запись не ждёт его
+
+    # вытесненное, но ещё не записанное читается из очереди флашера
+    assert buf.stats()["spill_pending"] == 30
+    assert [e["id"] for e in buf.page(50)["events"]] == list(range(1, 51))
+    assert [e["id"] for e in buf.page(5, since_id=3)["events"]] == [4, 5, 6, 7, 8]
+
+    release.set()
+    assert buf.flush(5) and buf.stats()["spill_pending"] == 0
+    assert writers and set(writers) == {"timeline-spill"}
+    assert [e["id"] for e in buf.page(50)["events"]] == list(range(1, 51))
+    buf.close()
+
+    again = TimelineBuffer(capacity=20, spill_path=path)
+    assert again.append("bot", "s")["id"] == 51
+    again.close()
+
+
+def test_spill_reads_do_not_hold_the_buffer_lock(tmp_path, monkeypatch):
+    import threading
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.routes import system
+
+    buf = TimelineBuffer(capacity=20, spill_path=str(tmp_path / "spill.db"), spill_batch=10)
+    for i in range(60):
+        buf.append("bot", "s", {"i": i})
+    assert buf.flush(5) and buf.blocking_reads
+
+    entered, release, readers = threading.Event(), threading.Event(), []
+    read = buf._spill.read
+
+    def slow_read(*args):
+        readers.append(threading.current_thread().name)
+        entered.set()
+        release.wait(5)
+        return read(*args)
+
+    buf._spill.read = slow_read
+    paging = threading.Thread(target=lambda: buf.page(5, before_id=10))
+    paging.start()
+    assert entered.wait(5)
+    # SELECT по спиллу идёт, а запись не ждёт
+    writer = threading.Thread(target=lambda: buf.append("bot", "s", {"i": 60}))
+    writer.start()
+    writer.join(2)
+    assert not writer.is_alive()
+    release.set()
+    paging.join(5)
+
+    # /api/timeline со спиллом читает в пуле storage; сырые байты кольца и спилла склеены верно
+    monkeypatch.setattr(system, "TIMELINE", buf)
+    readers.clear()
+    body = TestClient(app).get("/api/timeline?limit=30&before_id=50").json()
+    assert [e["id"] for e in body["events"]] == list(range(20, 50))
+    assert [e["payload"]["i"] for e in body["events"]] == list(range(19, 49))
+    assert readers and all(name.startswith("storage") for name in readers)
+    buf.close()
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from app.core.timeline_buffer import TimelineBuffer
+from app.core.timeline_hub import TimelineHub, parse_resume, resume_token
+
+
+def test_hub_resumes_from_last_id_then_streams_live():
+    async def run():
+        buf = TimelineBuffer(capacity=100, spill_path=None)
+        hub = TimelineHub(buf)
+        for i in range(5):
+            buf.append("bot", "s", {"i": i})
+
+        sub = hub.subscribe(2)
+        it = sub.frames(ping_sec=0.05)
+        got = [(await it.__anext__()).id for _ in range(3)]
+        hub.publish(buf.append("bot", "s", {"i": 5}))
+        got.append((await it.__anext__()).id)
+        assert got == [3, 4, 5, 6]
+        assert await it.__anext__() is None  # keep-alive
+        await it.aclose()
+        assert hub.stats()["subscribers"] == 0
+
+    asyncio.run(run())
+
+
+def test_slow_subscriber_is_disconnected_without_blocking_publisher():
+    async def run():
+        buf = TimelineBuffer(capacity=1000, spill_path=None)
+        hub = TimelineHub(buf, queue_size=4)
+        slow = hub.subscribe()
+        fast = hub.subscribe(scene="a")
+        frames = fast.frames(ping_sec=1)
+        for i in range(10):
+            hub.publish(buf.append("bot", "a" if i % 2 else "b", {"i": i}))
+            if i % 2:
+                f = await frames.__anext__()
+                assert json.loads(f.json)["payload"]["i"] == i
+        assert slow.closed and hub.stats()["disconnected"] == 1
+        # отключённый подписчик дочитывает сигнал конца
+        assert [f async for f in slow.frames()] == []
+        # при переподключении с last_id догоняет всё из буфера
+        again = hub.subscribe(0)
+        it = again.frames()
+        assert [(await it.__anext__()).id for _ in range(10)] == list(range(1, 11))
+        await it.aclose()
+        await frames.aclose()
+
+    asyncio.run(run())
+
+
+def test_resume_id_from_before_restart_is_treated_as_stale():
+    async def run():
+        old = TimelineBuffer(capacity=100, spill_path=None)
+        for i in range(50):
+            old.append("bot", "s", {"i": i})
+        token = resume_token(old.epoch, old.last_id)
+
+        buf = TimelineBuffer(capacity=100, spill_path=None)  # рестарт: id снова с 1
+        hub = TimelineHub(buf)
+        epoch, last_id = parse_resume(token)
+        subs = [hub.subscribe(last_id, epoch=epoch), hub.subscribe(50)]
+        its = [s.frames(ping_sec=0.05) for s in subs]
+        for i in range(10):
+            hub.publish(buf.append("bot", "s", {"i": i}))
+        for it in its:
+            frame = await it.__anext__()
+            assert frame.id == 1 and frame.sse.startswith(f"id: {buf.epoch}-1\n".encode())
+            assert [(await it.__anext__()).id for _ in range(9)] == list(range(2, 11))
+            await it.aclose()
+
+        # свой курсор своей метки — догоняем как раньше
+        sub = hub.subscribe(8, epoch=buf.epoch)
+        it = sub.frames(ping_sec=0.05)
+        assert [(await it.__anext__()).id for _ in range(2)] == [9, 10]
+        await it.aclose()
+
+    asyncio.run(run())
+    assert parse_resume("abc") == (None, None) and parse_resume("7") == (None, 7)
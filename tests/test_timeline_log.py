@@ -0,0 +1,46 @@
+from app.core.timeline_log import SegmentedTimelineStore
+
+
+def test_segmented_log_matches_sqlite_api(tmp_path):
+    store = SegmentedTimelineStore(tmp_path / "tl", segment_bytes=1024)
+    for i in range(200):
+        store.add_event("bot" if i % 3 else "web", f"event {i}")
+
+    assert store.stats()["segments"] > 1
+    tail = store.get_events(limit=5)
+    assert [e["id"] for e in tail] == [200, 199, 198, 197, 196]
+    assert tail[0]["text"] == "event 199"
+    web = store.get_events(limit=1000, source="web")
+    assert len(web) == 67 and all(e["source"] == "web" for e in web)
+
+    store.purge()
+    assert store.get_events() == []
+    store.add_event("bot", "after purge")
+    assert store.get_events()[0]["id"] == 201
+    store.close()
+
+
+def test_segmented_log_recovers_torn_tail_and_retention(tmp_path):
+    root = tmp_path / "tl"
+    store = SegmentedTimelineStore(root, segment_bytes=1024, retention_sec=60)
+    for i in range(100):
+        store.add_event("bot", f"event {i}")
+    store.close()
+
+    # обрываем последнюю запись индекса и дописываем мусор в лог
+    idx = sorted(root.glob("*.idx"))[-1]
+    idx.write_bytes(idx.read_bytes()[:-5])
+    with open(sorted(root.glob("*.log"))[-1], "ab") as f:
+        f.write(b'["bot","torn')
+
+    store = SegmentedTimelineStore(root, segment_bytes=1024, retention_sec=60)
+    assert store.get_events(limit=1)[0]["text"] == "event 98"
+    store.add_event("bot", "next")
+    last = store.get_events(limit=1)[0]
+    assert (last["id"], last["text"]) == (100, "next")
+
+    segments = store.stats()["segments"]
+    assert store.enforce_retention(now=0) == 0
+    assert store.enforce_retention(now=10**10) == segments - 1
+    assert store.get_events(limit=1)[0]["text"] == "next"
+    store.close()
@@ -0,0 +1,82 @@
+import asyncio
+
+from app.core.timeline_shared import SharedTimeline
+
+
+def test_two_workers_see_one_timeline_and_stream_in_order(tmp_path):
+    path = str(tmp_path / "timeline.db")
+    a, b = SharedTimeline(path), SharedTimeline(path)  # как два процесса uvicorn
+
+    async def run():
+        seen_a, seen_b = [], []
+        tails = [
+            asyncio.create_task(a.tail(lambda e, raw: seen_a.append((e["id"], raw)), poll_ms=5)),
+            asyncio.create_task(b.tail(lambda e, raw: seen_b.append((e["id"], raw)), poll_ms=5)),
+        ]
+        await asyncio.sleep(0.02)
+        for i in range(10):
+            (a if i % 2 else b).extend([("bot", f"s{i}", {"i": i})])
+        ids = [e["id"] for e in a.extend([("web", "x", {}), ("web", "y", {})])]
+        assert ids == [11, 12]
+        for _ in range(100):
+            if len(seen_a) == len(seen_b) == 12:
+                break
+            await asyncio.sleep(0.01)
+        for t in tails:
+            t.cancel()
+        return seen_a, seen_b
+
+    seen_a, seen_b = asyncio.run(run())
+    assert [i for i, _ in seen_a] == [i for i, _ in seen_b] == list(range(1, 13))
+
+    page_a, page_b = a.page(5, raw=True), b.page(5)
+    assert page_a["last_id"] == page_b["last_id"] == 12
+    assert [e["id"] for e in page_b["events"]] == [8, 9, 10, 11, 12]
+    assert page_a["events"][-1] == seen_a[-1][1]
+    assert a.etag(5) == b.etag(5)
+    assert [e["scene"] for e in b.page(10, since_id=0, source="web")["events"]] == ["x", "y"]
+
+
+def test_reads_go_through_storage_pool_and_close_releases_every_connection(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.routes import system
+
+    path = str(tmp_path / "timeline.db")
+    tl, other = SharedTimeline(path), SharedTimeline(path)
+    monkeypatch.setattr(system, "TIMELINE", tl)
+    other.extend([("bot", "intro", {"i": i}) for i in range(3)])
+    assert tl.last_id == 0  # кэш: чужие события он узнаёт из tail/page/etag
+
+    client = TestClient(app)
+    r = client.get("/api/timeline?limit=10")
+    assert [e["id"] for e in r.json()["events"]] == [1, 2, 3] and tl.last_id == 3
+    assert client.get("/timeline?limit=10").text.count('class="event"') == 3
+
+    async def tail_once():
+        seen = []
+        task = asyncio.create_task(tl.tail(lambda e, raw: seen.append(e["id"]), poll_ms=5))
+        await asyncio.sleep(0.1)  # tail успел запомнить last
+        other.extend([("bot", "reflect", {})])
+        for _ in range(100):
+            if seen == [4]:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        return seen
+
+    assert asyncio.run(tail_once()) == [4] and tl.last_id == 4
+
+    cons = list(tl._cons)
+    assert len(cons) >= 2  # соединение __init__ + потоков пула storage
+    tl.close()
+    for con in cons:
+        try:
+            con.execute("SELECT 1")
+        except Exception:
+            continue
+        raise AssertionError("connection left open")
+    assert tl.page(10)["last_id"] == 4  # после close() — новое соединение
+    tl.close()
+    other.close()
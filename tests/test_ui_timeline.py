@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+
+from app.core.timeline_buffer import TimelineBuffer
+from app.routes import system
+
+
+def test_timeline_page_is_escaped_paginated_and_css_cached(monkeypatch):
+    from app.main import app
+
+    buf = TimelineBuffer(capacity=100, spill_path=None)
+    monkeypatch.setattr(system, "TIMELINE", buf)
+    buf.append("bot", "<b>intro</b>", {"text": "<script>alert(1)</script> привет"})
+    for i in range(30):
+        buf.append("bot", "reflect", {"i": i})
+    client = TestClient(app)
+
+    first = client.get("/timeline?limit=10")
+    assert first.status_code == 200 and first.headers["content-type"].startswith("text/html")
+    assert first.text.count('class="event"') == 10
+    assert "EventSource" in first.text and "before_id=22" in first.text
+
+    oldest = client.get("/timeline?limit=10&before_id=2").text
+    assert "<script>alert(1)" not in oldest and "&lt;b&gt;intro&lt;/b&gt;" in oldest
+    assert "привет" in oldest and "EventSource" not in oldest and "since_id=1" in oldest
+
+    css = oldest.split('href="', 1)[1].split('"', 1)[0]
+    assert css.startswith("/static/css/timeline.css?v=")
+    r = client.get(css)
+    assert r.status_code == 200 and "immutable" in r.headers["cache-control"]
+
+
+def test_older_link_only_while_buffer_retains_older_events(monkeypatch):
+    from app.main import app
+
+    buf = TimelineBuffer(capacity=10, spill_path=None)
+    monkeypatch.setattr(system, "TIMELINE", buf)
+    for i in range(30):
+        buf.append("bot", "reflect", {"i": i})
+    client = TestClient(app)
+
+    page = client.get("/timeline?limit=5").text
+    assert page.count('class="event"') == 5 and "before_id=26" in page
+    oldest = client.get("/timeline?limit=5&before_id=26").text  # 21..25 — всё, что осталось
+    assert oldest.count('class="event"') == 5 and "before_id=" not in oldest
@@ -0,0 +1,121 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.timeline_buffer import TimelineBuffer
+from app.core.web_pipeline import (
+    RESPONSE_CACHE,
+    CacheControlMiddleware,
+    CompressionMiddleware,
+    ResponseCache,
+    ResponseCacheMiddleware,
+    RoutePolicy,
+    install_pipeline,
+    negotiate,
+)
+from app.routes import system
+
+
+def test_negotiate_prefers_highest_q():
+    assert negotiate("") is None
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("identity, *;q=0.5") in ("br", "gzip")
+
+
+def test_compression_threshold_streams_and_sse():
+    app = FastAPI()
+    install_pipeline(app, policies={})
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/big")
+    async def big():
+        return PlainTextResponse("элайя " * 1000)
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            for i in range(3):
+                yield ("chunk %d " % i * 500).encode()
+        return StreamingResponse(body(), media_type="text/html")
+
+    @app.get("/sse")
+    async def sse():
+        async def body():
+            yield b"data: " + b"x" * 5000 + b"\n\n"
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    client = TestClient(app)
+    h = {"Accept-Encoding": "gzip"}
+    assert "content-encoding" not in client.get("/small", headers=h).headers
+
+    r = client.get("/big", headers=h)
+    assert r.headers["content-encoding"] == "gzip" and "accept-encoding" in r.headers["vary"].lower()
+    assert int(r.headers["content-length"]) < 2000 and r.text == "элайя " * 1000
+
+    r = client.get("/stream", headers=h)
+    assert r.headers["content-encoding"] == "gzip" and r.text.startswith("chunk 0")
+
+    r = client.get("/sse", headers=h)
+    assert "content-encoding" not in r.headers and len(r.content) > 5000
+
+    raw = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+
+
+def test_response_cache_invalidated_by_new_events(monkeypatch):
+    buf = TimelineBuffer(capacity=1000, spill_path=None)
+    monkeypatch.setattr(system, "TIMELINE", buf)
+    for i in range(40):
+        buf.append("bot", "reflect", {"i": i, "text": "x" * 50})
+
+    calls = []
+    page = buf.page
+    monkeypatch.setattr(buf, "page", lambda *a, **kw: calls.append(1) or page(*a, **kw))
+
+    app = FastAPI()
+    app.include_router(system.router)
+    cache = ResponseCache()
+    policies = {"/api/timeline": RoutePolicy("public, max-age=1, stale-while-revalidate=5", ttl=60)}
+    app.add_middleware(CacheControlMiddleware, policies=policies)
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(ResponseCacheMiddleware, cache=cache, policies=policies,
+                       version=system.timeline_version)
+    client = TestClient(app)
+    h = {"Accept-Encoding": "gzip"}
+
+    first = client.get("/api/timeline?limit=40", headers=h)
+    assert first.headers["content-encoding"] == "gzip"
+    assert "stale-while-revalidate" in first.headers["cache-control"]
+    second = client.get("/api/timeline?limit=40", headers=h)
+    assert second.content == first.content and len(calls) == 1 and cache.hits == 1
+
+    # условный запрос отвечается из кэша без обработчика
+    r = client.get("/api/timeline?limit=40", headers={**h, "If-None-Match": first.headers["etag"]})
+    assert r.status_code == 304 and len(calls) == 1
+
+    buf.append("bot", "intro", {"new": True})
+    third = client.get("/api/timeline?limit=40", headers=h)
+    assert len(calls) == 2 and third.json()["events"][-1]["payload"] == {"new": True}
+
+    # без сжатия — отдельная запись кэша
+    plain = client.get("/api/timeline?limit=40", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and len(calls) == 3
+
+
+def test_main_app_pipeline_keeps_stream_and_static(monkeypatch):
+    from app.main import app
+
+    buf = TimelineBuffer(capacity=100, spill_path=None)
+    monkeypatch.setattr(system, "TIMELINE", buf)
+    for i in range(50):
+        buf.append("bot", "reflect", {"i": i})
+    RESPONSE_CACHE.clear()
+    client = TestClient(app)
+
+    r = client.get("/timeline?limit=50", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip" and r.text.count('class="event"') == 50
+    assert r.headers["cache-control"].startswith("public, max-age=2")